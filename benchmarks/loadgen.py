@@ -0,0 +1,248 @@
+import argparse
+import os
+import random
+import resource
+import select
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from client.network.client import Client
+from shared.map import Map
+from shared.protocol import Protocol
+from shared.framing import FrameDecoder
+from benchmarks import results as result_files
+from constants.map import MOUNTAIN_CODE
+from constants.protocol import RECV_BUFFER_SIZE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class FakeClient:
+    """
+    a headless player: the real Client and Protocol code with a map of its own, sending random valid
+    moves and timing the map messages - the gaps between them, and how long each move takes to show up
+    in one (the message acknowledging it)
+    """
+    def __init__(self, ip, port, rng, compress=True):
+        self.client = Client(ip, port)
+        self.client.compress = compress
+        self.client.connect()
+        self.socket = self.client.client_socket
+        self.socket.setblocking(False)
+        self.decoder = FrameDecoder(compressed=True)
+        self.map = Map()
+        self.id = None
+        self.rng = rng
+        self.sent = {} # action seq -> time sent
+        self.last_arrival = None
+        self.intervals = []
+        self.latencies = []
+        self.bytes = 0
+        self.messages = 0
+
+    def receive(self, now):
+        data = self.socket.recv(RECV_BUFFER_SIZE)
+        if not data:
+            raise ConnectionError("the server closed the connection")
+        self.bytes += len(data)
+
+        for msg_type, content in self.decoder.feed(data):
+            if msg_type == 'H':
+                self.client.handle_hello(content)
+                continue
+            idlist = []
+            Protocol.handle_msg(msg_type, content, self.map, idlist=idlist)
+            self.id = idlist[0]
+            self.messages += 1
+            if self.last_arrival is not None:
+                self.intervals.append(now - self.last_arrival)
+            self.last_arrival = now
+
+            ack = self.map.ack or 0
+            for seq in [seq for seq in self.sent if seq <= ack]:
+                self.latencies.append(now - self.sent.pop(seq))
+
+    def move(self, now):
+        """
+        sends a random move of an owned tile with some army, once the map came
+        """
+        if self.id is None or self.map.seq is None:
+            return
+        map = self.map
+        ys, xs = ((map.owners == self.id) & (map.armies > 1)).nonzero()
+        if len(xs) == 0:
+            return
+        index = self.rng.randrange(len(xs))
+        dx, dy = self.rng.choice(((1, 0), (-1, 0), (0, 1), (0, -1)))
+        x, y = int(xs[index]), int(ys[index])
+        if not map.tile_exists(x + dx, y + dy) or map.types[y + dy, x + dx] == MOUNTAIN_CODE:
+            return
+        seq = self.client.send_action(x, y, x + dx, y + dy)
+        if seq is not None:
+            self.sent[seq] = now
+
+def start_server(args):
+    command = [sys.executable, os.path.join('server', 'main.py'), '--rooms', '--players', str(args.players),
+               '--port', str(args.port), '--tick-rate', str(args.tick_rate), '--metrics-port', str(args.metrics_port),
+               '--rows', str(args.size), '--cols', str(args.size)]
+    server = subprocess.Popen(command, cwd=ROOT, env=dict(os.environ, PYTHONPATH=ROOT), stdout=subprocess.DEVNULL)
+
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', args.metrics_port), 0.1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise SystemExit("the server did not start")
+
+def scrape(port):
+    """
+    the numbers of the server's metrics endpoint, by metric name and labels
+    """
+    text = urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics').read().decode('utf-8')
+    metrics = {}
+    for line in text.splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            metrics[name] = float(value)
+    return metrics
+
+def summarize_server(metrics, duration):
+    """
+    the seconds per second the server spent in every phase of the tick, summed over the rooms, its tick stats,
+    and how well and at what cost the map messages compressed
+    """
+    phases = {}
+    overruns = 0
+    max_drift = 0.0
+    ticks = 0
+    compression = {'compression_input_bytes_total': 0.0, 'compression_output_bytes_total': 0.0,
+                   'compression_seconds_total': 0.0}
+    for name, value in metrics.items():
+        metric, labels = name.split('{', 1)
+        if metric.endswith('phase_seconds_total'):
+            phase = labels.split('phase="')[1].split('"')[0]
+            phases[phase] = phases.get(phase, 0.0) + value / duration
+        elif metric.endswith('tick_overruns_total'):
+            overruns += value
+        elif metric.endswith('tick_max_drift_seconds'):
+            max_drift = max(max_drift, value)
+        elif metric.endswith('ticks_total'):
+            ticks += value
+        else:
+            for counter in compression:
+                if metric.endswith(counter):
+                    compression[counter] += value
+    return {
+        'phase_load': phases, 'ticks': ticks, 'overruns': overruns, 'max_drift_ms': max_drift * 1000,
+        'compression_ratio': compression['compression_output_bytes_total'] / compression['compression_input_bytes_total']
+                             if compression['compression_input_bytes_total'] else 1.0,
+        'compression_ms_per_tick': compression['compression_seconds_total'] * 1000 / ticks if ticks else 0.0,
+    }
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def run(args):
+    rng = random.Random(args.seed)
+    server = start_server(args)
+    cpu_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    try:
+        fakes = []
+        for _ in range(args.clients):
+            fakes.append(FakeClient('127.0.0.1', args.port, random.Random(rng.random()), not args.no_compression))
+        by_socket = {fake.socket: fake for fake in fakes}
+
+        start = time.perf_counter()
+        end = start + args.duration
+        next_moves = {fake: start + rng.random() / args.move_rate for fake in fakes}
+        while True:
+            now = time.perf_counter()
+            if now >= end:
+                break
+            readable, _, _ = select.select(list(by_socket), [], [], min(0.01, end - now))
+            now = time.perf_counter()
+            for s in readable:
+                by_socket[s].receive(now)
+            for fake, due in next_moves.items():
+                if due <= now:
+                    fake.move(now)
+                    next_moves[fake] = due + rng.expovariate(args.move_rate)
+        duration = time.perf_counter() - start
+
+        server_metrics = scrape(args.metrics_port)
+    finally:
+        server.terminate()
+        server.wait()
+    cpu_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    server_cpu = (cpu_after.ru_utime - cpu_before.ru_utime) + (cpu_after.ru_stime - cpu_before.ru_stime)
+
+    intervals = [interval for fake in fakes for interval in fake.intervals]
+    latencies = [latency for fake in fakes for latency in fake.latencies]
+    total_bytes = sum(fake.bytes for fake in fakes)
+    return {
+        'messages_per_second': sum(fake.messages for fake in fakes) / duration,
+        'bytes_per_second': total_bytes / duration,
+        'bytes_per_second_per_client': total_bytes / duration / len(fakes),
+        'interval_ms': {
+            'mean': statistics.mean(intervals) * 1000 if intervals else 0.0,
+            'jitter': statistics.pstdev(intervals) * 1000 if intervals else 0.0,
+            'p99': percentile(intervals, 0.99) * 1000,
+        },
+        'move_latency_ms': {
+            'moves': len(latencies),
+            'p50': percentile(latencies, 0.5) * 1000,
+            'p95': percentile(latencies, 0.95) * 1000,
+            'p99': percentile(latencies, 0.99) * 1000,
+        },
+        # the whole run, including the start of the server process
+        'server_cpu_fraction': server_cpu / duration,
+        'server': summarize_server(server_metrics, duration),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='load a real server over localhost with many headless clients '
+                                                 'playing random moves')
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--players', type=int, default=2, help='players of every room')
+    parser.add_argument('--duration', type=float, default=20, help='seconds to measure')
+    parser.add_argument('--move-rate', type=float, default=2, help='moves per second of every client')
+    parser.add_argument('--tick-rate', type=float, default=4)
+    parser.add_argument('--size', type=int, default=25, help='rows and columns of the maps')
+    parser.add_argument('--port', type=int, default=12400)
+    parser.add_argument('--metrics-port', type=int, default=12401)
+    parser.add_argument('--no-compression', action='store_true', help='do not ask for compressed map messages')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--baseline', help='a json file of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='change against the baseline that counts as worse')
+    args = parser.parse_args()
+
+    results = run(args)
+    for name, value in result_files.flatten(results).items():
+        print(f"{name:40} {value:12.4g}")
+
+    config = {key: value for key, value in vars(args).items() if key not in ('json', 'baseline', 'tolerance')}
+    if args.json:
+        result_files.save(args.json, 'loadgen', config, results)
+    if args.baseline:
+        baseline = result_files.load(args.baseline)
+        if baseline['config'] != config:
+            print("the baseline was run with other options, the numbers may not compare")
+        regressions = result_files.compare(results, baseline['results'], args.tolerance,
+                                           higher_is_better=('messages_per_second', 'bytes_per_second',
+                                                             'bytes_per_second_per_client', 'server.ticks',
+                                                             'move_latency_ms.moves'))
+        if regressions:
+            raise SystemExit(f"worse than the baseline: {', '.join(regressions)}")
+
+if __name__ == '__main__':
+    main()
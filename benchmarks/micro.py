@@ -0,0 +1,157 @@
+import argparse
+import os
+import timeit
+
+from shared.map import Map
+from shared.engine import Engine
+from shared.protocol import Protocol
+from shared.binary_protocol import BinaryProtocol
+from shared.framing import FrameDecoder
+from benchmarks import results as result_files
+from constants.map import *
+
+BENCHMARKS = {} # name -> function of the map size returning the function to time
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+def new_engine(size, seed=0):
+    engine = Engine.new_game(2, rows=size, cols=size, seed=seed)
+    # play a little so the map has owned land, armies and deltas to send
+    for _ in range(30):
+        engine.step()
+    return engine
+
+@benchmark('map_interaction')
+def bench_interaction(size):
+    map = new_engine(size).map
+    (x, y), = [king for king in map.kings() if map.owners[king[1], king[0]] == 1]
+    to_x = x + 1 if x + 1 < map.cols else x - 1
+    map.types[y, to_x] = ARMY_CODE
+
+    def run():
+        map.armies[y, x] = 50
+        map.interaction(x, y, to_x, y, 1)
+    return run
+
+@benchmark('map_generate_new')
+def bench_generate(size):
+    map = Map(size, size)
+    return lambda: map.generate_new(2, seed=0)
+
+@benchmark('protocol_create_map_msg')
+def bench_create_map_msg(size):
+    map = new_engine(size).map
+    view = map.player_view(1)
+    return lambda: Protocol.create_map_msg(map, 1, 1, view, 0)
+
+@benchmark('binary_create_map_msg')
+def bench_binary_create_map_msg(size):
+    view = new_engine(size).map.player_view(1)
+    return lambda: BinaryProtocol.create_map_msg(1, 1, view, 0)
+
+@benchmark('protocol_handle_msg')
+def bench_handle_msg(size):
+    engine = new_engine(size)
+    msg = Protocol.create_map_msg(engine.map, 1, 1, None, 0).encode('utf-8')
+    (msg_type, content), = FrameDecoder().feed(msg)
+    map = Map(size, size)
+    return lambda: Protocol.handle_msg(msg_type, content, map, idlist=[])
+
+@benchmark('protocol_handle_delta_msg')
+def bench_handle_delta_msg(size):
+    engine = new_engine(size)
+    last_view = engine.map.player_view(1)
+    keyframe = Protocol.create_map_msg(engine.map, 1, 1, last_view, 0).encode('utf-8')
+    engine.step()
+    view = engine.map.player_view(1)
+    changed = (view[0] != last_view[0]) | (view[1] != last_view[1]) | (view[2] != last_view[2])
+    delta = Protocol.create_delta_msg(1, 2, view, changed, 0).encode('utf-8')
+    (keyframe_type, keyframe_content), (msg_type, content) = FrameDecoder().feed(keyframe + delta)
+    map = Map(size, size)
+
+    def run():
+        map.seq = 1
+        Protocol.handle_msg(msg_type, content, map, idlist=[])
+    Protocol.handle_msg(keyframe_type, keyframe_content, map, idlist=[])
+    return run
+
+@benchmark('game_draw_all_full')
+def bench_draw_full(size):
+    game, _ = new_game_window(size)
+
+    def run():
+        game.renderer.invalidate()
+        game.draw_all()
+    return run
+
+@benchmark('game_draw_all_tick')
+def bench_draw_tick(size):
+    game, engine = new_game_window(size)
+    game.draw_all()
+
+    def run():
+        engine.step()
+        game.interpolator.set_target(game.map)
+        game.draw_all()
+    return run
+
+def new_game_window(size):
+    """
+    a Game drawing a local engine's map in a hidden window, without a server
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    from client.ui.game import Game
+    from client.ui.viewport import Viewport
+    from client.ui.prediction import ArmyInterpolator
+    from client.ui.timings import StartupTimings
+
+    engine = new_engine(size)
+    game = Game.__new__(Game)
+    game.timings = StartupTimings()
+    game.init_display()
+    game.map = engine.map
+    game.id = 1
+    game.selected_tile = None
+    game.interpolator = ArmyInterpolator(duration=0)
+    game.interpolator.set_target(game.map)
+    game.viewport = Viewport(size, size)
+    game.renderer.viewport = game.viewport
+    return game, engine
+
+def time_call(function, repeat):
+    """
+    the best time of one call in microseconds, over (repeat) rounds of as many calls as fit in 0.2 seconds
+    """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description='time the hot functions of the game one by one')
+    parser.add_argument('--size', type=int, default=ROWS, help='rows and columns of the maps')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', help=f'comma separated, of {", ".join(BENCHMARKS)}')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--baseline', help='a json file of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='slowdown against the baseline that counts as worse')
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    results = {}
+    for name in names:
+        results[name] = time_call(BENCHMARKS[name](args.size), args.repeat)
+        print(f"{name:30} {results[name]:10.1f} us")
+
+    if args.json:
+        result_files.save(args.json, 'micro', {'size': args.size, 'repeat': args.repeat}, results)
+    if args.baseline:
+        regressions = result_files.compare(results, result_files.load(args.baseline)['results'], args.tolerance)
+        if regressions:
+            raise SystemExit(f"slower than the baseline: {', '.join(regressions)}")
+
+if __name__ == '__main__':
+    main()
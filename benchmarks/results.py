@@ -0,0 +1,51 @@
+import json
+import platform
+import sys
+import time
+
+def save(path, kind, config, results):
+    """
+    writes a run to (path) as json, with what is needed to tell runs apart
+    """
+    with open(path, 'w') as file:
+        json.dump({
+            'kind': kind,
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': sys.version.split()[0],
+            'machine': platform.machine(),
+            'config': config,
+            'results': results,
+        }, file, indent=4)
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+def compare(results, baseline, tolerance, higher_is_better=()):
+    """
+    prints every number of (results) next to the same one of the (baseline) run, and returns the names of
+    those more than (tolerance), a fraction, worse. numbers are lower is better unless their full dotted
+    name is in (higher_is_better)
+    """
+    regressions = []
+    print(f"{'':40} {'baseline':>12} {'now':>12} {'change':>8}")
+    for name, value in flatten(results).items():
+        old = flatten(baseline).get(name)
+        if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or old == 0:
+            continue
+        change = value / old - 1
+        worse = -change if name in higher_is_better else change
+        flag = ' worse' if worse > tolerance else ''
+        if flag:
+            regressions.append(name)
+        print(f"{name:40} {old:12.4g} {value:12.4g} {change:+8.1%}{flag}")
+    return regressions
+
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        else:
+            flat[f"{prefix}{key}"] = value
+    return flat
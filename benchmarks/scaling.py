@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import random
+import time
+
+from shared.engine import Engine
+from server.network.views import ViewTracker
+from simulation.bots import GreedyBot
+from constants.protocol import *
+
+def bench_server(size, num_players, ticks, seed):
+    """
+    plays (ticks) ticks between greedy bots on a (size)x(size) map, with a view tracker per player for
+    each wire format. returns the mean tick time of the simulation and of the encoding, and the mean
+    message sizes
+    """
+    engine = Engine.new_game(num_players, rows=size, cols=size, seed=seed)
+    bots = [GreedyBot(id, random.Random(seed * 10 + id)) for id in range(1, num_players + 1)]
+    trackers = {}
+    for version in (TEXT_VERSION, BINARY_VERSION):
+        trackers[version] = [ViewTracker(engine.map, id) for id in range(1, num_players + 1)]
+        for tracker in trackers[version]:
+            tracker.deltas = True
+            tracker.version = version
+
+    keyframes = {version: len(trackers[version][0].next_msg()) for version in trackers}
+    delta_bytes = {version: 0 for version in trackers}
+    step_time = 0
+    encode_time = {version: 0 for version in trackers}
+
+    for _ in range(ticks):
+        start = time.perf_counter()
+        actions = []
+        for bot in bots:
+            actions.extend((bot.id, *move) for move in bot.act(engine.view(bot.id)))
+        engine.step(actions)
+        step_time += time.perf_counter() - start
+
+        for version, version_trackers in trackers.items():
+            start = time.perf_counter()
+            for tracker in version_trackers:
+                delta_bytes[version] += len(tracker.next_msg())
+            encode_time[version] += time.perf_counter() - start
+
+    messages = ticks * num_players
+    return {
+        'step_ms': step_time / ticks * 1000,
+        'encode_text_ms': encode_time[TEXT_VERSION] / ticks * 1000,
+        'encode_binary_ms': encode_time[BINARY_VERSION] / ticks * 1000,
+        'keyframe_text_bytes': keyframes[TEXT_VERSION],
+        'keyframe_binary_bytes': keyframes[BINARY_VERSION],
+        'message_text_bytes': delta_bytes[TEXT_VERSION] / messages,
+        'message_binary_bytes': delta_bytes[BINARY_VERSION] / messages,
+    }, engine
+
+def bench_client(engine, frames):
+    """
+    times the renderer of the client, with a hidden window, on the map of a finished server bench: a
+    full redraw at the default zoom and zoomed out to the smallest tiles, and the frames of the ticks
+    that follow. returns None if pygame is not installed
+    """
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    try:
+        import pygame
+    except ImportError:
+        return None
+    from client.ui.renderer import Renderer
+    from client.ui.viewport import Viewport
+    from client.ui.glyphs import GlyphCache
+    from client.ui.atlas import SpriteAtlas
+    from constants.game import WIDTH, HEIGHT, SIDEBAR_WIDTH
+
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH + SIDEBAR_WIDTH, HEIGHT))
+    atlas = SpriteAtlas({name: pygame.Surface((32, 32)) for name in ('K', 'C', 'M', 'OBSTACLE')})
+    glyphs = GlyphCache(pygame.font.SysFont(None, 24))
+    map = engine.map
+    viewport = Viewport(map.rows, map.cols)
+    renderer = Renderer(screen, atlas, glyphs, viewport)
+
+    start = time.perf_counter()
+    renderer.draw(map, 1, None)
+    full_ms = (time.perf_counter() - start) * 1000
+
+    frame_time = 0
+    for _ in range(frames):
+        engine.step()
+        start = time.perf_counter()
+        renderer.draw(map, 1, None)
+        frame_time += time.perf_counter() - start
+
+    viewport.zoom(-100)
+    start = time.perf_counter()
+    renderer.draw(map, 1, None)
+    zoomed_out_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        'full_frame_ms': full_ms,
+        'frame_ms': frame_time / frames * 1000,
+        'full_frame_zoomed_out_ms': zoomed_out_ms,
+        'zoomed_out_tile_size': viewport.tile_size,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='how the server tick, the map messages and the client frames scale with the map size')
+    parser.add_argument('--sizes', default='25,50,100,200', help='comma separated map sizes, the maps are square')
+    parser.add_argument('--players', type=int, default=8)
+    parser.add_argument('--ticks', type=int, default=100)
+    parser.add_argument('--frames', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-client', action='store_true', help='skip the client frame times')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    results = {}
+    for size in (int(size) for size in args.sizes.split(',')):
+        result, engine = bench_server(size, args.players, args.ticks, args.seed)
+        if not args.no_client:
+            client = bench_client(engine, args.frames)
+            if client is not None:
+                result.update(client)
+        results[size] = result
+
+        print(f"{size}x{size}: " + ", ".join(f"{key} {value:.2f}" if isinstance(value, float) else f"{key} {value}"
+                                             for key, value in result.items()))
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({'players': args.players, 'ticks': args.ticks, 'results': results}, file, indent=4)
+
+if __name__ == '__main__':
+    main()
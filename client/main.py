@@ -1,15 +1,27 @@
+import time
+START = time.perf_counter() # before the imports, which take most of the startup
+
+import argparse
 from network.client import *
-from shared.map import *
-from client.ui.game import *
 from ui.game_menu import *
-import time
+from client.ui.timings import StartupTimings
 
 def main():
+    parser = argparse.ArgumentParser(description='the game client')
+    parser.add_argument('--timings', action='store_true', help='print how long the steps of the startup took')
+    args = parser.parse_args()
+
+    timings = StartupTimings(START, args.timings)
+    timings.mark("imports")
     client = Client(None, None)
-    menu = GameMenu(client)
+    menu = GameMenu(client, timings)
     menu.run()
+    timings.skip()
 
-    game = Game(client)
+    # the game is only imported once the menu is up, it is not needed to show it
+    from client.ui.game import Game
+    timings.mark("game imports")
+    game = Game(client, timings)
     game.run()
 
 if __name__ == '__main__':
@@ -1,6 +1,7 @@
 import socket
 import time
 from shared.protocol import *
+from shared.binary_protocol import BinaryProtocol
 from shared.map import *
 from constants.protocol import *
 
@@ -10,14 +11,77 @@ class Client:
         self.port = port
         self.map = map
         self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.version = TEXT_VERSION # until the server answers our hello
+        self.room = None # room to join or create, the server's default room if None
+        self.room_players = None # number of players of a new room, the server's default if None
+        self.room_dims = None # (rows, cols) of the map of a new room, the server's default if None
+        self.spectate = None # id of the player to watch, 0 for the whole map, None to play
+        self.compress = True # ask the server to compress the map messages
+        self.compressed = False # if the server agreed to
+        self.action_seq = 0 # sequence number of the last action sent
         
     def connect(self):
         self.client_socket.connect((self.ip, self.port))
+        hello = Protocol.create_hello_msg(room=self.room, players=self.room_players, dims=self.room_dims,
+                                          spectate=self.spectate, compress=self.compress)
+        self.client_socket.sendall(hello.encode('utf-8'))
         return True
 
+    def handle_hello(self, content):
+        self.version = min(int(content.get('version', TEXT_VERSION)), PROTOCOL_VERSION)
+        self.compressed = content.get('compress') == '1'
+
     def send_action(self, from_x, from_y, to_x, to_y):
-        msg = Protocol.create_action_msg(from_x, from_y, to_x, to_y)
-        self.client_socket.sendall(msg.encode('utf-8'))
+        """
+        sends a move and returns its sequence number, the server acknowledges it in its map messages
+        once processed. returns None if the move was not sent
+        """
+        if not Protocol._check_can_move(from_x, from_y, to_x, to_y):
+            return None
+
+        self.action_seq += 1
+        if self.version == BINARY_VERSION:
+            msg = BinaryProtocol.create_action_msg(from_x, from_y, to_x, to_y, self.action_seq)
+        else:
+            msg = Protocol.create_action_msg(from_x, from_y, to_x, to_y, self.action_seq).encode('utf-8')
+        self.client_socket.sendall(msg)
+        return self.action_seq
+
+    def send_path(self, path):
+        """
+        queues moves along (path), a list of (x, y) tiles, on the server. returns the sequence number
+        acknowledged once the last of them was made, or None if the path was not sent
+        """
+        if len(path) < 2:
+            return None
+
+        self.action_seq += 1
+        if self.version == BINARY_VERSION:
+            msg = BinaryProtocol.create_path_msg(path, self.action_seq)
+        else:
+            msg = Protocol.create_path_msg(path, self.action_seq).encode('utf-8')
+        self.client_socket.sendall(msg)
+        return self.action_seq
+
+    def send_go(self, from_x, from_y, to_x, to_y):
+        """
+        asks the server to move the army of a tile to another, far away tile. returns the sequence number
+        of the request
+        """
+        self.action_seq += 1
+        if self.version == BINARY_VERSION:
+            msg = BinaryProtocol.create_go_msg(from_x, from_y, to_x, to_y, self.action_seq)
+        else:
+            msg = Protocol.create_go_msg(from_x, from_y, to_x, to_y, self.action_seq).encode('utf-8')
+        self.client_socket.sendall(msg)
+        return self.action_seq
+
+    def request_resync(self):
+        if self.version == BINARY_VERSION:
+            msg = BinaryProtocol.create_resync_msg()
+        else:
+            msg = Protocol.create_resync_msg().encode('utf-8')
+        self.client_socket.sendall(msg)
 
     def check_connected(self):
         try:
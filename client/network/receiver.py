@@ -0,0 +1,68 @@
+import threading
+
+from shared.protocol import *
+from shared.map import *
+from shared.framing import FrameDecoder
+
+class Receiver:
+    """
+    the client's only network thread. it applies the map messages to a back buffer map that nobody else
+    touches, and after every read that changed it publishes a copy of it as self.snapshot.
+    publishing is a single reference assignment, so no lock is needed: a reader takes self.snapshot once
+    and keeps using that object, which is never written to again
+    """
+    def __init__(self, client):
+        self.client = client
+        self.decoder = FrameDecoder(compressed=True)
+        self.back = Map()
+        self.snapshot = None # latest complete map, None until the first one arrives
+        self.id = None
+        self.resync_requested = False
+        self.connected = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        s = self.client.client_socket
+        while True:
+            try:
+                messages = self.decoder.recv(s)
+            except (ConnectionError, ValueError, OSError) as e:
+                print(f"Disconnected from server: {e}")
+                self.connected = False
+                return
+
+            changed = False
+            for msg_type, content in messages:
+                changed = self.handle_message(msg_type, content) or changed
+
+            if changed and self.back.is_loaded():
+                self.snapshot = self.back.copy()
+
+    def handle_message(self, msg_type, content):
+        """
+        applies one message to the back buffer, returns True if the map changed
+        """
+        if msg_type == 'H':
+            self.client.handle_hello(content)
+            return False
+        if not content:
+            return False
+
+        idlist = []
+        Protocol.handle_msg(msg_type, content, self.back, idlist=idlist)
+        if idlist:
+            self.id = idlist[0]
+
+        # a delta did not follow the last message we applied, ask the server for a full map once
+        if self.back.seq is None and msg_type == 'D':
+            if not self.resync_requested:
+                self.client.request_resync()
+                self.resync_requested = True
+            return False
+
+        if self.back.seq is not None:
+            self.resync_requested = False
+        return True
@@ -0,0 +1,23 @@
+import time
+START = time.perf_counter() # before the imports, which take most of the startup
+
+import argparse
+
+from client.ui.timings import StartupTimings
+from client.ui.replay_viewer import ReplayViewer
+
+def main():
+    parser = argparse.ArgumentParser(description='watch a game recorded by the server with --replay-dir')
+    parser.add_argument('path', help='the .replay file')
+    parser.add_argument('--tick', type=int, default=0, help='tick to start from')
+    parser.add_argument('--timings', action='store_true', help='print how long the steps of the startup took')
+    args = parser.parse_args()
+
+    timings = StartupTimings(START, args.timings)
+    timings.mark("imports")
+    viewer = ReplayViewer(args.path, timings)
+    viewer.seek(args.tick)
+    viewer.run()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import os
+import zlib
+
+import pygame
+
+class SpriteAtlas:
+    """
+    the sprites of the tiles, scaled to every size the renderer asks for. all the sprites of a size are
+    one surface, converted for fast blits, and the sprites are subsurfaces of it. atlases of sprites
+    loaded from files are kept in (cache_dir) by size, so later runs load one image instead of
+    loading and scaling every sprite. (sources) maps the sprite names to their files or to surfaces
+    """
+    def __init__(self, sources, cache_dir=None):
+        self.sources = sources
+        self.names = list(sources)
+        self.cache_dir = os.path.expanduser(cache_dir) if cache_dir else None
+        self.stamp = self._stamp() if self.cache_dir else None
+        self.atlases = {} # sprite size -> name -> sprite
+        self.loaded = None # the unscaled sprites, loaded the first time an atlas is not cached
+
+    def sprites(self, size):
+        sprites = self.atlases.get(size)
+        if sprites is None:
+            atlas = self._load(size)
+            sprites = self.atlases[size] = {name: atlas.subsurface((index * size, 0, size, size))
+                                            for index, name in enumerate(self.names)}
+        return sprites
+
+    def _load(self, size):
+        path = None
+        if self.stamp is not None:
+            path = os.path.join(self.cache_dir, f"atlas-{size}-{self.stamp:08x}.png")
+            if os.path.exists(path):
+                try:
+                    return self._convert(pygame.image.load(path))
+                except pygame.error:
+                    pass # a broken cache file is built again
+
+        atlas = pygame.Surface((max(size * len(self.names), 1), max(size, 1)), pygame.SRCALPHA)
+        for index, name in enumerate(self.names):
+            atlas.blit(pygame.transform.scale(self._source(name), (size, size)), (index * size, 0))
+        if path is not None:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                # written aside and renamed, so another client never reads half a file
+                temp_path = f"{path}.{os.getpid()}.png"
+                pygame.image.save(atlas, temp_path)
+                os.replace(temp_path, path)
+            except (OSError, pygame.error):
+                pass # the atlas is only not cached
+        return self._convert(atlas)
+
+    def _source(self, name):
+        if self.loaded is None:
+            self.loaded = {name: pygame.image.load(source) if isinstance(source, str) else source
+                           for name, source in self.sources.items()}
+        return self.loaded[name]
+
+    def _stamp(self):
+        """
+        a checksum of the names and files of the sprites, which names the cached atlases so that changed
+        sprites are scaled again. None if a sprite is not a file
+        """
+        if not all(isinstance(source, str) for source in self.sources.values()):
+            return None
+        files = []
+        for name, source in self.sources.items():
+            stat = os.stat(source)
+            files.append(f"{name}:{os.path.abspath(source)}:{stat.st_size}:{stat.st_mtime_ns}")
+        return zlib.crc32('\n'.join(files).encode('utf-8'))
+
+    @staticmethod
+    def _convert(atlas):
+        # converting needs a display, without one the atlas is blitted as it is
+        if pygame.display.get_surface() is None:
+            return atlas
+        return atlas.convert_alpha()
@@ -1,53 +1,37 @@
 import sys
 import os
 import pygame
+import numpy as np
 import threading
 import time
 from client.network.client import *
+from client.network.receiver import Receiver
 from shared.map import *
 from shared.protocol import *
+from client.ui.renderer import Renderer
+from client.ui.glyphs import GlyphCache
+from client.ui.atlas import SpriteAtlas
+from client.ui.timings import StartupTimings
+from client.ui.viewport import Viewport
+from client.ui.prediction import Predictor, ArmyInterpolator
 from constants.game import *
 from constants.colors import *
 
-# Define the sidebar width
-SIDEBAR_WIDTH = 50
-
 class Game:
-    def __init__(self, client):
+    def __init__(self, client, timings=None):
         sys.stdout.flush()
-
-        pygame.init()
-
-        # Adjust the screen size to include the sidebar
-        self.screen = pygame.display.set_mode((WIDTH + SIDEBAR_WIDTH, HEIGHT))
-        pygame.display.set_caption("Generals.io-like Game")
+        self.timings = timings if timings is not None else StartupTimings()
+        self.init_display()
 
         self.map = Map()
         self.client = client
-        self.clock = pygame.time.Clock()
         self.id = None
-
-        # Load and scale sprites once
-        base_path = os.path.dirname(__file__)
-        SCALE_SIZE = 0.85 * TILE_SIZE
-        self.sprites = {
-            KING: pygame.transform.scale(pygame.image.load(os.path.join(base_path, 'assets', 'crown.png')), (SCALE_SIZE, SCALE_SIZE)),
-            CITY: pygame.transform.scale(pygame.image.load(os.path.join(base_path, 'assets', 'city.png')), (SCALE_SIZE, SCALE_SIZE)),
-            MOUNTAIN: pygame.transform.scale(pygame.image.load(os.path.join(base_path, 'assets', 'mountain.png')), (SCALE_SIZE, SCALE_SIZE)),
-            'OBSTACLE': pygame.transform.scale(pygame.image.load(os.path.join(base_path, 'assets', 'obstacle.png')), (SCALE_SIZE, SCALE_SIZE))
-        }
-
-        # Calculate offsets for centering sprites
-        self.sprite_offset = (TILE_SIZE - SCALE_SIZE) / 2
-
-        # Create font objects
-        self.font = pygame.font.SysFont(None, 24)
-        self.wait_font = pygame.font.SysFont(None, 100)
+        self.spectating = client.spectate is not None # spectators only watch, self.id is the player watched
+        self.receiver = Receiver(client)
 
         if self.client.check_connected():
             print("Connected to server...")
-            comm_thread = threading.Thread(target=self.client_communication)
-            comm_thread.start()
+            self.receiver.start()
         else:
             exit("NOT CONNECTED")
 
@@ -57,142 +41,116 @@ class Game:
         self.screen.blit(waiting_text, text_rect)
         pygame.display.update()
 
-        while self.map.tiles[0][0] is None:
+        while self.receiver.snapshot is None:
             time.sleep(0.05)
+        self.timings.mark("waiting for the game")
+        self.id = self.receiver.id
+        self.predictor = Predictor(self.id)
+        self.interpolator = ArmyInterpolator()
+        self.update_map()
 
         print("id:", self.id)
 
         self.selected_tile = None
-        for y in range(ROWS):
-            for x in range(COLS):
-                if self.map.tiles[y][x].owner == self.id:
-                    self.selected_tile = [x, y]
-                    break
-            if self.selected_tile is not None:
-                break
+        owned = np.argwhere(self.map.owners == self.id)
+        if len(owned) > 0 and self.id > 0:
+            self.selected_tile = [int(owned[0][1]), int(owned[0][0])]
+            self.viewport.center_on(*self.selected_tile)
+        if self.spectating:
+            self.selected_tile = None
 
         print("selected tile:", self.selected_tile)
 
-    def client_communication(self):
-        while True:
-            msg_thread = threading.Thread(target=self.get_message)
-            msg_thread.start()
-            msg_thread.join()
+    def init_display(self):
+        """
+        opens the window - or resizes the menu's, pygame is initialized once - and gets what drawing
+        the map needs ready
+        """
+        if not pygame.get_init():
+            pygame.init()
+
+        # Adjust the screen size to include the sidebar
+        self.screen = pygame.display.set_mode((WIDTH + SIDEBAR_WIDTH, HEIGHT))
+        pygame.display.set_caption("Generals.io-like Game")
+        self.clock = pygame.time.Clock()
+        self.timings.mark("display")
 
-    def get_message(self):
-        msg_type, content = Protocol.get_message(self.client.client_socket)
-        if content and content != "":
-            idlist = []
-            Protocol.handle_msg(msg_type, content, self.map, idlist=idlist)
-            self.id = idlist[0]
+        # The sprites are scaled to the zoom on first use, or loaded scaled from the atlas cache
+        base_path = os.path.dirname(__file__)
+        self.atlas = SpriteAtlas({
+            KING: os.path.join(base_path, 'assets', 'crown.png'),
+            CITY: os.path.join(base_path, 'assets', 'city.png'),
+            MOUNTAIN: os.path.join(base_path, 'assets', 'mountain.png'),
+            'OBSTACLE': os.path.join(base_path, 'assets', 'obstacle.png')
+        }, ATLAS_CACHE_DIR)
+
+        # Create font objects
+        self.font = pygame.font.SysFont(None, 24)
+        self.wait_font = pygame.font.SysFont(None, 100)
+        self.glyphs = GlyphCache(self.font)
+        self.viewport = None # created once the size of the map is known
+        self.renderer = Renderer(self.screen, self.atlas, self.glyphs)
+        self.timings.mark("fonts and renderer")
 
     def print_map(self):
         while True:
             print("Printing map...")
-            for y in range(ROWS):
-                for x in range(COLS):
-                    print(self.map.tiles[y][x].army, end=' ')
+            for y in range(self.map.rows):
+                for x in range(self.map.cols):
+                    print(self.map.armies[y, x], end=' ')
                 print()  # For better readability in the console
 
             print("\n\n\n")
             time.sleep(1)
 
-    def draw_all(self):
-        dirty_rects = []
-
-        for y in range(ROWS):
-            for x in range(COLS):
-                tile = self.map.tiles[y][x]
-
-                rect = pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
-
-                if self.map.check_near_tile(x, y, self.id) or tile.owner == self.id:
-                    # Conditions based on tile type and owner when near the player's tiles
-                    if tile.owner == 0:
-                        if tile.type == MOUNTAIN:
-                            pygame.draw.rect(self.screen, MIDDLE_GRAY, rect)
-                            sprite = self.sprites.get(MOUNTAIN)
-                        elif tile.type == CITY:
-                            pygame.draw.rect(self.screen, DARK_GRAY, rect)
-                            sprite = self.sprites.get(CITY)
-                        elif tile.type == ARMY:
-                            pygame.draw.rect(self.screen, LIGHT_GRAY, rect)
-                            sprite = None
-                    else:
-                        pygame.draw.rect(self.screen, PLAYER_COLORS[tile.owner - 1], rect)
-                        if tile.type == MOUNTAIN:
-                            sprite = self.sprites.get(MOUNTAIN)
-                        elif tile.type == CITY:
-                            sprite = self.sprites.get(CITY)
-                        elif tile.type == KING:
-                            sprite = self.sprites.get(KING)
-                        else:
-                            sprite = None
-                else:
-                    # Default conditions for tiles
-                    if tile.owner > 0:
-                        pygame.draw.rect(self.screen, PLAYER_COLORS[tile.owner - 1], rect)
-                    elif tile.owner == 0:
-                        if tile.type == MOUNTAIN:
-                            pygame.draw.rect(self.screen, DARKER_GRAY, rect)
-                            sprite = self.sprites.get('OBSTACLE')
-                        elif tile.type == CITY:
-                            pygame.draw.rect(self.screen, DARKER_GRAY, rect)
-                            sprite = self.sprites.get('OBSTACLE')
-                        elif tile.type == ARMY:
-                            pygame.draw.rect(self.screen, DARKER_GRAY, rect)
-                            sprite = None
-
-                if self.selected_tile is not None:
-                    selected_rect = pygame.Rect(self.selected_tile[0] * TILE_SIZE, self.selected_tile[1] * TILE_SIZE, TILE_SIZE, TILE_SIZE)
-                    pygame.draw.rect(self.screen, WHITE, selected_rect, 2)
-
-                # Draw the sprite if available
-                if sprite:
-                    sprite_pos = (x * TILE_SIZE + self.sprite_offset, y * TILE_SIZE + self.sprite_offset)
-                    self.screen.blit(sprite, sprite_pos)
-
-                # Draw armies
-                if tile.type != MOUNTAIN and not (tile.type == ARMY and tile.owner == 0):
-                    army_text = self.font.render(str(tile.army), True, WHITE)
-                    text_rect = army_text.get_rect(center=(x * TILE_SIZE + TILE_SIZE / 2, y * TILE_SIZE + TILE_SIZE / 2))
-                    self.screen.blit(army_text, text_rect)
-
-                # Draw grid
-                pygame.draw.rect(self.screen, BLACK, rect, 1)
-
-                dirty_rects.append(rect)
-
-        # Draw the sidebar with the player's color
-        if self.id is not None and (self.id - 1) < len(PLAYER_COLORS):
-            sidebar_color = PLAYER_COLORS[self.id - 1]
-        else:
-            sidebar_color = MIDDLE_GRAY  # Fallback color
+    def update_map(self):
+        """
+        takes the latest snapshot of the receiver, with our unacknowledged moves replayed on top of it.
+        the map stays the same object until the next snapshot or move
+        """
+        if self.predictor.update(self.receiver.snapshot):
+            self.map = self.predictor.map
+            self.interpolator.set_target(self.map)
+            if self.viewport is None or (self.viewport.rows, self.viewport.cols) != (self.map.rows, self.map.cols):
+                self.viewport = Viewport(self.map.rows, self.map.cols)
+                self.renderer.viewport = self.viewport
 
-        sidebar_rect = pygame.Rect(WIDTH, 0, SIDEBAR_WIDTH, HEIGHT)
-        pygame.draw.rect(self.screen, sidebar_color, sidebar_rect)
-
-        return dirty_rects
+    def draw_all(self):
+        return self.renderer.draw(self.map, self.id, self.selected_tile, self.interpolator.armies())
 
     def move(self, to_x, to_y):
+        if self.spectating or self.selected_tile is None or not self._check_exist(to_x, to_y):
+            return
         from_x = self.selected_tile[0]
         from_y = self.selected_tile[1]
 
-        if self.selected_tile is None or not self._check_exist(to_x, to_y) \
-        or self.map.tiles[from_y][from_x].type == MOUNTAIN \
+        if self.map.tiles[from_y][from_x].type == MOUNTAIN \
         or self.map.tiles[to_y][to_x].type == MOUNTAIN:
             return
         
-        self.client.send_action(from_x, from_y, to_x, to_y)
+        seq = self.client.send_action(from_x, from_y, to_x, to_y)
+        if seq is not None:
+            # show the move right away, the server's next maps confirm or correct it
+            self.predictor.predict(seq, from_x, from_y, to_x, to_y)
+            self.interpolator.set_target(self.map)
         self.selected_tile = [to_x, to_y]
+        self.viewport.follow(to_x, to_y)
+
+    def go(self, to_x, to_y):
+        """
+        sends the army of the selected tile to any tile, the server finds the way and makes the moves
+        """
+        if self.spectating or self.selected_tile is None or not self._check_exist(to_x, to_y):
+            return
+        self.client.send_go(self.selected_tile[0], self.selected_tile[1], to_x, to_y)
 
     def _check_exist(self, x, y):
-        return 0 <= x < COLS and 0 <= y < ROWS
+        return self.map.tile_exists(x, y)
 
     def select_tile(self, tile_pos):
-        x, y = tile_pos
         # Check if the clicked tile is within the bounds of the map
-        if self._check_exist(x, y):
+        if tile_pos is not None and self._check_exist(*tile_pos) and not self.spectating:
+            x, y = tile_pos
             if self.map.tiles[y][x].owner == self.id:
                 self.selected_tile = tile_pos
                 return True
@@ -206,8 +164,12 @@ class Game:
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                if self.timings.enabled:
+                    print("glyph cache:", self.glyphs.stats())
                 pygame.quit()
                 sys.exit()
+            elif event.type == pygame.VIDEOEXPOSE:
+                self.renderer.invalidate()
             elif event.type == pygame.KEYDOWN and self.selected_tile is not None:
                 x = self.selected_tile[0]
                 y = self.selected_tile[1]
@@ -219,16 +181,30 @@ class Game:
                     self.move(x-1, y)
                 elif event.key == pygame.K_RIGHT or event.key == pygame.K_d:
                     self.move(x+1, y)
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                mouse_pos = pygame.mouse.get_pos()
-                tile_pos = (mouse_pos[0] // TILE_SIZE, mouse_pos[1] // TILE_SIZE) # (x < COLS, y < ROWS)
-                self.select_tile(tile_pos)
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button in (1, 3):
+                tile_pos = self.viewport.tile_at(event.pos) # None outside the map
+                if event.button == 3:
+                    if tile_pos is not None:
+                        self.go(*tile_pos)
+                else:
+                    self.select_tile(tile_pos)
+            elif event.type == pygame.MOUSEWHEEL:
+                self.viewport.zoom(event.y, pygame.mouse.get_pos())
+            elif event.type == pygame.MOUSEMOTION and event.buttons[1]:
+                # drag with the middle button to scroll
+                self.viewport.scroll(-event.rel[0], -event.rel[1])
 
     def run(self):
+        first_frame = True
         while True:
+            self.update_map()
             self.handle_events()
-            self.screen.fill(WHITE)
             dirty_rects = self.draw_all()
             pygame.display.update(dirty_rects)
+            if first_frame:
+                # the first frame scales or loads the sprites of the tile size
+                self.timings.mark("first frame")
+                self.timings.report("join")
+                first_frame = False
             self.clock.tick(FPS)
 
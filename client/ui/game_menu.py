@@ -2,13 +2,21 @@ import pygame_menu
 import pygame
 import sys
 
-from pygame_menu.examples import create_example_window
 from typing import Tuple, Any
+from client.ui.timings import StartupTimings
 from constants.game_menu import *
+from constants.map import ROWS
 
 class GameMenu:
-    def __init__(self, client):
-        self.surface = create_example_window('Example - Simple', (WIDTH, HEIGHT))
+    def __init__(self, client, timings=None):
+        self.timings = timings if timings is not None else StartupTimings()
+        # pygame is initialized here once, the game resizes this window instead of opening another
+        if not pygame.get_init():
+            pygame.init()
+        self.surface = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption('Game Menu')
+        self.timings.mark("display")
+
         self.menu = pygame_menu.Menu(
             width=WIDTH,
             height=HEIGHT,
@@ -21,11 +29,17 @@ class GameMenu:
         #self.name = self.menu.add.text_input('Player name (optional): ', maxchar=NAME_MAXCHAR, align=pygame_menu.locals.ALIGN_LEFT)
         self.ipaddr = self.menu.add.text_input('IP Address: ', maxchar=IP_MAXCHAR, align=pygame_menu.locals.ALIGN_LEFT)
         self.port = self.menu.add.text_input('Port: ', maxchar=PORT_MAXCHAR, align=pygame_menu.locals.ALIGN_LEFT, default=12345)
+        self.room = self.menu.add.text_input('Room (optional): ', maxchar=ROOM_MAXCHAR, align=pygame_menu.locals.ALIGN_LEFT)
+        self.room_players = self.menu.add.text_input('Players (new room): ', maxchar=1, input_type=pygame_menu.locals.INPUT_INT, align=pygame_menu.locals.ALIGN_LEFT, default=2)
+        self.room_size = self.menu.add.text_input('Map size (new room): ', maxchar=3, input_type=pygame_menu.locals.INPUT_INT, align=pygame_menu.locals.ALIGN_LEFT, default=ROWS)
+        self.spectate = self.menu.add.text_input('Spectate player (0 = all): ', maxchar=1, align=pygame_menu.locals.ALIGN_LEFT)
         self.menu.add.button('Join', self.start_the_game)
         self.menu.add.button('Quit', pygame_menu.events.EXIT)
         
         # Add a label for error message
         self.error_label = self.menu.add.label('', align=pygame_menu.locals.ALIGN_CENTER, font_color=(255, 0, 0))
+        self.running = True
+        self.timings.mark("menu")
 
     def set_difficulty(self, selected: Tuple, value: Any) -> None:
         """
@@ -41,31 +55,47 @@ class GameMenu:
         self.client.ip = self.ipaddr.get_value()
         self.client.port = int(self.port.get_value())
 
+        # ':' separates keys and values in the text protocol
+        room = self.room.get_value().replace(':', '').strip()
+        if room:
+            self.client.room = room
+            self.client.room_players = int(self.room_players.get_value())
+            size = int(self.room_size.get_value())
+            self.client.room_dims = (size, size)
+
+        spectate = self.spectate.get_value().strip()
+        if spectate.isdigit():
+            self.client.spectate = int(spectate)
+
         if self.client.connect():
-            pygame.quit()
+            self.running = False
 
     def run(self):
         try:
             clock = pygame.time.Clock()
-            running = True
-            while running:
+            first_frame = True
+            while self.running:
                 events = pygame.event.get()
                 for event in events:
                     if event.type == pygame.QUIT:
-                        running = False
+                        pygame.quit()
+                        sys.exit()
 
                     # Check if the Enter key was pressed
                     if event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN:
                         # Check if the entered name is "name"
                         self.start_the_game()
 
-                if not running:
+                if not self.running:
                     break
                 self.menu.update(events)
                 self.menu.draw(self.surface)
                 pygame.display.update()
+                if first_frame:
+                    self.timings.mark("first frame")
+                    self.timings.report("launch")
+                    first_frame = False
                 clock.tick(30)
-            pygame.quit()
         except Exception as e:
             print(e)
 
@@ -0,0 +1,72 @@
+from collections import OrderedDict
+
+import pygame
+
+from constants.game import *
+
+class GlyphCache:
+    """
+    pre-rendered number surfaces, keyed by value and color. the least recently used ones are evicted once
+    there are more than (size). numbers from (compose_from) up are put together from cached digit
+    glyphs instead of being rasterized, so big armies cost a few blits instead of a font render
+    """
+    def __init__(self, font, size=GLYPH_CACHE_SIZE, compose_from=COMPOSE_GLYPHS_FROM):
+        self.font = font
+        self.size = size
+        self.compose_from = compose_from
+        self.numbers = OrderedDict() # (value, color) -> surface, oldest first
+        self.digits = {} # (digit, color) -> surface, never evicted
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def render(self, value, color):
+        key = (int(value), color)
+        surface = self.numbers.get(key)
+        if surface is not None:
+            self.numbers.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        if key[0] >= self.compose_from:
+            surface = self._compose(str(key[0]), color)
+        else:
+            surface = self.font.render(str(key[0]), True, color)
+
+        self.numbers[key] = surface
+        if len(self.numbers) > self.size:
+            self.numbers.popitem(last=False)
+            self.evictions += 1
+        return surface
+
+    def _compose(self, text, color):
+        glyphs = [self._digit(digit, color) for digit in text]
+        width = sum(glyph.get_width() for glyph in glyphs)
+        height = max(glyph.get_height() for glyph in glyphs)
+
+        surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        x = 0
+        for glyph in glyphs:
+            surface.blit(glyph, (x, 0))
+            x += glyph.get_width()
+        return surface
+
+    def _digit(self, digit, color):
+        key = (digit, color)
+        glyph = self.digits.get(key)
+        if glyph is None:
+            glyph = self.font.render(digit, True, color)
+            self.digits[key] = glyph
+        return glyph
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'cached': len(self.numbers),
+            'digits': len(self.digits),
+        }
@@ -0,0 +1,82 @@
+import time
+from collections import deque
+import numpy as np
+
+from constants.game import *
+
+class Predictor:
+    """
+    shows our own moves before the server has processed them. sent moves wait in a queue until a map
+    message acknowledges them, and the map shown is the latest server snapshot with the moves still in
+    the queue replayed on top of it by the same Map.interaction the server uses. a new snapshot drops
+    the acknowledged moves and replays the rest, so wrong guesses last only until then
+    """
+    def __init__(self, id):
+        self.id = id
+        self.pending = deque() # (seq, from_x, from_y, to_x, to_y) of the moves sent but not acknowledged
+        self.snapshot = None
+        self.map = None
+
+    def update(self, snapshot):
+        """
+        reconciles with (snapshot) if it is new, returns True if self.map changed
+        """
+        if snapshot is self.snapshot:
+            return False
+        self.snapshot = snapshot
+
+        # a server that sends no acks never confirms anything, so nothing can be predicted
+        if snapshot.ack is None:
+            self.pending.clear()
+        while self.pending and self.pending[0][0] <= snapshot.ack:
+            self.pending.popleft()
+
+        self.map = snapshot.copy()
+        for seq, from_x, from_y, to_x, to_y in self.pending:
+            self.map.interaction(from_x, from_y, to_x, to_y, self.id)
+        return True
+
+    def predict(self, seq, from_x, from_y, to_x, to_y):
+        """
+        applies a move just sent with sequence number (seq)
+        """
+        if self.map is None:
+            return
+        self.pending.append((seq, from_x, from_y, to_x, to_y))
+        self.map.interaction(from_x, from_y, to_x, to_y, self.id)
+
+class ArmyInterpolator:
+    """
+    the army counts to draw. when the map changes, every tile whose owner stayed the same counts from
+    the value it showed to the new one over (duration) seconds, instead of jumping there
+    """
+    def __init__(self, duration=INTERPOLATION_TIME, clock=time.perf_counter):
+        self.duration = duration
+        self.clock = clock
+        self.start_armies = None
+        self.target_armies = None
+        self.owners = None
+        self.same_owner = None
+        self.start_time = 0
+
+    def set_target(self, map):
+        now = self.clock()
+        if self.target_armies is None or self.target_armies.shape != map.armies.shape:
+            self.start_armies = map.armies.copy()
+            self.same_owner = np.ones(map.armies.shape, dtype=bool)
+        else:
+            self.start_armies = self.armies(now)
+            self.same_owner = self.owners == map.owners
+        self.target_armies = map.armies.copy()
+        self.owners = map.owners.copy()
+        self.start_time = now
+
+    def armies(self, now=None):
+        if now is None:
+            now = self.clock()
+        progress = (now - self.start_time) / self.duration if self.duration > 0 else 1
+        if progress >= 1:
+            return self.target_armies
+
+        shown = self.start_armies + (self.target_armies - self.start_armies) * progress
+        return np.where(self.same_owner, np.rint(shown).astype(self.target_armies.dtype), self.target_armies)
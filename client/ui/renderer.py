@@ -0,0 +1,153 @@
+import numpy as np
+import pygame
+
+from constants.map import *
+from constants.game import *
+from constants.colors import *
+
+class Renderer:
+    """
+    draws the map incrementally. the static part of every tile - its color, sprite and grid lines - is kept
+    on a background surface and redrawn there only when the tile's type, owner or visibility changes.
+    each frame, only the tiles whose state or selection changed since the last frame are copied to the
+    screen and get their army drawn on top, and only their rects are returned for display.update.
+    only the tiles inside the viewport are looked at, and scrolling or zooming redraws all of them
+    """
+    def __init__(self, screen, atlas, glyphs, viewport=None):
+        self.screen = screen
+        self.atlas = atlas # a SpriteAtlas, which has the sprites scaled to every tile size used
+        self.scaled_sprites = {} # tile size -> (sprites, offset)
+        self.glyphs = glyphs
+        self.viewport = viewport
+        self.background = pygame.Surface(screen.get_size()).convert()
+        self.map_rect = pygame.Rect(0, 0, WIDTH, HEIGHT)
+        self.sidebar_rect = pygame.Rect(WIDTH, 0, SIDEBAR_WIDTH, HEIGHT)
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        forgets the last drawn state, so the next frame redraws everything
+        """
+        self.last_types = None
+        self.last_owners = None
+        self.last_armies = None
+        self.last_visible = None
+        self.last_selected = None
+        self.last_id = None
+        self.last_view = None
+
+    def draw(self, map, id, selected_tile, armies=None):
+        """
+        draws the changes since the last frame and returns the dirty rects. (armies) replaces the army
+        counts of the map, e.g. while they are animated
+        """
+        view = self.viewport
+        x0, y0, x1, y1 = view.visible_tiles()
+        window = (slice(y0, y1), slice(x0, x1))
+
+        types = map.types[window].copy()
+        owners = map.owners[window].copy()
+        armies = (map.armies if armies is None else armies)[window].copy()
+        visible = map.visible_mask(id)[window].copy()
+        selected = tuple(selected_tile) if selected_tile is not None else None
+        dirty_rects = []
+
+        full = self.last_types is None or self.last_id != id or self.last_view != (view.state(), x0, y0)
+        if full:
+            static_changed = np.ones(types.shape, dtype=bool)
+            changed = static_changed
+            self.background.fill(BLACK, self.map_rect)
+            self._draw_sidebar(id)
+            dirty_rects.extend((self.map_rect, self.sidebar_rect))
+        else:
+            static_changed = (types != self.last_types) | (owners != self.last_owners) \
+                | (visible != self.last_visible)
+            changed = static_changed | (armies != self.last_armies)
+            if selected != self.last_selected:
+                for tile in (self.last_selected, selected):
+                    if tile is not None and x0 <= tile[0] < x1 and y0 <= tile[1] < y1:
+                        changed[tile[1] - y0, tile[0] - x0] = True
+
+        self.background.set_clip(self.map_rect)
+        self.screen.set_clip(self.map_rect)
+        sprites, sprite_offset = self._sprites(view.tile_size)
+
+        for y, x in np.argwhere(static_changed):
+            self._draw_background_tile(view.tile_rect(x0 + x, y0 + y), types[y, x], owners[y, x], visible[y, x],
+                                       sprites, sprite_offset)
+        if full:
+            self.screen.blit(self.background, self.sidebar_rect, self.sidebar_rect)
+            self.screen.blit(self.background, self.map_rect, self.map_rect)
+
+        draw_armies = view.tile_size >= MIN_TEXT_TILE_SIZE
+        for y, x in np.argwhere(changed):
+            rect = view.tile_rect(x0 + x, y0 + y)
+            self.screen.blit(self.background, rect, rect)
+
+            if selected == (x0 + x, y0 + y):
+                pygame.draw.rect(self.screen, WHITE, rect, 2)
+
+            if draw_armies and types[y, x] != MOUNTAIN_CODE and not (types[y, x] == ARMY_CODE and owners[y, x] == 0):
+                army_text = self.glyphs.render(armies[y, x], WHITE)
+                text_rect = army_text.get_rect(center=rect.center)
+                self.screen.blit(army_text, text_rect)
+
+            pygame.draw.rect(self.screen, BLACK, rect, 1)
+            if not full:
+                dirty_rects.append(rect.clip(self.map_rect))
+
+        self.background.set_clip(None)
+        self.screen.set_clip(None)
+
+        self.last_types = types
+        self.last_owners = owners
+        self.last_armies = armies
+        self.last_visible = visible
+        self.last_selected = selected
+        self.last_id = id
+        self.last_view = (view.state(), x0, y0)
+        return dirty_rects
+
+    def _sprites(self, tile_size):
+        if tile_size not in self.scaled_sprites:
+            size = int(SPRITE_SCALE * tile_size)
+            self.scaled_sprites[tile_size] = (self.atlas.sprites(size), (tile_size - size) / 2)
+        return self.scaled_sprites[tile_size]
+
+    def _draw_background_tile(self, rect, type, owner, visible, sprites, sprite_offset):
+        sprite = None
+
+        if visible:
+            if owner == 0:
+                if type == MOUNTAIN_CODE:
+                    color = MIDDLE_GRAY
+                    sprite = sprites.get(MOUNTAIN)
+                elif type == CITY_CODE:
+                    color = DARK_GRAY
+                    sprite = sprites.get(CITY)
+                else:
+                    color = LIGHT_GRAY
+            else:
+                color = PLAYER_COLORS[owner - 1]
+                if type != ARMY_CODE:
+                    sprite = sprites.get(TILE_TYPES[type])
+        else:
+            if owner > 0:
+                color = PLAYER_COLORS[owner - 1]
+            else:
+                color = DARKER_GRAY
+                if type == MOUNTAIN_CODE or type == CITY_CODE:
+                    sprite = sprites.get('OBSTACLE')
+
+        pygame.draw.rect(self.background, color, rect)
+        if sprite:
+            self.background.blit(sprite, (rect.x + sprite_offset, rect.y + sprite_offset))
+        pygame.draw.rect(self.background, BLACK, rect, 1)
+
+    def _draw_sidebar(self, id):
+        # the sidebar shows the player's color
+        if id and (id - 1) < len(PLAYER_COLORS):
+            sidebar_color = PLAYER_COLORS[id - 1]
+        else:
+            sidebar_color = MIDDLE_GRAY  # Fallback color
+        pygame.draw.rect(self.background, sidebar_color, self.sidebar_rect)
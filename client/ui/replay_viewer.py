@@ -0,0 +1,107 @@
+import time
+import pygame
+
+from client.ui.game import Game
+from client.ui.viewport import Viewport
+from client.ui.timings import StartupTimings
+from shared.replay import ReplayReader
+from constants.game import *
+from constants.server import TICK_RATE
+from constants.replay import REPLAY_SEEK_STEP
+
+class ReplayViewer(Game):
+    """
+    plays a replay file in the game window, at the speed of the server or faster, from any tick.
+    space pauses, left and right go one tick back or forward, page up and page down REPLAY_SEEK_STEP
+    ticks, home and end to the start and the end, up and down change the speed. 0 shows the whole map
+    and 1 to 8 what that player saw. the mouse wheel zooms and dragging with the middle button scrolls
+    """
+    def __init__(self, path, timings=None):
+        self.timings = timings if timings is not None else StartupTimings()
+        self.init_display()
+        self.reader = ReplayReader(path)
+        self.timings.mark("replay")
+        self.id = 0
+        self.selected_tile = None
+        self.playing = True
+        self.speed = 1
+        self.next_tick_time = time.perf_counter()
+
+        self.viewport = Viewport(self.reader.rows, self.reader.cols)
+        self.renderer.viewport = self.viewport
+        self.update_map()
+        print(f"{path}: {self.reader.num_players} players, {self.reader.last_tick} ticks")
+
+    def update_map(self):
+        self.map = self.reader.map
+        pygame.display.set_caption(f"Replay - tick {self.reader.tick} / {self.reader.last_tick}"
+                                   + ("" if self.playing else " (paused)"))
+
+    def draw_all(self):
+        return self.renderer.draw(self.map, self.id, self.selected_tile)
+
+    def seek(self, tick):
+        self.reader.seek(tick)
+        self.next_tick_time = time.perf_counter()
+        self.update_map()
+
+    def handle_events(self):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                self.reader.close()
+                pygame.quit()
+                raise SystemExit
+            elif event.type == pygame.VIDEOEXPOSE:
+                self.renderer.invalidate()
+            elif event.type == pygame.KEYDOWN:
+                self.handle_key(event.key)
+            elif event.type == pygame.MOUSEWHEEL:
+                self.viewport.zoom(event.y, pygame.mouse.get_pos())
+            elif event.type == pygame.MOUSEMOTION and event.buttons[1]:
+                self.viewport.scroll(-event.rel[0], -event.rel[1])
+
+    def handle_key(self, key):
+        tick = self.reader.tick
+        if key == pygame.K_SPACE:
+            self.playing = not self.playing
+            self.next_tick_time = time.perf_counter()
+            self.update_map()
+        elif key == pygame.K_RIGHT:
+            self.seek(tick + 1)
+        elif key == pygame.K_LEFT:
+            self.seek(tick - 1)
+        elif key == pygame.K_PAGEUP:
+            self.seek(tick + REPLAY_SEEK_STEP)
+        elif key == pygame.K_PAGEDOWN:
+            self.seek(tick - REPLAY_SEEK_STEP)
+        elif key == pygame.K_HOME:
+            self.seek(0)
+        elif key == pygame.K_END:
+            self.seek(self.reader.last_tick)
+        elif key == pygame.K_UP:
+            self.speed = min(self.speed * 2, 64)
+        elif key == pygame.K_DOWN:
+            self.speed = max(self.speed / 2, 1 / 4)
+        elif pygame.K_0 <= key <= pygame.K_9 and key - pygame.K_0 <= self.reader.num_players:
+            self.id = key - pygame.K_0
+
+    def run(self):
+        first_frame = True
+        while True:
+            self.handle_events()
+            if self.playing:
+                # ticks due since the last frame, several of them at high speeds
+                now = time.perf_counter()
+                while now >= self.next_tick_time and self.reader.step():
+                    self.next_tick_time += 1 / (TICK_RATE * self.speed)
+                if self.reader.tick >= self.reader.last_tick:
+                    self.playing = False
+                self.next_tick_time = max(self.next_tick_time, now)
+                self.update_map()
+            dirty_rects = self.draw_all()
+            pygame.display.update(dirty_rects)
+            if first_frame:
+                self.timings.mark("first frame")
+                self.timings.report("startup")
+                first_frame = False
+            self.clock.tick(FPS)
@@ -0,0 +1,33 @@
+import time
+
+class StartupTimings:
+    """
+    how long every step of the startup took, from (start) on. report() prints the steps marked since the
+    last report if enabled, so the launch up to the menu and the join up to the first frame of the game
+    are printed apart
+    """
+    def __init__(self, start=None, enabled=False):
+        self.enabled = enabled
+        self.last = time.perf_counter() if start is None else start
+        self.steps = [] # (name, seconds) since the last report
+
+    def mark(self, name):
+        """
+        ends the step (name), which started at the last mark
+        """
+        now = time.perf_counter()
+        self.steps.append((name, now - self.last))
+        self.last = now
+
+    def skip(self):
+        """
+        starts the next step now, e.g. after waiting for the user, which is not part of any step
+        """
+        self.last = time.perf_counter()
+
+    def report(self, title):
+        if self.enabled:
+            print(f"{title}: {sum(seconds for _, seconds in self.steps) * 1000:.1f} ms")
+            for name, seconds in self.steps:
+                print(f"  {name:24} {seconds * 1000:8.1f} ms")
+        self.steps = []
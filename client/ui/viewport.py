@@ -0,0 +1,101 @@
+import pygame
+
+from constants.game import *
+
+class Viewport:
+    """
+    the part of the map shown in the map area of the window, at the current zoom. (offset_x, offset_y) is
+    the pixel of the whole map, drawn at (tile_size) pixels a tile, that is at the top left corner of
+    the area. a map smaller than the area is centered in it
+    """
+    def __init__(self, rows, cols, width=WIDTH, height=HEIGHT, tile_size=TILE_SIZE):
+        self.rows = rows
+        self.cols = cols
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.offset_x = 0
+        self.offset_y = 0
+        self._clamp()
+
+    def state(self):
+        """
+        changes whenever the tiles move on the screen
+        """
+        return self.tile_size, self.offset_x, self.offset_y
+
+    def visible_tiles(self):
+        """
+        returns the (x0, y0, x1, y1) range of the tiles at least partly on the screen, ends excluded
+        """
+        size = self.tile_size
+        x0 = max(0, self.offset_x // size)
+        y0 = max(0, self.offset_y // size)
+        x1 = min(self.cols, -(-(self.offset_x + self.width) // size))
+        y1 = min(self.rows, -(-(self.offset_y + self.height) // size))
+        return x0, y0, x1, y1
+
+    def tile_rect(self, x, y):
+        size = self.tile_size
+        return pygame.Rect(x * size - self.offset_x, y * size - self.offset_y, size, size)
+
+    def tile_at(self, pos):
+        """
+        the (x, y) of the tile at a screen position, None outside the map
+        """
+        px, py = pos
+        if not (0 <= px < self.width and 0 <= py < self.height):
+            return None
+        x = (px + self.offset_x) // self.tile_size
+        y = (py + self.offset_y) // self.tile_size
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            return x, y
+        return None
+
+    def scroll(self, dx, dy):
+        self.offset_x += dx
+        self.offset_y += dy
+        self._clamp()
+
+    def zoom(self, steps, around=None):
+        """
+        zooms in (positive steps) or out around a screen position, the map point under it stays put
+        """
+        if around is None:
+            around = (self.width // 2, self.height // 2)
+        size = int(round(self.tile_size * ZOOM_STEP ** steps))
+        size = max(MIN_TILE_SIZE, min(MAX_TILE_SIZE, size))
+        if size == self.tile_size:
+            return
+
+        map_x = (around[0] + self.offset_x) / self.tile_size
+        map_y = (around[1] + self.offset_y) / self.tile_size
+        self.tile_size = size
+        self.offset_x = int(map_x * size) - around[0]
+        self.offset_y = int(map_y * size) - around[1]
+        self._clamp()
+
+    def center_on(self, x, y):
+        self.offset_x = int((x + 0.5) * self.tile_size) - self.width // 2
+        self.offset_y = int((y + 0.5) * self.tile_size) - self.height // 2
+        self._clamp()
+
+    def follow(self, x, y):
+        """
+        brings tile (x, y) back to the middle of the screen if it left it
+        """
+        rect = self.tile_rect(x, y)
+        if rect.left < 0 or rect.top < 0 or rect.right > self.width or rect.bottom > self.height:
+            self.center_on(x, y)
+
+    def _clamp(self):
+        map_width = self.cols * self.tile_size
+        map_height = self.rows * self.tile_size
+        if map_width <= self.width:
+            self.offset_x = -((self.width - map_width) // 2)
+        else:
+            self.offset_x = max(0, min(map_width - self.width, self.offset_x))
+        if map_height <= self.height:
+            self.offset_y = -((self.height - map_height) // 2)
+        else:
+            self.offset_y = max(0, min(map_height - self.height, self.offset_y))
@@ -5,10 +5,21 @@ ROWS = 25
 COLS = 25
 
 TILE_SIZE = WIDTH // COLS
+SIDEBAR_WIDTH = 50
+MIN_TILE_SIZE = 8 # zoom limits, in pixels a tile
+MAX_TILE_SIZE = 64
+ZOOM_STEP = 1.25 # tile size factor of one mouse wheel step
+MIN_TEXT_TILE_SIZE = 20 # armies are not drawn on smaller tiles
+SPRITE_SCALE = 0.85 # sprite size relative to the tile
 
 FPS = 10
+INTERPOLATION_TIME = 0.25 # seconds army counts take to reach their new value, about one server tick
+
+GLYPH_CACHE_SIZE = 512 # army numbers kept pre-rendered
+COMPOSE_GLYPHS_FROM = 1000 # armies from this value up are drawn from cached digits
 
 UP = 'U'
 DOWN = 'D'
 LEFT = 'L'
-RIGHT = 'R'
\ No newline at end of file
+RIGHT = 'R'
+ATLAS_CACHE_DIR = '~/.cache/generals' # scaled sprite atlases are kept here between runs
@@ -3,4 +3,5 @@ HEIGHT = 600
 
 NAME_MAXCHAR = 15
 IP_MAXCHAR = 15
-PORT_MAXCHAR = 5
\ No newline at end of file
+PORT_MAXCHAR = 5
+ROOM_MAXCHAR = 15
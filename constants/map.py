@@ -3,6 +3,8 @@ MOUNTAIN_CHANCE = 0.25
 CITY_CHANCE = 0.05
 ROWS = 25
 COLS = 25
+MIN_MAP_SIZE = 10 # smallest and largest number of rows or columns of a map
+MAX_MAP_SIZE = 200
 
 KING = 'K'
 ARMY = 'A'
@@ -10,3 +12,19 @@ MOUNTAIN = 'M'
 CITY = 'C'
 
 TILE_TYPES = (KING, ARMY, MOUNTAIN, CITY)
+
+# integer codes of the tile types, as stored in the map arrays (index into TILE_TYPES)
+NONE_CODE = -1
+KING_CODE = 0
+ARMY_CODE = 1
+MOUNTAIN_CODE = 2
+CITY_CODE = 3
+
+TYPE_CODES = {tile_type: code for code, tile_type in enumerate(TILE_TYPES)}
+
+MAX_PLAYERS = 8
+TERRAIN_ATTEMPTS = 5 # terrain rolls before mountains are dug through to connect the kings
+
+PATH_CACHE_SIZE = 128 # distance fields the path finder keeps
+PATH_PINNED_FIELDS = 64 # fields of kings and cities kept however long they are not used
+PATH_WARM_UP_PER_TICK = 1 # distance fields of kings and cities computed ahead each tick, one takes ~20 ms on 200x200
@@ -1,2 +1,22 @@
 LENOFLEN = 2
-SEP = "\r\n"
\ No newline at end of file
+SEP = "\r\n"
+
+# digits of the x/y, army and owner of a tile in text map messages. maps of the default size use the
+# narrow fields, any other size the wide ones
+NARROW_TILE_FIELDS = (2, 5, 1)
+WIDE_TILE_FIELDS = (3, 7, 2)
+KEYFRAME_INTERVAL = 25 # ticks between full map messages sent to clients that get deltas
+
+TEXT_VERSION = 1
+BINARY_VERSION = 2
+PROTOCOL_VERSION = BINARY_VERSION # the newest version this side speaks
+
+BINARY_MAGIC = 0xB1 # first byte of binary frames, text frames always start with a digit
+
+RECV_BUFFER_SIZE = 64 * 1024 # initial size of the receive buffer of every connection, grows for bigger frames
+MAX_FRAME_SIZE = 4 * 1024 * 1024 # largest frame payload accepted, a text keyframe of a 200x200 map is ~600 KB
+FRAME_HEADER_MAX_SIZE = LENOFLEN + 99 # longest frame header, that of a text frame with a 99 digit length
+
+COMPRESSED_MAGIC = 0xC1 # first byte of compressed frames, which hold other frames compressed on the connection's zlib stream
+COMPRESSION_THRESHOLD = 64 # frames shorter than this are sent as they are, e.g. actions and hellos
+COMPRESSION_LEVEL = 3 # zlib level of the compressed streams
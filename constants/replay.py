@@ -0,0 +1,7 @@
+REPLAY_MAGIC = b'GRPL' # first bytes of a replay file
+REPLAY_VERSION = 1
+INDEX_MAGIC = b'GIDX' # last bytes of a replay file that was closed properly
+REPLAY_KEYFRAME_INTERVAL = 50 # ticks between the full states of a replay, seeking replays at most this many ticks
+REPLAY_COMPRESSION_LEVEL = 1 # zlib level of the keyframes, fast since it runs in the tick
+REPLAY_BUFFER_SIZE = 256 * 1024 # bytes buffered before a replay file is written to
+REPLAY_SEEK_STEP = 50 # ticks the replay viewer jumps with page up / page down
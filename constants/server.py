@@ -1 +1,23 @@
-TURNS_TO_RESET = 25
\ No newline at end of file
+TURNS_TO_RESET = 25
+TICK_RATE = 4 # game ticks per second
+MAX_CATCHUP_TICKS = 5 # late ticks run back to back to catch up, beyond that they are skipped
+MOVES_PER_TICK = 1 # moves taken from every player's queue each tick
+MAX_QUEUED_MOVES = 64 # action messages (a move or a path) a player may have queued, older ones are dropped beyond that
+MAX_QUEUED_GOES = 4 # go commands a player may have waiting for their path, older ones are dropped beyond that
+GO_SEARCHES_PER_TICK = 1 # distance fields a player's go commands may compute each tick, the others wait
+SEND_QUEUE_SIZE = 4 # outgoing messages a client may fall behind before its map frames are dropped
+MAX_SEND_BUFFERS = 64 # messages handed to one sendmsg call
+MAX_SPECTATORS = 1000 # spectators of one game
+MAX_OPEN_ROOMS = 256 # rooms of one server waiting for their players, no new room is opened beyond that
+SPECTATORS_LABEL = 'spectators' # the player label of the messages sent to spectators in the metrics
+
+DEFAULT_ROOM = '' # room of clients that do not pick one
+JOIN_TIMEOUT = 1.0 # seconds to wait for the hello of a new connection before putting it in the default room
+
+LOAD_REPORT_INTERVAL = 0.5 # seconds between the load reports of shard workers to the router
+
+METRICS_PREFIX = 'generals' # prefix of the names of the exported metrics
+METRICS_HOST = '127.0.0.1' # the metrics endpoint only listens locally by default
+METRICS_PORT = 9100
+PROFILE_PATH = 'server.prof' # where the profile of --profile-ticks is written
+PROFILE_PRINT_LINES = 25 # functions printed when a profile ends
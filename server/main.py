@@ -1,13 +1,67 @@
 from ui.cli_menu import CLIMenu
 from network.server import Server
+from network.async_server import AsyncServer
+from network.sharding import ShardRouter
+from network.metrics import MetricsServer, TickProfiler
 from shared.map import Map
+from constants.server import TICK_RATE, MOVES_PER_TICK, METRICS_HOST, PROFILE_PATH
+from constants.cli_menu import MIN_COUNT
+from constants.map import ROWS, COLS, MIN_MAP_SIZE, MAX_MAP_SIZE
+import argparse
+import os
 import threading
 import random
 
 def main():
-    map = Map()
-    server = Server('0.0.0.0', 12345, map, 1)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--async', dest='use_async', action='store_true', help='run the asyncio server')
+    parser.add_argument('--tick-rate', type=float, default=TICK_RATE, help='game ticks per second')
+    parser.add_argument('--moves-per-tick', type=int, default=MOVES_PER_TICK,
+                        help='moves taken from every player\'s queue each tick')
+    parser.add_argument('--rooms', action='store_true',
+                        help='host many rooms without the settings menu (implies --async)')
+    parser.add_argument('--players', type=int, default=MIN_COUNT, help='players of the default room, with --rooms')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='with --rooms, spread the rooms over this many worker processes')
+    parser.add_argument('--rows', type=int, default=ROWS, help=f'map rows, {MIN_MAP_SIZE} to {MAX_MAP_SIZE}')
+    parser.add_argument('--cols', type=int, default=COLS, help=f'map columns, {MIN_MAP_SIZE} to {MAX_MAP_SIZE}')
+    parser.add_argument('--port', type=int, default=12345)
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        help='serve prometheus metrics at http://METRICS_HOST:PORT/metrics, off by default')
+    parser.add_argument('--metrics-host', default=METRICS_HOST)
+    parser.add_argument('--profile-ticks', type=int, default=0, help='profile this many ticks with cProfile')
+    parser.add_argument('--profile-path', default=PROFILE_PATH, help='where to write the profile')
+    parser.add_argument('--replay-dir', help='record every game to this directory, watch them with client/replay.py')
+    args = parser.parse_args()
+    if not (MIN_MAP_SIZE <= args.rows <= MAX_MAP_SIZE and MIN_MAP_SIZE <= args.cols <= MAX_MAP_SIZE):
+        parser.error(f"the map size must be between {MIN_MAP_SIZE} and {MAX_MAP_SIZE}")
+    if args.rooms and args.workers > 0 and (args.metrics_port or args.profile_ticks):
+        parser.error("the metrics and the profiler are not available with --workers")
+    if args.replay_dir is not None:
+        os.makedirs(args.replay_dir, exist_ok=True)
+
+    map = Map(args.rows, args.cols)
+    if args.rooms and args.workers > 0:
+        server = ShardRouter('0.0.0.0', args.port, args.workers, args.players, args.tick_rate, args.moves_per_tick,
+                             (args.rows, args.cols), args.replay_dir)
+        print(f"Hosting rooms on port {args.port} with {args.workers} workers")
+        server.start()
+        return
+
+    if args.rooms:
+        server = AsyncServer('0.0.0.0', args.port, map, args.players, args.tick_rate, args.moves_per_tick,
+                             args.replay_dir)
+        print(f"Hosting rooms on port {args.port}")
+        instrument(server, args)
+        server.start()
+        return
+
+    if args.use_async:
+        server = AsyncServer('0.0.0.0', args.port, map, 1, args.tick_rate, args.moves_per_tick, args.replay_dir)
+    else:
+        server = Server('0.0.0.0', args.port, map, 1, args.tick_rate, args.moves_per_tick, args.replay_dir)
     
+    instrument(server, args)
     menu = CLIMenu(server)
     menu.display_settings_menu()
 
@@ -18,5 +72,12 @@ def main():
 
     menu.display_waiting_menu()
 
+def instrument(server, args):
+    if args.profile_ticks > 0:
+        server.metrics.profiler = TickProfiler(args.profile_ticks, args.profile_path)
+    if args.metrics_port:
+        MetricsServer(server.metrics, args.metrics_host, args.metrics_port).start()
+        print(f"Serving metrics at http://{args.metrics_host}:{args.metrics_port}/metrics")
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,208 @@
+import asyncio
+
+from shared.protocol import *
+from shared.map import *
+from shared.framing import FrameDecoder
+from server.network.server import Server
+from server.network.room import RoomRegistry
+from server.network.metrics import Metrics
+from shared.compression import StreamCompressor
+
+from constants.server import *
+from constants.protocol import *
+
+class Connection:
+    """
+    a client connection of the asyncio server. messages to the client go through a bounded queue
+    that a writer task drains, so a slow client never blocks the game loop or the other clients
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.address = writer.get_extra_info('peername')
+        self.decoder = FrameDecoder()
+        self.queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.room = None
+        self.view = None
+        self.deltas = False
+        self.version = TEXT_VERSION
+        self.closed = False
+        self.dropped_frames = 0
+        self.spectate = None # id of the player this connection watches, 0 for the whole map, None for a player
+        self.compressor = None # a StreamCompressor if the client asked for compressed messages
+
+    def send(self, msg):
+        if not self.closed and not self.queue.full():
+            self.queue.put_nowait(msg)
+
+    def handle_hello(self, content):
+        self.deltas = content.get('deltas') == '1'
+        self.version = min(int(content.get('version', TEXT_VERSION)), PROTOCOL_VERSION)
+        if 'spectate' in content and self.room is None:
+            self.spectate = int(content['spectate'])
+        if content.get('compress') == '1' and self.compressor is None:
+            self.compressor = StreamCompressor()
+        if self.view is not None:
+            self.view.deltas = self.deltas
+            self.view.version = self.version
+
+    def send_map(self):
+        """
+        queues the next map message of the client and returns its size. if the client did not keep up,
+        the stale map frames waiting for it are dropped and it gets a keyframe on the next tick instead
+        """
+        if self.closed:
+            return 0
+
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+                self.dropped_frames += 1
+            self.view.request_keyframe()
+            return 0
+
+        msg = self.view.next_msg()
+        self.queue.put_nowait(msg)
+        return len(msg)
+
+class AsyncServer:
+    """
+    asyncio version of Server, with a reader and a writer task per client. it hosts many rooms at
+    once - clients name the room to join or create in their hello, and clients that send none
+    (or an old hello) play in the default room, which has num_players players
+    """
+    get_ip = Server.get_ip
+
+    def __init__(self, host, port, map, num_players=2, tick_rate=TICK_RATE, moves_per_tick=MOVES_PER_TICK,
+                 replay_dir=None):
+        self.host = host
+        self.port = port
+        self.map = map # map of the first default room
+        self.num_players = num_players
+        self.metrics = Metrics()
+        self.registry = RoomRegistry(tick_rate, moves_per_tick, self.metrics, replay_dir)
+        self.default_room = None
+
+    @property
+    def clients(self):
+        if self.default_room is None:
+            return {}
+        return self.default_room.clients
+
+    def start(self):
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+
+        async with server:
+            await server.serve_forever()
+
+    async def adopt(self, sock):
+        """
+        serves a client connection accepted by someone else, e.g. the shard router
+        """
+        reader, writer = await asyncio.open_connection(sock=sock)
+        await self._handle_connection(reader, writer)
+
+    async def _handle_connection(self, reader, writer):
+        conn = Connection(reader, writer)
+        writer_task = asyncio.create_task(self._write_loop(conn))
+        try:
+            room_name, num_players, dims, messages = await self._read_hello(conn)
+
+            if conn.spectate is not None:
+                room = self.registry.rooms.get(room_name)
+                if room is None and room_name == DEFAULT_ROOM:
+                    room = self._join(room_name, num_players, dims)
+                if room is None or not room.add_spectator(conn):
+                    return
+            else:
+                room = self._join(room_name, num_players, dims)
+                if room is None:
+                    return
+                room.add(conn)
+
+            for msg_type, content in messages:
+                room.handle_client_msg(conn, msg_type, content)
+            await self._read_loop(conn)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            conn.closed = True
+            writer_task.cancel()
+            writer.close()
+            if conn.room is not None:
+                conn.room.remove(conn)
+
+    async def _read_hello(self, conn):
+        """
+        waits up to JOIN_TIMEOUT for the hello of a new connection. returns the room it asked for,
+        the number of players and (rows, cols) for a new room, and the messages that came after the hello
+        """
+        dims = (self.map.rows, self.map.cols)
+        messages = []
+        try:
+            while not messages:
+                data = await asyncio.wait_for(conn.reader.read(RECV_BUFFER_SIZE), JOIN_TIMEOUT)
+                if not data:
+                    raise ConnectionError("connection closed")
+                messages = conn.decoder.feed(data)
+        except asyncio.TimeoutError:
+            return DEFAULT_ROOM, self.num_players, dims, messages
+
+        msg_type, content = messages[0]
+        if msg_type.upper() != 'H':
+            return DEFAULT_ROOM, self.num_players, dims, messages
+
+        conn.handle_hello(content)
+        room_name = content.get('room', DEFAULT_ROOM)
+        num_players = int(content.get('players', self.num_players))
+        if 'dims' in content:
+            dims = Protocol.parse_dims(content['dims'])
+        conn.send(Protocol.create_hello_msg(conn.deltas, conn.version, room_name,
+                                            compress=conn.compressor is not None).encode('utf-8'))
+        return room_name, num_players, dims, messages[1:]
+
+    def _join(self, room_name, num_players, dims):
+        if room_name == DEFAULT_ROOM:
+            # the default rooms play on maps of the size of the one the server was created with, the
+            # first of them on that map itself
+            first_map = self.map if self.default_room is None else None
+            room = self.registry.join(DEFAULT_ROOM, self.num_players, first_map, (self.map.rows, self.map.cols))
+            if room is not None:
+                self.default_room = room
+            return room
+        return self.registry.join(room_name, num_players, dims=dims)
+
+    async def _read_loop(self, conn):
+        while True:
+            data = await conn.reader.read(RECV_BUFFER_SIZE)
+            if not data:
+                return
+            with self.metrics.phase(conn.room.label, 'handle_msg'):
+                for msg_type, content in conn.decoder.feed(data):
+                    if msg_type.upper() == 'H':
+                        conn.handle_hello(content)
+                    else:
+                        conn.room.handle_client_msg(conn, msg_type, content)
+
+    async def _write_loop(self, conn):
+        while True:
+            # everything queued goes out in one call, as the buffers shared with the other connections
+            msgs = [await conn.queue.get()]
+            while not conn.queue.empty():
+                msgs.append(conn.queue.get_nowait())
+            if conn.room is not None:
+                with self.metrics.phase(conn.room.label, 'send'):
+                    conn.writer.writelines(self._compress(conn, msgs))
+            else:
+                conn.writer.writelines(self._compress(conn, msgs))
+            await conn.writer.drain()
+
+    @staticmethod
+    def _compress(conn, msgs):
+        # the messages left the queue, so none of them can be dropped anymore and they go on the stream
+        if conn.compressor is None:
+            return msgs
+        return [conn.compressor.compress(msg) for msg in msgs]
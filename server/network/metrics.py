@@ -0,0 +1,236 @@
+import cProfile
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from constants.server import *
+
+class Metrics:
+    """
+    instrumentation of the game loops of a server: the time spent in every phase of the tick, the
+    bytes and messages sent to every player and how well they compressed, the moves and messages waiting in their queues, and the
+    tick stats of the room schedulers (durations, drift, overruns). everything is labeled by room,
+    the plain server has a single room named DEFAULT_ROOM.
+    render() returns all of it in the prometheus text format, for MetricsServer
+    """
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.phase_seconds = {} # (room, phase) -> total seconds spent in it
+        self.phase_max = {} # (room, phase) -> longest single time spent in it, seconds
+        self.phase_count = {} # (room, phase) -> times it ran
+        self.bytes_sent = {} # (room, player id) -> bytes
+        self.messages_sent = {} # (room, player id) -> messages
+        self.queued_moves = {} # (room, player id) -> moves waiting in the player's queue
+        self.send_queue = {} # (room, player id) -> messages waiting to be written to the player
+        self.dropped_frames = {} # (room, player id) -> map frames dropped because the player fell behind
+        self.encodes = {} # (room,) -> map messages encoded, each sent to everyone getting the same view
+        self.compressed_input = {} # (room, player id) -> bytes of the messages compressed
+        self.compressed_output = {} # (room, player id) -> bytes they were compressed to
+        self.compression_seconds = {} # (room, player id) -> time spent compressing
+        self.schedulers = {} # room -> its TickScheduler
+        self.profiler = None # a TickProfiler to run over the next ticks
+
+    def add_room(self, room, scheduler):
+        self.schedulers[room] = scheduler
+
+    def remove_room(self, room):
+        """
+        forgets a room that ended, so the rooms of a long running server do not pile up
+        """
+        self.schedulers.pop(room, None)
+        for stats in (self.phase_seconds, self.phase_max, self.phase_count, self.bytes_sent, self.messages_sent,
+                      self.queued_moves, self.send_queue, self.dropped_frames, self.encodes, self.compressed_input,
+                      self.compressed_output, self.compression_seconds):
+            for key in [key for key in stats if key[0] == room]:
+                del stats[key]
+
+    @contextmanager
+    def phase(self, room, name):
+        """
+        times the block as phase (name) of the tick of (room)
+        """
+        start = self.clock()
+        try:
+            yield
+        finally:
+            self.add_phase(room, name, self.clock() - start)
+
+    def add_phase(self, room, name, seconds):
+        key = (room, name)
+        self.phase_seconds[key] = self.phase_seconds.get(key, 0.0) + seconds
+        self.phase_count[key] = self.phase_count.get(key, 0) + 1
+        if seconds > self.phase_max.get(key, 0.0):
+            self.phase_max[key] = seconds
+
+    def count_sent(self, room, id, size):
+        """
+        counts a message of (size) bytes sent to player (id), nothing if it was dropped (0)
+        """
+        if not size:
+            return
+        key = (room, id)
+        self.bytes_sent[key] = self.bytes_sent.get(key, 0) + size
+        self.messages_sent[key] = self.messages_sent.get(key, 0) + 1
+
+    def count_compressed(self, room, id, raw, compressed, seconds):
+        """
+        counts the messages to player (id) compressed since the last call, from StreamCompressor.take_stats
+        """
+        if not raw:
+            return
+        key = (room, id)
+        self.compressed_input[key] = self.compressed_input.get(key, 0) + raw
+        self.compressed_output[key] = self.compressed_output.get(key, 0) + compressed
+        self.compression_seconds[key] = self.compression_seconds.get(key, 0.0) + seconds
+
+    def count_encodes(self, room, count):
+        self.encodes[(room,)] = self.encodes.get((room,), 0) + count
+
+    def set_queues(self, room, moves, send_queues=None, dropped_frames=None):
+        """
+        sets the queue depths of the players of (room). (moves) is its MoveQueues, (send_queues) and
+        (dropped_frames) are dicts by player id, for servers that queue the messages to send
+        """
+        for id in moves.queues:
+            self.queued_moves[(room, id)] = moves.waiting(id)
+        for id, depth in (send_queues or {}).items():
+            self.send_queue[(room, id)] = depth
+        for id, dropped in (dropped_frames or {}).items():
+            self.dropped_frames[(room, id)] = dropped
+
+    def begin_tick(self):
+        if self.profiler is not None:
+            self.profiler.begin_tick()
+
+    def end_tick(self):
+        if self.profiler is not None and self.profiler.end_tick():
+            self.profiler = None
+
+    def render(self):
+        """
+        all the metrics in the prometheus text exposition format
+        """
+        lines = []
+        self._render(lines, 'phase_seconds_total', 'counter', 'time spent in each phase of the tick',
+                     self.phase_seconds, ('room', 'phase'))
+        self._render(lines, 'phase_runs_total', 'counter', 'times each phase of the tick ran',
+                     self.phase_count, ('room', 'phase'))
+        self._render(lines, 'phase_max_seconds', 'gauge', 'longest time spent in a phase of the tick',
+                     self.phase_max, ('room', 'phase'))
+        self._render(lines, 'sent_bytes_total', 'counter', 'bytes of map messages sent to each player',
+                     self.bytes_sent, ('room', 'player'))
+        self._render(lines, 'sent_messages_total', 'counter', 'map messages sent to each player',
+                     self.messages_sent, ('room', 'player'))
+        self._render(lines, 'encoded_messages_total', 'counter', 'map messages encoded, once per view and tick',
+                     self.encodes, ('room',))
+        self._render(lines, 'compression_input_bytes_total', 'counter', 'bytes of the messages compressed for each player',
+                     self.compressed_input, ('room', 'player'))
+        self._render(lines, 'compression_output_bytes_total', 'counter', 'bytes the messages were compressed to',
+                     self.compressed_output, ('room', 'player'))
+        self._render(lines, 'compression_seconds_total', 'counter', 'time spent compressing the messages of each player',
+                     self.compression_seconds, ('room', 'player'))
+        self._render(lines, 'queued_moves', 'gauge', 'moves waiting in the queue of each player',
+                     self.queued_moves, ('room', 'player'))
+        self._render(lines, 'send_queue_messages', 'gauge', 'messages waiting to be written to each player',
+                     self.send_queue, ('room', 'player'))
+        self._render(lines, 'dropped_frames_total', 'counter', 'map frames dropped because the player fell behind',
+                     self.dropped_frames, ('room', 'player'))
+
+        schedulers = list(self.schedulers.items())
+        stats = {room: scheduler.stats() for room, scheduler in schedulers}
+        for name, stat, type, help in (
+            ('ticks_total', 'tick', 'counter', 'ticks run'),
+            ('tick_overruns_total', 'overruns', 'counter', 'ticks that ended after the next one was due'),
+            ('skipped_ticks_total', 'skipped_ticks', 'counter', 'ticks skipped to catch up'),
+            ('tick_duration_seconds', 'tick_duration', 'gauge', 'duration of the last tick'),
+            ('tick_drift_seconds', 'drift', 'gauge', 'how late the last tick started'),
+            ('tick_max_drift_seconds', 'max_drift', 'gauge', 'latest start of a tick so far'),
+        ):
+            self._render(lines, name, type, help, {(room,): room_stats[stat] for room, room_stats in stats.items()},
+                         ('room',))
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render(lines, name, type, help, values, label_names):
+        name = f"{METRICS_PREFIX}_{name}"
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {type}")
+        # the game loop may add keys while the endpoint thread renders, so copy them first
+        for labels, value in list(values.items()):
+            label_text = ','.join(f'{label_name}="{Metrics._escape(label)}"'
+                                  for label_name, label in zip(label_names, labels))
+            lines.append(f"{name}{{{label_text}}} {value}")
+
+    @staticmethod
+    def _escape(value):
+        # room names come from the clients
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class MetricsServer:
+    """
+    serves the metrics over http at /metrics, from a daemon thread, so scraping never delays a tick
+    """
+    def __init__(self, metrics, host=METRICS_HOST, port=METRICS_PORT):
+        self.httpd = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.httpd.metrics = metrics
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = self.server.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # scrapes come every few seconds, do not print each of them
+        pass
+
+class TickProfiler:
+    """
+    runs cProfile from the start of the next tick until (ticks) ticks ended - including the input
+    handling between them - then writes the stats to (path), which python -m pstats can open, and
+    prints the functions that took the most time. on the asyncio server the ticks of all rooms count
+    """
+    def __init__(self, ticks, path=PROFILE_PATH):
+        self.remaining = ticks
+        self.path = path
+        self.profile = None
+
+    def begin_tick(self):
+        if self.profile is None and self.remaining > 0:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def end_tick(self):
+        """
+        returns True once the profile was written
+        """
+        if self.profile is None:
+            return False
+        self.remaining -= 1
+        if self.remaining > 0:
+            return False
+
+        self.profile.disable()
+        self.profile.dump_stats(self.path)
+        print(f"Profile written to {self.path}")
+        pstats.Stats(self.profile).sort_stats('cumulative').print_stats(PROFILE_PRINT_LINES)
+        self.profile = None
+        return True
@@ -0,0 +1,99 @@
+from collections import deque
+
+from constants.server import *
+from shared.protocol import Protocol
+
+class MoveQueues:
+    """
+    a queue of moves for every player of a game. each tick takes up to moves_per_tick moves from every
+    queue, one from each player per round, so a burst of input waits in the queue instead of being
+    applied at once. the player that goes first rotates from tick to tick, so no player always wins ties.
+    the moves of one action message - a single move or a whole path - are one entry of the queue, taken
+    a move at a time, so a long path is never cut. a full queue drops its oldest entries.
+    go commands wait in a queue of their own until resolve_goes() finds their paths in the tick
+    """
+    def __init__(self, num_players, moves_per_tick=MOVES_PER_TICK, max_queued=MAX_QUEUED_MOVES, max_goes=MAX_QUEUED_GOES):
+        self.num_players = num_players
+        self.moves_per_tick = moves_per_tick
+        self.queues = {id: deque(maxlen=max_queued) for id in range(1, num_players + 1)} # [(moves left, seq)]
+        self.goes = {id: deque(maxlen=max_goes) for id in range(1, num_players + 1)} # [((from_x, from_y, to_x, to_y), seq)]
+        self.tick = 0
+
+    def push(self, id, moves, seq=None):
+        """
+        queues (moves), (from_x, from_y, to_x, to_y) tuples, for player (id). (seq) is the sequence number
+        of the action message they came in, it is acknowledged once the last of them was taken
+        """
+        queue = self.queues.get(id)
+        if queue is None or not moves:
+            return
+        queue.append((deque(moves), seq))
+
+    def push_go(self, id, go, seq=None):
+        """
+        queues a go command, (from_x, from_y, to_x, to_y), of player (id) for resolve_goes()
+        """
+        goes = self.goes.get(id)
+        if goes is not None:
+            goes.append((go, seq))
+
+    def resolve_goes(self, paths, searches=GO_SEARCHES_PER_TICK):
+        """
+        queues the moves along the shortest path of every waiting go command whose first tile its player
+        owns. a path to a target whose distance field is cached is free, the go commands of a player may
+        compute only (searches) new fields per tick, the rest wait for the next ticks
+        """
+        for id, goes in self.goes.items():
+            budget = searches
+            while goes:
+                (from_x, from_y, to_x, to_y), seq = goes[0]
+                if not paths.map.tile_exists(from_x, from_y) or paths.map.owners[from_y, from_x] != id:
+                    goes.popleft()
+                    continue
+                if not paths.is_cached(to_x, to_y):
+                    if budget <= 0:
+                        break
+                    budget -= 1
+                goes.popleft()
+                path = paths.find_path(from_x, from_y, to_x, to_y)
+                if path is not None:
+                    self.push(id, Protocol.path_moves(path), seq)
+
+    def clear(self, id):
+        if id in self.queues:
+            self.queues[id].clear()
+            self.goes[id].clear()
+
+    def next_actions(self):
+        """
+        takes the moves of this tick. returns the (id, from_x, from_y, to_x, to_y) actions in the order to
+        apply them, and a dict of the action sequence numbers to acknowledge by player id
+        """
+        first = self.tick % self.num_players
+        order = list(range(1, self.num_players + 1))
+        order = order[first:] + order[:first]
+        self.tick += 1
+
+        actions = []
+        acks = {}
+        for _ in range(self.moves_per_tick):
+            for id in order:
+                queue = self.queues[id]
+                if not queue:
+                    continue
+                moves, seq = queue[0]
+                actions.append((id, *moves.popleft()))
+                if not moves:
+                    queue.popleft()
+                    if seq is not None:
+                        acks[id] = seq
+        return actions, acks
+
+    def waiting(self, id):
+        """
+        the moves queued for player (id)
+        """
+        return sum(len(moves) for moves, _ in self.queues[id])
+
+    def queued(self):
+        return sum(self.waiting(id) for id in self.queues)
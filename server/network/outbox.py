@@ -0,0 +1,86 @@
+from collections import deque
+
+from constants.server import *
+
+class Outbox:
+    """
+    the messages waiting to be sent on a non blocking socket. they are kept as the buffers they came in -
+    map messages are bytes shared with every other connection getting the same view - and flush() hands
+    as many of them as the socket takes to a single sendmsg call, without joining or copying them.
+    map frames are dropped when the client falls SEND_QUEUE_SIZE of them behind, other messages never.
+    with a compressor every message is compressed right before it is handed to the socket, one at a time,
+    so the frames still waiting can be dropped without breaking the compressed stream
+    """
+    def __init__(self, max_frames=SEND_QUEUE_SIZE):
+        self.buffers = deque() # [memoryview, droppable, compressed]
+        self.max_frames = max_frames
+        self.frames = 0 # droppable messages queued
+        self.dropped_frames = 0
+        self.compressor = None # a StreamCompressor if the client asked for compressed messages
+
+    def __len__(self):
+        return len(self.buffers)
+
+    def push(self, msg):
+        self.buffers.append([memoryview(msg), False, False])
+
+    def push_frame(self, msg):
+        """
+        queues a map frame. returns False if the client is too far behind: the frames that were not
+        started are dropped, this one too, and the client needs a keyframe next
+        """
+        if self.frames >= self.max_frames:
+            kept = deque(entry for entry in self.buffers if not entry[1])
+            self.dropped_frames += len(self.buffers) - len(kept) + 1
+            self.buffers = kept
+            self.frames = 0
+            return False
+
+        self.buffers.append([memoryview(msg), True, False])
+        self.frames += 1
+        return True
+
+    def flush(self, s):
+        """
+        sends what the socket takes without blocking. raises ConnectionError if the connection is gone
+        """
+        while self.buffers:
+            if self.compressor is not None:
+                batch = [self._compress_first()]
+            else:
+                batch = [entry[0] for entry, _ in zip(self.buffers, range(MAX_SEND_BUFFERS))]
+            try:
+                if hasattr(s, 'sendmsg'):
+                    sent = s.sendmsg(batch)
+                else:
+                    sent = s.send(batch[0])
+            except (BlockingIOError, InterruptedError):
+                return
+
+            while sent > 0:
+                entry = self.buffers[0]
+                if sent < len(entry[0]):
+                    # the rest of a message that was started has to follow it
+                    entry[0] = entry[0][sent:]
+                    if entry[1]:
+                        entry[1] = False
+                        self.frames -= 1
+                    return
+                sent -= len(entry[0])
+                self.buffers.popleft()
+                if entry[1]:
+                    self.frames -= 1
+
+    def _compress_first(self):
+        """
+        compresses the first message if it was not yet and returns it. it is part of the stream from
+        then on, so it cannot be dropped anymore
+        """
+        entry = self.buffers[0]
+        if not entry[2]:
+            entry[0] = memoryview(self.compressor.compress(entry[0]))
+            entry[2] = True
+            if entry[1]:
+                entry[1] = False
+                self.frames -= 1
+        return entry[0]
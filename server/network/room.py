@@ -0,0 +1,219 @@
+import asyncio
+
+from shared.protocol import *
+from shared.map import *
+from shared.engine import Engine
+from server.network.views import Broadcast
+from server.network.scheduler import TickScheduler
+from server.network.moves import MoveQueues
+from server.network.metrics import Metrics
+from shared.replay import ReplayWriter, replay_path
+
+from constants.server import *
+from constants.cli_menu import MIN_COUNT, MAX_COUNT
+from constants.map import ROWS, COLS, MIN_MAP_SIZE, MAX_MAP_SIZE
+
+class Room:
+    """
+    a single match hosted by the asyncio server, with its own map, players and tick clock.
+    the room starts once num_players clients joined and ends when all of them disconnected
+    """
+    def __init__(self, name, num_players, tick_rate=TICK_RATE, map=None, moves_per_tick=MOVES_PER_TICK,
+                 metrics=None, label=None, replay_dir=None):
+        self.name = name
+        self.label = label if label is not None else name # name of the room in the metrics
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.replay_dir = replay_dir # the game is recorded to this directory if set
+        self.replay = None
+        self.num_players = num_players
+        self.map = map if map is not None else Map()
+        self.clients = {} # map the client address to its Connection
+        self.players = [] # connections in player id order, filled when the game starts
+        self.spectators = [] # connections watching the game
+        self.broadcast = Broadcast(self.map)
+        self.kings = []
+        self.engine = None
+        self.moves = MoveQueues(num_players, moves_per_tick)
+        self.scheduler = TickScheduler(tick_rate)
+        self.players_ready = asyncio.Event()
+        self.task = None
+        self.abandoned = False # everyone left before the game started, the room is closing
+
+    def is_open(self):
+        return not self.players_ready.is_set() and len(self.clients) < self.num_players
+
+    def add(self, conn):
+        self.clients[conn.address] = conn
+        conn.room = self
+        if len(self.clients) == self.num_players:
+            self.players_ready.set()
+
+    def add_spectator(self, conn):
+        """
+        adds a connection that watches the game, before or after it started. returns False if the room
+        has all the spectators it takes
+        """
+        if len(self.spectators) >= MAX_SPECTATORS:
+            return False
+        if not 0 <= conn.spectate <= self.num_players:
+            conn.spectate = 0
+        conn.room = self
+        self.spectators.append(conn)
+        if self.engine is not None:
+            self._subscribe(conn, conn.spectate)
+        return True
+
+    def remove(self, conn):
+        if conn in self.spectators:
+            self.spectators.remove(conn)
+            if conn.view is not None:
+                self.broadcast.unsubscribe(conn.view)
+        # before the game starts the slot is freed for another client
+        elif not self.players_ready.is_set():
+            self.clients.pop(conn.address, None)
+
+        # a named room nobody waits in any more is closed, the default room waits for the next players
+        if (self.name != DEFAULT_ROOM and not self.players_ready.is_set() and not self.clients
+                and not self.spectators and self.task is not None):
+            self.abandoned = True
+            self.task.cancel()
+
+    def _subscribe(self, conn, id):
+        conn.view = self.broadcast.subscribe(id)
+        conn.view.deltas = conn.deltas
+        conn.view.version = conn.version
+
+    def handle_client_msg(self, conn, msg_type, content):
+        msg_type = msg_type.upper()
+        if msg_type == 'R':
+            if conn.view is not None:
+                conn.view.request_keyframe()
+        elif msg_type == 'P' and conn in self.players:
+            self.moves.push(self.players.index(conn) + 1, [Protocol.parse_action(content)], Protocol.parse_action_seq(content))
+        elif msg_type == 'Q' and conn in self.players:
+            self.moves.push(self.players.index(conn) + 1, Protocol.parse_path(content), Protocol.parse_action_seq(content))
+        elif msg_type == 'G' and conn in self.players:
+            # the path is searched in the tick, not here, so a flood of go commands costs a bounded time
+            self.moves.push_go(self.players.index(conn) + 1, Protocol.parse_action(content), Protocol.parse_action_seq(content))
+
+    async def run(self):
+        await self.players_ready.wait()
+
+        self.map.generate_new(self.num_players)
+        self.kings = self.map.kings()
+        self.engine = Engine(self.map, self.num_players)
+        self.engine.paths.precompute()
+
+        self.players = list(self.clients.values())
+        for index, conn in enumerate(self.players):
+            self._subscribe(conn, index + 1)
+        for conn in self.spectators:
+            self._subscribe(conn, conn.spectate)
+
+        if self.replay_dir is not None:
+            self.replay = ReplayWriter(replay_path(self.replay_dir, self.label), self.engine)
+
+        self.scheduler.start()
+        self.metrics.add_room(self.label, self.scheduler)
+        try:
+            while not all(conn.closed for conn in self.players):
+                await asyncio.sleep(self.scheduler.time_until_next_tick())
+                self.scheduler.begin_tick()
+                self.metrics.begin_tick()
+
+                # input and simulation phases: the moves of this tick are taken from the queues of the
+                # players in turn, then the armies grow
+                with self.metrics.phase(self.label, 'moves'):
+                    actions, acks = self.moves.next_actions()
+                    self.engine.apply_actions(actions)
+                with self.metrics.phase(self.label, 'growth'):
+                    self.engine.grow()
+                if self.replay is not None:
+                    with self.metrics.phase(self.label, 'replay'):
+                        self.replay.record(actions)
+                for id, seq in acks.items():
+                    self.players[id - 1].view.ack = seq
+
+                # broadcast phase: every view is encoded once, the writer tasks of the connections send
+                # its bytes to everyone getting it
+                with self.metrics.phase(self.label, 'encode'):
+                    encodes = self.broadcast.encodes()
+                    self.broadcast.begin_tick()
+                    for id, conn in enumerate(self.players, 1):
+                        self.metrics.count_sent(self.label, id, conn.send_map())
+                    for conn in self.spectators:
+                        self.metrics.count_sent(self.label, SPECTATORS_LABEL, conn.send_map())
+                    self.metrics.count_encodes(self.label, self.broadcast.encodes() - encodes)
+                for id, conn in enumerate(self.players, 1):
+                    if conn.compressor is not None:
+                        self.metrics.count_compressed(self.label, id, *conn.compressor.take_stats())
+                for conn in self.spectators:
+                    if conn.compressor is not None:
+                        self.metrics.count_compressed(self.label, SPECTATORS_LABEL, *conn.compressor.take_stats())
+                self.metrics.set_queues(self.label, self.moves,
+                                        {id: conn.queue.qsize() for id, conn in enumerate(self.players, 1)},
+                                        {id: conn.dropped_frames for id, conn in enumerate(self.players, 1)})
+
+                # the paths of the go commands, then a few distance fields of the kings and cities per
+                # tick, instead of stalling the start
+                with self.metrics.phase(self.label, 'paths'):
+                    self.moves.resolve_goes(self.engine.paths)
+                    self.engine.paths.warm_up()
+
+                self.scheduler.end_tick()
+                self.metrics.end_tick()
+        finally:
+            self.metrics.remove_room(self.label)
+            if self.replay is not None:
+                self.replay.close()
+            for conn in list(self.spectators):
+                conn.writer.close()
+
+class RoomRegistry:
+    """
+    the rooms of a server by name. every room runs its game loop as a task of the server's event loop,
+    and its scheduler starts when the room fills, so the ticks of different rooms are spread out
+    """
+    def __init__(self, tick_rate=TICK_RATE, moves_per_tick=MOVES_PER_TICK, metrics=None, replay_dir=None):
+        self.tick_rate = tick_rate
+        self.moves_per_tick = moves_per_tick
+        self.replay_dir = replay_dir
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.rooms = {}
+        self.created = 0 # rooms created so far, numbers the default rooms in the metrics
+
+    def join(self, name, num_players, map=None, dims=(ROWS, COLS)):
+        """
+        returns the open room called (name), creating it for (num_players) players and a map of (dims),
+        (rows, cols), if needed. returns None if that room already started, the size is not allowed or
+        MAX_OPEN_ROOMS rooms are already waiting for their players.
+        the default room is replaced by a new one once it starts
+        """
+        room = self.rooms.get(name)
+        if room is not None and room.abandoned:
+            room = None
+        if room is not None and room.is_open():
+            return room
+        if room is not None and name != DEFAULT_ROOM:
+            return None
+        if sum(other.is_open() and not other.abandoned for other in self.rooms.values()) >= MAX_OPEN_ROOMS:
+            return None
+        if not MIN_COUNT <= num_players <= MAX_COUNT:
+            return None
+        if not all(MIN_MAP_SIZE <= size <= MAX_MAP_SIZE for size in dims):
+            return None
+
+        if map is None:
+            map = Map(*dims)
+        self.created += 1
+        label = name if name != DEFAULT_ROOM else f"default-{self.created}"
+        room = Room(name, num_players, self.tick_rate, map, self.moves_per_tick, self.metrics, label,
+                    self.replay_dir)
+        self.rooms[name] = room
+        room.task = asyncio.create_task(room.run())
+        room.task.add_done_callback(lambda task: self._room_finished(room))
+        return room
+
+    def _room_finished(self, room):
+        if self.rooms.get(room.name) is room:
+            del self.rooms[room.name]
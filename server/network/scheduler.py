@@ -0,0 +1,61 @@
+import time
+
+from constants.server import *
+
+class TickScheduler:
+    """
+    fixed timestep clock of the game loop. ticks are due every 1 / tick_rate seconds from the start,
+    no matter how long each tick took, so the game runs at the same speed under any load.
+    a tick that starts late is counted in the drift stats, a tick that ends after the next one was due
+    is an overrun, and the ticks after it run back to back until the loop catches up. if it falls
+    more than max_catchup ticks behind, the missed ticks are skipped instead
+    """
+    def __init__(self, tick_rate=TICK_RATE, max_catchup=MAX_CATCHUP_TICKS, clock=time.perf_counter):
+        self.interval = 1 / tick_rate
+        self.max_catchup = max_catchup
+        self.clock = clock
+        self.tick = 0
+        self.next_tick_time = None
+        self.tick_start = None
+        self.last_tick_duration = 0.0
+        self.last_drift = 0.0
+        self.max_drift = 0.0
+        self.overruns = 0
+        self.skipped_ticks = 0
+
+    def start(self):
+        self.next_tick_time = self.clock()
+
+    def time_until_next_tick(self):
+        return max(0.0, self.next_tick_time - self.clock())
+
+    def begin_tick(self):
+        self.tick_start = self.clock()
+        self.last_drift = self.tick_start - self.next_tick_time
+        self.max_drift = max(self.max_drift, self.last_drift)
+        return self.tick
+
+    def end_tick(self):
+        now = self.clock()
+        self.last_tick_duration = now - self.tick_start
+        self.tick += 1
+        self.next_tick_time += self.interval
+
+        if now > self.next_tick_time:
+            self.overruns += 1
+            behind = int((now - self.next_tick_time) / self.interval)
+            if behind > self.max_catchup:
+                skipped = behind - self.max_catchup
+                self.skipped_ticks += skipped
+                self.next_tick_time += skipped * self.interval
+                print(f"Tick {self.tick} is {behind} ticks behind, skipping {skipped}")
+
+    def stats(self):
+        return {
+            'tick': self.tick,
+            'tick_duration': self.last_tick_duration,
+            'drift': self.last_drift,
+            'max_drift': self.max_drift,
+            'overruns': self.overruns,
+            'skipped_ticks': self.skipped_ticks,
+        }
@@ -4,12 +4,21 @@ import time
 
 from shared.protocol import *
 from shared.map import *
+from shared.framing import FrameDecoder
+from shared.engine import Engine
+from server.network.views import Broadcast
+from server.network.outbox import Outbox
+from shared.compression import StreamCompressor
+from server.network.scheduler import TickScheduler
+from server.network.moves import MoveQueues
+from server.network.metrics import Metrics
+from shared.replay import ReplayWriter, replay_path
 
-from constants.server import *
 from constants.server import *
 
 class Server:
-    def __init__(self, host, port, map, num_players=2):
+    def __init__(self, host, port, map, num_players=2, tick_rate=TICK_RATE, moves_per_tick=MOVES_PER_TICK,
+                 replay_dir=None):
         self.host = host
         self.port = port
         self.map = map
@@ -17,55 +26,103 @@ class Server:
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.clients = {} # map the client address to socket
         self.kings = []
+        self.views = {} # map the client socket to the tracker of the map view last sent to it
+        self.spectators = {} # map the socket of a spectator to its view tracker, None until the game started
+        self.spectated = {} # map the socket of a spectator to the id of the player it watches, 0 for the whole map
+        self.pending = {} # map the socket of a connection whose hello was not read yet to its (address, time accepted)
+        self.outboxes = {} # map the client socket to the messages waiting to be sent to it
+        self.left = set() # sockets of the players that left or misbehaved, their seats and armies stay in the game
+        self.broadcast = None # the shared map views, created when the game starts
+        self.delta_sockets = set() # sockets of clients that asked for delta map messages
+        self.versions = {} # map the client socket to its negotiated wire format version
+        self.decoders = {} # map the client socket to the frame decoder of its connection
+        self.engine = None
+        self.moves_per_tick = moves_per_tick
+        self.moves = None # the move queues of the players, created when the game starts
+        self.scheduler = TickScheduler(tick_rate)
+        self.metrics = Metrics()
+        self.replay_dir = replay_dir # games are recorded to this directory if set
+        self.replay = None
 
     def start(self):
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(self.num_players)
+        self.server_socket.listen() # spectators may connect many at once
 
         try:
             while len(self.clients) < self.num_players:
                 self._accept_new_clients()
                 self._check_connected_clients()
+            # connections still waiting for their hello watch the game, their hello may pick a player
+            for s in list(self.pending):
+                self.pending.pop(s)
+                self.spectators[s] = None
+                self.spectated[s] = 0
             self.map.generate_new(self.num_players)
 
-            for y in range(ROWS):
-                for x in range(COLS):
-                    tile = self.map.tiles[y][x]
-                    if tile.type == KING:
-                        self.kings.append((x, y))
+            self.kings = self.map.kings()
+            self.engine = Engine(self.map, self.num_players)
+            self.moves = MoveQueues(self.num_players, self.moves_per_tick)
+            self.engine.paths.precompute()
+            if self.replay_dir is not None:
+                self.replay = ReplayWriter(replay_path(self.replay_dir, 'game'), self.engine)
+
+            self.broadcast = Broadcast(self.map)
+            for index, s in enumerate(self.clients.values()):
+                self.views[s] = self._subscribe(s, index + 1)
+            for s in self.spectators:
+                self.spectators[s] = self._subscribe(s, self.spectated[s])
 
-            gen_counter = 0
+            self.scheduler.start()
+            self.metrics.add_room(DEFAULT_ROOM, self.scheduler)
             while True:
                 client_sockets = list(self.clients.values())
-                # Create and send the map message after updating the army values
-                for s in client_sockets:
-                    map_msg = Protocol.create_map_msg(self.map, client_sockets.index(s) + 1)
-                    s.sendall(map_msg.encode('utf-8'))
+                if all(s in self.left for s in client_sockets):
+                    break
+                self._wait_for_tick(client_sockets)
+                self.scheduler.begin_tick()
+                self.metrics.begin_tick()
 
-                readable, _, _ = select.select([self.server_socket] + client_sockets, [], [], 0.2)
-                for s in readable:
-                    msg_type, content = Protocol.get_message(s)
-                    if content and content != "":
-                        Protocol.handle_msg(msg_type, content, self.map, client_sockets=client_sockets, s=s)
-
-                # Update army values first
-                for y in range(ROWS):
-                    for x in range(COLS):
-                        tile = self.map.tiles[y][x]
-                        if gen_counter >= TURNS_TO_RESET and tile.type == ARMY and tile.owner > 0:
-                            tile.army += 1
-                        elif tile.type == KING or (tile.type == CITY and tile.owner > 0):
-                            tile.army += 1
-
-                if gen_counter >= TURNS_TO_RESET:
-                    gen_counter = 0
-                else:
-                    gen_counter += 1
-                time.sleep(0.2)
-
-        except (BrokenPipeError, ValueError):
-            s.close()
+                # input and simulation phases: the moves of this tick are taken from the queues of the
+                # players in turn, then the armies grow
+                with self.metrics.phase(DEFAULT_ROOM, 'moves'):
+                    actions, acks = self.moves.next_actions()
+                    self.engine.apply_actions(actions)
+                with self.metrics.phase(DEFAULT_ROOM, 'growth'):
+                    self.engine.grow()
+                if self.replay is not None:
+                    with self.metrics.phase(DEFAULT_ROOM, 'replay'):
+                        self.replay.record(actions)
+                for id, seq in acks.items():
+                    self.views[client_sockets[id - 1]].ack = seq
+                self.metrics.set_queues(DEFAULT_ROOM, self.moves)
+
+                # broadcast phase: every view is encoded once and its bytes queued for everyone getting it
+                with self.metrics.phase(DEFAULT_ROOM, 'encode'):
+                    encodes = self.broadcast.encodes()
+                    self.broadcast.begin_tick()
+                    for id, s in enumerate(client_sockets, 1):
+                        if s not in self.left:
+                            self.metrics.count_sent(DEFAULT_ROOM, id, self._queue_map(s, self.views[s]))
+                    for s, tracker in self.spectators.items():
+                        if tracker is not None:
+                            self.metrics.count_sent(DEFAULT_ROOM, SPECTATORS_LABEL, self._queue_map(s, tracker))
+                    self.metrics.count_encodes(DEFAULT_ROOM, self.broadcast.encodes() - encodes)
+                with self.metrics.phase(DEFAULT_ROOM, 'send'):
+                    for s in client_sockets:
+                        self._flush_player(s)
+                    for s in list(self.spectators):
+                        self._flush_spectator(s)
+                self._count_compressed(client_sockets)
+
+                # the paths of the go commands, then a few distance fields of the kings and cities per
+                # tick, instead of stalling the start
+                with self.metrics.phase(DEFAULT_ROOM, 'paths'):
+                    self.moves.resolve_goes(self.engine.paths)
+                    self.engine.paths.warm_up()
+
+                self.scheduler.end_tick()
+                self.metrics.end_tick()
 
         finally:
             self.cleanup()
@@ -76,15 +133,260 @@ class Server:
             ip = s.getsockname()[0]
         return ip
 
+    def _handle_client_msg(self, s, msg_type, content, client_sockets):
+        msg_type = msg_type.upper()
+        if msg_type == 'H':
+            if content.get('deltas') == '1':
+                self.delta_sockets.add(s)
+                if s in self.views:
+                    self.views[s].deltas = True
+
+            version = min(int(content.get('version', TEXT_VERSION)), PROTOCOL_VERSION)
+            self.versions[s] = version
+            if s in self.views:
+                self.views[s].version = version
+            outbox = self.outboxes[s]
+            if content.get('compress') == '1' and outbox.compressor is None:
+                outbox.compressor = StreamCompressor()
+            hello = Protocol.create_hello_msg(s in self.delta_sockets, version, compress=outbox.compressor is not None)
+            outbox.push(hello.encode('utf-8'))
+            outbox.flush(s)
+
+            if s not in self.views and ('spectate' in content or s in self.spectators):
+                self._add_spectator(s, int(content.get('spectate', self.spectated.get(s, 0))))
+        elif msg_type == 'R':
+            if s in self.views:
+                self.views[s].request_keyframe()
+            elif self.spectators.get(s) is not None:
+                self.spectators[s].request_keyframe()
+        elif msg_type == 'P' and s in self.views:
+            self.moves.push(client_sockets.index(s) + 1, [Protocol.parse_action(content)], Protocol.parse_action_seq(content))
+        elif msg_type == 'Q' and s in self.views:
+            self.moves.push(client_sockets.index(s) + 1, Protocol.parse_path(content), Protocol.parse_action_seq(content))
+        elif msg_type == 'G' and s in self.views:
+            # the path is searched in the tick, not here, so a flood of go commands costs a bounded time
+            self.moves.push_go(client_sockets.index(s) + 1, Protocol.parse_action(content), Protocol.parse_action_seq(content))
+
+    def _wait_for_tick(self, client_sockets):
+        """
+        reads client messages until the next tick is due
+        """
+        while True:
+            timeout = self.scheduler.time_until_next_tick()
+            if timeout <= 0:
+                return
+            player_sockets = [s for s in client_sockets if s not in self.left]
+            if not player_sockets:
+                return
+            spectator_sockets = list(self.spectators)
+            sending = [s for s in player_sockets + spectator_sockets if self.outboxes[s]]
+            with self.metrics.phase(DEFAULT_ROOM, 'select'):
+                readable, writable, _ = select.select([self.server_socket] + player_sockets + spectator_sockets,
+                                                      sending, [], timeout)
+            with self.metrics.phase(DEFAULT_ROOM, 'send'):
+                for s in writable:
+                    if s in self.spectators:
+                        self._flush_spectator(s)
+                    else:
+                        self._flush_player(s)
+            with self.metrics.phase(DEFAULT_ROOM, 'handle_msg'):
+                for s in readable:
+                    if s is self.server_socket:
+                        self._accept_spectator()
+                    elif s in self.spectators:
+                        self._read_spectator(s, client_sockets)
+                    elif s in self.decoders and s not in self.left:
+                        self._read_player(s, client_sockets)
+
+    def _read_player(self, s, client_sockets):
+        # a player that leaves or sends garbage is dropped, the game goes on for the others
+        try:
+            for msg_type, content in self.decoders[s].recv(s):
+                self._handle_client_msg(s, msg_type, content, client_sockets)
+        except (ConnectionError, ValueError, OSError) as e:
+            self._drop_player(s, e)
+
+    def _flush_player(self, s):
+        if s in self.left:
+            return
+        try:
+            self.outboxes[s].flush(s)
+        except OSError as e:
+            self._drop_player(s, e)
+
+    def _drop_player(self, s, reason):
+        print(f"Player {list(self.clients.values()).index(s) + 1} dropped: {reason}")
+        self.left.add(s)
+        self.decoders.pop(s, None)
+        s.close()
+
     def _accept_new_clients(self):
-        readable, _, _ = select.select([self.server_socket], [], [], 1)
+        """
+        a new connection is a player only once its hello did not ask to spectate - or it sent none
+        within JOIN_TIMEOUT, like old clients - so a spectator never takes a player's seat
+        """
+        client_sockets = list(self.clients.values())
+        timeout = 0.1 if self.pending else 1
+        readable, _, _ = select.select([self.server_socket] + client_sockets + list(self.pending) + list(self.spectators),
+                                       [], [], timeout)
         if self.server_socket in readable:
             client_socket, client_address = self.server_socket.accept()
-            if len(self.clients) < self.num_players:
-                self.clients[client_address] = client_socket
+            if len(self.pending) + len(self.spectators) < MAX_SPECTATORS + self.num_players:
+                client_socket.setblocking(False)
+                self.pending[client_socket] = (client_address, time.monotonic())
+                self.decoders[client_socket] = FrameDecoder()
+                self.outboxes[client_socket] = Outbox()
             else:
                 client_socket.close()
 
+        for s in readable:
+            if s in self.spectators:
+                self._read_spectator(s, client_sockets)
+            elif s in self.pending:
+                self._read_pending(s)
+            elif s in client_sockets and self._is_client_connected(s):
+                try:
+                    messages = self.decoders[s].recv(s)
+                    for msg_type, content in messages:
+                        self._handle_client_msg(s, msg_type, content, client_sockets)
+                except (ConnectionError, ValueError):
+                    continue # _check_connected_clients drops it
+
+        now = time.monotonic()
+        for s, (_, accepted) in list(self.pending.items()):
+            if now - accepted >= JOIN_TIMEOUT:
+                self._seat_player(s)
+
+    def _read_pending(self, s):
+        try:
+            messages = self.decoders[s].recv(s)
+        except (ConnectionError, ValueError, OSError):
+            self.pending.pop(s)
+            self.decoders.pop(s, None)
+            self.outboxes.pop(s, None)
+            s.close()
+            return
+        if not messages:
+            return
+
+        msg_type, content = messages[0]
+        if msg_type.upper() == 'H' and 'spectate' in content:
+            self.pending.pop(s)
+            self.spectators[s] = None
+            self.spectated[s] = 0
+            try:
+                for msg_type, content in messages:
+                    if msg_type.upper() in ('H', 'R'):
+                        self._handle_client_msg(s, msg_type, content, [])
+            except (ConnectionError, ValueError, OSError):
+                self._drop_spectator(s)
+            return
+
+        if self._seat_player(s):
+            client_sockets = list(self.clients.values())
+            try:
+                for msg_type, content in messages:
+                    self._handle_client_msg(s, msg_type, content, client_sockets)
+            except (ConnectionError, ValueError, OSError):
+                pass # _check_connected_clients drops it
+
+    def _seat_player(self, s):
+        """
+        makes a pending connection a player, or closes it if the game is full. returns True if it got a seat
+        """
+        address, _ = self.pending.pop(s)
+        if len(self.clients) >= self.num_players:
+            self.decoders.pop(s, None)
+            self.outboxes.pop(s, None)
+            s.close()
+            return False
+        self.clients[address] = s
+        return True
+
+    def _subscribe(self, s, id):
+        tracker = self.broadcast.subscribe(id)
+        tracker.deltas = s in self.delta_sockets
+        tracker.version = self.versions.get(s, TEXT_VERSION)
+        return tracker
+
+    def _queue_map(self, s, tracker):
+        """
+        queues the map message of this tick for a client and returns its size. a client too far behind
+        gets nothing this tick, and a keyframe the next
+        """
+        msg = tracker.next_msg()
+        if not self.outboxes[s].push_frame(msg):
+            tracker.request_keyframe()
+            return 0
+        return len(msg)
+
+    def _count_compressed(self, client_sockets):
+        """
+        counts what was compressed since the last tick, including while waiting for this one
+        """
+        for id, s in enumerate(client_sockets, 1):
+            if s not in self.left and self.outboxes[s].compressor is not None:
+                self.metrics.count_compressed(DEFAULT_ROOM, id, *self.outboxes[s].compressor.take_stats())
+        for s in self.spectators:
+            if self.outboxes[s].compressor is not None:
+                self.metrics.count_compressed(DEFAULT_ROOM, SPECTATORS_LABEL, *self.outboxes[s].compressor.take_stats())
+
+    def _accept_spectator(self):
+        """
+        once the game started, every new connection is a spectator of the whole map until its hello says
+        otherwise
+        """
+        s, _ = self.server_socket.accept()
+        if len(self.spectators) >= MAX_SPECTATORS:
+            s.close()
+            return
+        s.setblocking(False)
+        self.decoders[s] = FrameDecoder()
+        self.outboxes[s] = Outbox()
+        self.spectators[s] = None
+        self.spectated[s] = 0
+
+    def _add_spectator(self, s, id):
+        """
+        makes the connection a spectator of player (id), or of the whole map for 0
+        """
+        for address, client_socket in list(self.clients.items()):
+            if client_socket is s:
+                del self.clients[address]
+        if not 0 <= id <= self.num_players:
+            id = 0
+        self.spectated[s] = id
+
+        if self.spectators.get(s) is not None:
+            self.broadcast.unsubscribe(self.spectators[s])
+        self.spectators[s] = self._subscribe(s, id) if self.broadcast is not None else None
+
+    def _read_spectator(self, s, client_sockets):
+        # a spectator that leaves or misbehaves does not stop the game
+        try:
+            for msg_type, content in self.decoders[s].recv(s):
+                if msg_type.upper() in ('H', 'R'):
+                    self._handle_client_msg(s, msg_type, content, client_sockets)
+        except (ConnectionError, ValueError, OSError):
+            self._drop_spectator(s)
+
+    def _flush_spectator(self, s):
+        try:
+            self.outboxes[s].flush(s)
+        except OSError:
+            self._drop_spectator(s)
+
+    def _drop_spectator(self, s):
+        tracker = self.spectators.pop(s, None)
+        if tracker is not None:
+            self.broadcast.unsubscribe(tracker)
+        self.spectated.pop(s, None)
+        self.decoders.pop(s, None)
+        self.outboxes.pop(s, None)
+        self.delta_sockets.discard(s)
+        self.versions.pop(s, None)
+        s.close()
+
     def _check_connected_clients(self):
         keys_to_remove = []
         for client_address, client_socket in self.clients.items():
@@ -93,6 +395,8 @@ class Server:
                 client_socket.close()
 
         for key in keys_to_remove:
+            self.decoders.pop(self.clients[key], None)
+            self.outboxes.pop(self.clients[key], None)
             del self.clients[key]
         
 
@@ -110,8 +414,11 @@ class Server:
             return False
 
     def cleanup(self):
+        if self.replay is not None:
+            self.replay.close()
+            print(f"Replay saved to {self.replay.path}")
         self.server_socket.close()
-        for client_socket in self.clients.values():
+        for client_socket in list(self.clients.values()) + list(self.spectators) + list(self.pending):
             client_socket.close()
 
 
@@ -0,0 +1,254 @@
+import asyncio
+import json
+import multiprocessing
+import signal
+import socket
+import time
+
+from shared.map import Map
+from shared.framing import FrameDecoder
+from server.network.server import Server
+from server.network.async_server import AsyncServer
+
+from constants.server import *
+from constants.protocol import *
+from constants.map import ROWS, COLS
+
+class ShardWorker:
+    """
+    a worker process of the shard router. it runs an AsyncServer without a listening socket,
+    serves the client sockets the router passes over the control socket, and reports its load back
+    """
+    def __init__(self, control, num_players, tick_rate, moves_per_tick=MOVES_PER_TICK, dims=(ROWS, COLS),
+                 replay_dir=None):
+        self.control = control
+        self.server = AsyncServer(None, None, Map(*dims), num_players, tick_rate, moves_per_tick, replay_dir)
+
+    @staticmethod
+    def run(control, num_players, tick_rate, moves_per_tick=MOVES_PER_TICK, dims=(ROWS, COLS), replay_dir=None,
+            inherited=()):
+        # the router's ends of the control sockets, inherited by the fork. left open, the router exiting
+        # would never close this worker's control socket, and the worker would outlive it
+        for sock in inherited:
+            sock.close()
+
+        worker = ShardWorker(control, num_players, tick_rate, moves_per_tick, dims, replay_dir)
+        asyncio.run(worker.serve())
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        self.stopped = loop.create_future()
+        loop.add_reader(self.control.fileno(), self._receive_sockets)
+
+        report_task = asyncio.create_task(self._report_loop())
+        try:
+            await self.stopped
+        finally:
+            report_task.cancel()
+            loop.remove_reader(self.control.fileno())
+
+    def _receive_sockets(self):
+        msg, fds, _, _ = socket.recv_fds(self.control, 16, 1)
+        if not msg and not fds:
+            # the router is gone
+            if not self.stopped.done():
+                self.stopped.set_result(None)
+            return
+
+        for fd in fds:
+            sock = socket.socket(fileno=fd)
+            sock.setblocking(False)
+            asyncio.create_task(self.server.adopt(sock))
+
+    async def _report_loop(self):
+        while True:
+            self.control.send(json.dumps(self.load()).encode('utf-8'))
+            await asyncio.sleep(LOAD_REPORT_INTERVAL)
+
+    def load(self):
+        """
+        the number of connected clients, the fraction of a core the room ticks take,
+        and whether each room is still open for players
+        """
+        rooms = self.server.registry.rooms.values()
+        return {
+            'connections': sum(len(room.clients) for room in rooms),
+            'cpu': sum(room.scheduler.last_tick_duration / room.scheduler.interval for room in rooms),
+            'rooms': {room.name: room.is_open() for room in rooms},
+        }
+
+class WorkerHandle:
+    def __init__(self, index, process, control):
+        self.index = index
+        self.process = process
+        self.control = control
+        self.connections = 0
+        self.cpu = 0.0
+        self.handoffs = 0 # connections passed since the last report
+
+class ShardRouter:
+    """
+    front door of a multi-process server. it accepts every connection, peeks at the hello to learn
+    the room, and passes the socket to the worker process hosting that room. new rooms go to the
+    least busy worker, by the load the workers report every LOAD_REPORT_INTERVAL seconds
+    """
+    get_ip = Server.get_ip
+
+    def __init__(self, host, port, num_workers, num_players=2, tick_rate=TICK_RATE, moves_per_tick=MOVES_PER_TICK,
+                 dims=(ROWS, COLS), replay_dir=None):
+        self.host = host
+        self.port = port
+        self.num_workers = num_workers
+        self.num_players = num_players
+        self.tick_rate = tick_rate
+        self.moves_per_tick = moves_per_tick
+        self.dims = dims # (rows, cols) of the maps of the default rooms
+        self.replay_dir = replay_dir
+        self.workers = []
+        self.assignments = {} # map the room name to (worker index, time it was assigned)
+
+    def start(self):
+        for index in range(self.num_workers):
+            control, worker_control = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            inherited = [worker.control for worker in self.workers] + [control]
+            process = multiprocessing.Process(target=ShardWorker.run,
+                                              args=(worker_control, self.num_players, self.tick_rate, self.moves_per_tick, self.dims,
+                                                    self.replay_dir, inherited),
+                                              daemon=True)
+            process.start()
+            worker_control.close()
+            self.workers.append(WorkerHandle(index, process, control))
+
+        try:
+            asyncio.run(self.serve())
+        finally:
+            # closing the control sockets tells the workers to stop, the ones that do not are terminated
+            for worker in self.workers:
+                worker.control.close()
+            for worker in self.workers:
+                worker.process.join(1)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+                    worker.process.join()
+
+    async def serve(self):
+        """
+        routes new connections until SIGTERM
+        """
+        loop = asyncio.get_running_loop()
+        for worker in self.workers:
+            loop.add_reader(worker.control.fileno(), self._read_report, worker)
+
+        stopped = loop.create_future()
+        loop.add_signal_handler(signal.SIGTERM, self._set_readable, stopped)
+
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as listener:
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((self.host, self.port))
+            listener.listen()
+            listener.setblocking(False)
+
+            accept_task = asyncio.create_task(self._accept_loop(listener))
+            try:
+                await stopped
+            finally:
+                accept_task.cancel()
+                loop.remove_signal_handler(signal.SIGTERM)
+                for worker in self.workers:
+                    loop.remove_reader(worker.control.fileno())
+
+    async def _accept_loop(self, listener):
+        loop = asyncio.get_running_loop()
+        while True:
+            sock, _ = await loop.sock_accept(listener)
+            asyncio.create_task(self._route(sock))
+
+    async def _route(self, sock):
+        try:
+            room_name = await self._peek_room(sock)
+        except (ConnectionError, ValueError):
+            sock.close()
+            return
+
+        worker = self._pick_worker(room_name)
+        socket.send_fds(worker.control, [b'C'], [sock.fileno()])
+        sock.close()
+        worker.handoffs += 1
+        worker.connections += 1
+
+    async def _peek_room(self, sock):
+        """
+        waits up to JOIN_TIMEOUT for the hello of a new connection and returns the room it asks for.
+        the hello is only peeked at, so the worker reads it again as if the client connected to it
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + JOIN_TIMEOUT
+        while loop.time() < deadline:
+            readable = loop.create_future()
+            loop.add_reader(sock.fileno(), self._set_readable, readable)
+            try:
+                await asyncio.wait_for(readable, deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+            finally:
+                loop.remove_reader(sock.fileno())
+
+            data = sock.recv(RECV_BUFFER_SIZE, socket.MSG_PEEK)
+            if not data:
+                raise ConnectionError("connection closed")
+
+            messages = FrameDecoder().feed(data)
+            if messages:
+                msg_type, content = messages[0]
+                if msg_type.upper() == 'H':
+                    return content.get('room', DEFAULT_ROOM)
+                return DEFAULT_ROOM
+
+            # only part of the hello arrived, peeking again right away would return the same bytes
+            await asyncio.sleep(0.01)
+
+        return DEFAULT_ROOM
+
+    @staticmethod
+    def _set_readable(future):
+        # the reader callback runs on every loop iteration until removed
+        if not future.done():
+            future.set_result(None)
+
+    def _pick_worker(self, room_name):
+        assignment = self.assignments.get(room_name)
+        if assignment is not None:
+            return self.workers[assignment[0]]
+
+        worker = min(self.workers, key=lambda worker: (worker.cpu, worker.connections))
+        self.assignments[room_name] = (worker.index, time.monotonic())
+        return worker
+
+    def _read_report(self, worker):
+        data = worker.control.recv(RECV_BUFFER_SIZE)
+        if not data:
+            asyncio.get_running_loop().remove_reader(worker.control.fileno())
+            print(f"Shard worker {worker.index} exited")
+            return
+
+        report = json.loads(data)
+        worker.connections = report['connections'] + worker.handoffs
+        worker.handoffs = 0
+        worker.cpu = report['cpu']
+
+        # forget the rooms that ended, and the default room once it filled or emptied, so the next
+        # player opens one on any worker. rooms assigned a moment ago may not exist on the worker yet
+        rooms = report['rooms']
+        now = time.monotonic()
+        for room_name, (index, assigned_at) in list(self.assignments.items()):
+            if index != worker.index:
+                continue
+            if room_name == DEFAULT_ROOM and rooms.get(DEFAULT_ROOM) is False:
+                del self.assignments[room_name]
+            elif room_name not in rooms and now - assigned_at > JOIN_TIMEOUT + LOAD_REPORT_INTERVAL:
+                del self.assignments[room_name]
+
+        # a player passed on just as the default room filled opens a new one on the same worker,
+        # the next players join it there
+        if DEFAULT_ROOM not in self.assignments and rooms.get(DEFAULT_ROOM):
+            self.assignments[DEFAULT_ROOM] = (worker.index, now)
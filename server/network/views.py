@@ -0,0 +1,132 @@
+import numpy as np
+
+from shared.protocol import *
+from shared.binary_protocol import BinaryProtocol
+from constants.protocol import *
+
+class SharedView:
+    """
+    one view of the map - what player (id) sees, or the whole map for id 0 - as the map messages of
+    the current tick. every message is encoded at most once per tick, per wire format and kind
+    (keyframe or delta), into immutable bytes that all the connections getting this view share.
+    the sequence numbers and the acknowledged action are those of the view, so the messages of a
+    player's view are the same for the player and for everyone watching them
+    """
+    def __init__(self, map, id):
+        self.map = map
+        self.id = id
+        self.seq = 0
+        self.ack = 0 # sequence number of the last action of the player processed (0 for none), sent with every message
+        self.view = None
+        self.last_view = None
+        self.changed = None # tiles that changed since the last tick, computed once for the deltas
+        self.messages = {} # (version, keyframe) -> encoded message of this tick
+        self.subscribers = 0
+        self.encodes = 0 # messages encoded so far
+
+    def advance(self):
+        """
+        moves to the next tick
+        """
+        self.seq += 1
+        self.last_view = self.view
+        self.view = self.map.player_view(self.id)
+        self.changed = None
+        self.messages = {}
+
+    def message(self, version, keyframe):
+        """
+        the encoded map message of this tick. deltas are relative to the message of the last tick
+        """
+        msg = self.messages.get((version, keyframe))
+        if msg is not None:
+            return msg
+
+        if keyframe:
+            if version == BINARY_VERSION:
+                msg = BinaryProtocol.create_map_msg(self.id, self.seq, self.view, self.ack)
+            else:
+                msg = Protocol.create_map_msg(self.map, self.id, self.seq, self.view, self.ack).encode('utf-8')
+        else:
+            if self.changed is None:
+                self.changed = np.zeros(self.view[0].shape, dtype=bool)
+                for array, last_array in zip(self.view, self.last_view):
+                    self.changed |= array != last_array
+            if version == BINARY_VERSION:
+                msg = BinaryProtocol.create_delta_msg(self.id, self.seq, self.view, self.changed, self.ack)
+            else:
+                msg = Protocol.create_delta_msg(self.id, self.seq, self.view, self.changed, self.ack).encode('utf-8')
+
+        self.messages[(version, keyframe)] = msg
+        self.encodes += 1
+        return msg
+
+class ViewTracker:
+    """
+    remembers what a connection got of a view, so that each tick only the tiles that changed since
+    are sent. a full map (keyframe) is sent every KEYFRAME_INTERVAL messages, when the client asks
+    for a resync or missed a message, and always to clients that did not ask for deltas.
+    messages are returned encoded, in the wire format version the client negotiated.
+    a tracker made without a shared view has a view of its own, which next_msg advances
+    """
+    def __init__(self, map, id, shared=None):
+        self.owns_view = shared is None
+        self.shared = shared if shared is not None else SharedView(map, id)
+        self.deltas = False
+        self.version = TEXT_VERSION
+        self.last_seq = None # sequence number of the last message sent
+        self.need_keyframe = True
+
+    @property
+    def id(self):
+        return self.shared.id
+
+    @property
+    def ack(self):
+        return self.shared.ack
+
+    @ack.setter
+    def ack(self, value):
+        self.shared.ack = value
+
+    def request_keyframe(self):
+        self.need_keyframe = True
+
+    def next_msg(self):
+        shared = self.shared
+        if self.owns_view:
+            shared.advance()
+
+        keyframe = not self.deltas or self.need_keyframe or shared.last_view is None \
+            or self.last_seq != shared.seq - 1 or shared.seq % KEYFRAME_INTERVAL == 0
+        self.need_keyframe = False
+        self.last_seq = shared.seq
+        return shared.message(self.version, keyframe)
+
+class Broadcast:
+    """
+    the shared views of a game by id, so a tick encodes each view once however many connections get
+    it. subscribe() gives a connection a tracker of a view, begin_tick() moves every view somebody gets
+    to the new tick, after which the trackers return the messages of that tick
+    """
+    def __init__(self, map):
+        self.map = map
+        self.views = {} # view id -> SharedView
+
+    def subscribe(self, id):
+        shared = self.views.get(id)
+        if shared is None:
+            shared = self.views[id] = SharedView(self.map, id)
+        shared.subscribers += 1
+        return ViewTracker(self.map, id, shared)
+
+    def unsubscribe(self, tracker):
+        tracker.shared.subscribers -= 1
+
+    def begin_tick(self):
+        for shared in self.views.values():
+            if shared.subscribers > 0:
+                shared.advance()
+
+    def encodes(self):
+        return sum(shared.encodes for shared in self.views.values())
@@ -0,0 +1,126 @@
+import numpy as np
+
+from shared.map import Map
+from constants.map import *
+from constants.server import TURNS_TO_RESET
+
+class BatchEngine:
+    """
+    steps B games at once. the games are held as (B, rows, cols) type/owner/army arrays, and every rule
+    of Engine - move resolution as in Map.interaction, king capture as in Map._convert_all_tiles and the
+    TURNS_TO_RESET army growth - is applied to the whole batch with array operations.
+    the games of a batch share the tick counter, and so the growth turns
+    """
+    def __init__(self, types, owners, armies, num_players):
+        self.types = types
+        self.owners = owners
+        self.armies = armies
+        self.num_players = num_players
+        self.batch_size, self.rows, self.cols = types.shape
+        self.tick = 0
+        self.gen_counter = 0
+
+    @staticmethod
+    def from_maps(maps, num_players):
+        types = np.stack([map.types for map in maps])
+        owners = np.stack([map.owners for map in maps])
+        armies = np.stack([map.armies for map in maps])
+        return BatchEngine(types, owners, armies, num_players)
+
+    @staticmethod
+    def new_games(batch_size, num_players, rows=ROWS, cols=COLS, **params):
+        maps = []
+        for _ in range(batch_size):
+            map = Map(rows, cols)
+            map.generate_new(num_players, **params)
+            maps.append(map)
+        return BatchEngine.from_maps(maps, num_players)
+
+    def no_actions(self):
+        """
+        an actions array where nobody moves, to fill in
+        """
+        return np.full((self.batch_size, self.num_players, 4), -1, dtype=np.int32)
+
+    def step(self, actions):
+        """
+        (actions) is an int array of shape (B, num_players, 4) holding the (from_x, from_y, to_x, to_y)
+        move of player p + 1 in game b at actions[b, p], or -1s for no move. the players of every game
+        move in id order, like Engine.step with the actions sorted by id, then the armies grow
+        """
+        for index in range(self.num_players):
+            self._apply_moves(index + 1, actions[:, index])
+
+        self._grow_armies(self.gen_counter >= TURNS_TO_RESET)
+
+        if self.gen_counter >= TURNS_TO_RESET:
+            self.gen_counter = 0
+        else:
+            self.gen_counter += 1
+        self.tick += 1
+
+    def _apply_moves(self, id, moves):
+        from_x, from_y, to_x, to_y = (moves[:, i] for i in range(4))
+
+        # the same checks as Engine.check_action
+        valid = (from_x >= 0) & (from_x < self.cols) & (from_y >= 0) & (from_y < self.rows) \
+            & (to_x >= 0) & (to_x < self.cols) & (to_y >= 0) & (to_y < self.rows) \
+            & (np.abs(from_x - to_x) + np.abs(from_y - to_y) == 1)
+        games = np.flatnonzero(valid)
+        from_x, from_y, to_x, to_y = from_x[games], from_y[games], to_x[games], to_y[games]
+
+        owned = self.owners[games, from_y, from_x] == id
+        games, from_x, from_y, to_x, to_y = games[owned], from_x[owned], from_y[owned], to_x[owned], to_y[owned]
+        if len(games) == 0:
+            return
+
+        from_army = self.armies[games, from_y, from_x]
+        to_army = self.armies[games, to_y, to_x]
+        to_owner = self.owners[games, to_y, to_x]
+        to_type = self.types[games, to_y, to_x]
+
+        same = to_owner == id
+        capture = ~same & (to_army < from_army)
+        hold = ~same & ~capture
+
+        new_army = np.where(same, to_army + from_army - 1, 0)
+        new_army = np.where(hold, np.maximum(to_army - from_army + 1, 1), new_army)
+        new_army = np.where(capture, from_army - to_army, new_army)
+        self.armies[games, to_y, to_x] = new_army
+        self.armies[games, from_y, from_x] = 1
+
+        captured_king = capture & (to_type == KING_CODE)
+        captured_tile = capture & ~captured_king
+        self.owners[games[captured_tile], to_y[captured_tile], to_x[captured_tile]] = id
+
+        if np.any(captured_king):
+            # every tile of the defeated players goes to the winner, and their kings become cities
+            defeated = np.zeros(self.batch_size, dtype=self.owners.dtype)
+            defeated[games[captured_king]] = to_owner[captured_king]
+            converted = (self.owners == defeated[:, None, None]) & (defeated[:, None, None] > 0)
+            self.types[converted & (self.types == KING_CODE)] = CITY_CODE
+            self.owners[converted] = id
+
+    def _grow_armies(self, grow_land):
+        owned = self.owners > 0
+        growing = (self.types == KING_CODE) | ((self.types == CITY_CODE) & owned)
+        if grow_land:
+            growing |= (self.types == ARMY_CODE) & owned
+        self.armies += growing
+
+    def alive(self):
+        """
+        (B, num_players + 1) bool array, alive[b, id] is set if player (id) still has its king in game b
+        """
+        kings = self.types == KING_CODE
+        alive = np.zeros((self.batch_size, self.num_players + 1), dtype=bool)
+        for id in range(1, self.num_players + 1):
+            alive[:, id] = np.any(kings & (self.owners == id), axis=(1, 2))
+        return alive
+
+    def winners(self):
+        """
+        the winner of every game, or 0 for the games that are not over
+        """
+        alive = self.alive()
+        return np.where(alive.sum(axis=1) == 1, np.argmax(alive, axis=1), 0)
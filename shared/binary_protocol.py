@@ -0,0 +1,125 @@
+import struct
+import numpy as np
+
+from constants.protocol import *
+from constants.map import TILE_TYPES
+
+FRAME_HEADER = struct.Struct('<BI') # magic, payload length
+MAP_HEADER = struct.Struct('<cBIIIHH') # msg type, id, seq, acknowledged action seq, number of tiles, rows, cols
+ACTION = struct.Struct('<cHHHHI') # msg type ('P' move or 'G' go), from x, from y, to x, to y, action seq (0 for none)
+PATH_HEADER = struct.Struct('<cHI') # msg type, number of tiles, action seq (0 for none)
+
+TILE_DTYPE = np.dtype([('x', '<u2'), ('y', '<u2'), ('army', '<i4'), ('owner', 'u1'), ('type', 'i1')])
+PATH_DTYPE = np.dtype([('x', '<u2'), ('y', '<u2')])
+
+class BinaryProtocol:
+    """
+    version 2 of the wire format. messages have the same types and content keys as the text
+    protocol, but are packed with struct and TILE_DTYPE and framed by FRAME_HEADER
+    """
+    @staticmethod
+    def parse_payload(payload):
+        """
+        parses the payload of a binary frame (any buffer, usually a memoryview) into the same
+        (msg_type, content) pair Protocol.get_message returns for text messages. the tiles of map
+        messages are a TILE_DTYPE array that shares memory with the payload.
+        raises ValueError if the payload is too short for its message
+        """
+        if len(payload) == 0:
+            raise ValueError("empty binary message")
+        msg_type = chr(payload[0])
+
+        if msg_type == 'M' or msg_type == 'D':
+            BinaryProtocol._check_size(payload, MAP_HEADER.size)
+            _, id, seq, ack, count, rows, cols = MAP_HEADER.unpack_from(payload)
+            BinaryProtocol._check_size(payload, MAP_HEADER.size + count * TILE_DTYPE.itemsize)
+            tiles = np.frombuffer(payload, dtype=TILE_DTYPE, count=count, offset=MAP_HEADER.size)
+            return msg_type, {'id': id, 'seq': seq, 'ack': ack, 'dims': (rows, cols), 'tiles': tiles}
+
+        if msg_type == 'P' or msg_type == 'G':
+            BinaryProtocol._check_size(payload, ACTION.size)
+            _, from_x, from_y, to_x, to_y, seq = ACTION.unpack_from(payload)
+            content = {'coordinates': (from_x, from_y, to_x, to_y)}
+            if seq:
+                content['seq'] = seq
+            return msg_type, content
+
+        if msg_type == 'Q':
+            BinaryProtocol._check_size(payload, PATH_HEADER.size)
+            _, count, seq = PATH_HEADER.unpack_from(payload)
+            BinaryProtocol._check_size(payload, PATH_HEADER.size + count * PATH_DTYPE.itemsize)
+            path = np.frombuffer(payload, dtype=PATH_DTYPE, count=count, offset=PATH_HEADER.size)
+            content = {'path': path}
+            if seq:
+                content['seq'] = seq
+            return msg_type, content
+
+        if msg_type == 'R':
+            return msg_type, {}
+
+        raise ValueError(f"unknown binary message type {msg_type!r}")
+
+    @staticmethod
+    def _check_size(payload, size):
+        if len(payload) < size:
+            raise ValueError(f"binary message of {len(payload)} bytes, {size} expected")
+
+    @staticmethod
+    def create_map_msg(id, seq, view, ack=None):
+        return BinaryProtocol._create_tiles_msg('M', id, seq, ack, view, *np.indices(view[0].shape))
+
+    @staticmethod
+    def create_delta_msg(id, seq, view, changed, ack=None):
+        return BinaryProtocol._create_tiles_msg('D', id, seq, ack, view, *np.nonzero(changed))
+
+    @staticmethod
+    def _create_tiles_msg(msg_type, id, seq, ack, view, ys, xs):
+        types, owners, armies = view
+        ys = ys.ravel()
+        xs = xs.ravel()
+        count = len(xs)
+
+        # pack the headers and the tiles straight into the frame buffer
+        frame = bytearray(FRAME_HEADER.size + MAP_HEADER.size + count * TILE_DTYPE.itemsize)
+        FRAME_HEADER.pack_into(frame, 0, BINARY_MAGIC, len(frame) - FRAME_HEADER.size)
+        MAP_HEADER.pack_into(frame, FRAME_HEADER.size, msg_type.encode(), id, seq, ack or 0, count, *types.shape)
+
+        tiles = np.frombuffer(frame, dtype=TILE_DTYPE, count=count, offset=FRAME_HEADER.size + MAP_HEADER.size)
+        tiles['x'] = xs
+        tiles['y'] = ys
+        tiles['army'] = armies[ys, xs]
+        tiles['owner'] = owners[ys, xs]
+        tiles['type'] = types[ys, xs]
+
+        return bytes(frame)
+
+    @staticmethod
+    def create_action_msg(from_x, from_y, to_x, to_y, seq=None, msg_type='P'):
+        frame = bytearray(FRAME_HEADER.size + ACTION.size)
+        FRAME_HEADER.pack_into(frame, 0, BINARY_MAGIC, ACTION.size)
+        ACTION.pack_into(frame, FRAME_HEADER.size, msg_type.encode(), from_x, from_y, to_x, to_y, seq or 0)
+        return bytes(frame)
+
+    @staticmethod
+    def create_go_msg(from_x, from_y, to_x, to_y, seq=None):
+        return BinaryProtocol.create_action_msg(from_x, from_y, to_x, to_y, seq, 'G')
+
+    @staticmethod
+    def create_path_msg(path, seq=None):
+        frame = bytearray(FRAME_HEADER.size + PATH_HEADER.size + len(path) * PATH_DTYPE.itemsize)
+        FRAME_HEADER.pack_into(frame, 0, BINARY_MAGIC, len(frame) - FRAME_HEADER.size)
+        PATH_HEADER.pack_into(frame, FRAME_HEADER.size, b'Q', len(path), seq or 0)
+
+        tiles = np.frombuffer(frame, dtype=PATH_DTYPE, count=len(path), offset=FRAME_HEADER.size + PATH_HEADER.size)
+        tiles['x'] = [x for x, y in path]
+        tiles['y'] = [y for x, y in path]
+        return bytes(frame)
+
+    @staticmethod
+    def create_resync_msg():
+        return FRAME_HEADER.pack(BINARY_MAGIC, 1) + b'R'
+
+    @staticmethod
+    def check_tile_types(tiles):
+        if np.any((tiles['type'] < 0) | (tiles['type'] >= len(TILE_TYPES))):
+            raise Exception("type not in tiletypes.")
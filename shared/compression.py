@@ -0,0 +1,43 @@
+import time
+import zlib
+
+from shared.binary_protocol import FRAME_HEADER
+from constants.protocol import *
+
+class StreamCompressor:
+    """
+    compresses the frames sent on one connection as a single zlib stream, so the parts of a map message
+    that the messages before it already had - which is most of it - cost a few bytes. every frame of
+    (threshold) bytes or more is wrapped whole in a compressed frame that the receiving FrameDecoder
+    inflates on the stream of its own, smaller ones are sent as they are.
+    the frames have to be compressed in the order they are sent and none of them may be dropped after
+    """
+    def __init__(self, threshold=COMPRESSION_THRESHOLD, level=COMPRESSION_LEVEL, clock=time.perf_counter):
+        self.compressor = zlib.compressobj(level)
+        self.threshold = threshold
+        self.clock = clock
+        self.raw_bytes = 0 # bytes of the frames compressed so far
+        self.compressed_bytes = 0 # bytes they were compressed to, with the headers
+        self.seconds = 0.0 # time spent compressing
+        self.reported = (0, 0, 0.0) # the totals at the last take_stats()
+
+    def compress(self, frame):
+        if len(frame) < self.threshold:
+            return frame
+
+        start = self.clock()
+        payload = self.compressor.compress(frame) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+        compressed = FRAME_HEADER.pack(COMPRESSED_MAGIC, len(payload)) + payload
+        self.seconds += self.clock() - start
+        self.raw_bytes += len(frame)
+        self.compressed_bytes += len(compressed)
+        return compressed
+
+    def take_stats(self):
+        """
+        returns the (raw bytes, compressed bytes, seconds) of the frames compressed since the last call
+        """
+        totals = (self.raw_bytes, self.compressed_bytes, self.seconds)
+        stats = tuple(total - reported for total, reported in zip(totals, self.reported))
+        self.reported = totals
+        return stats
@@ -0,0 +1,88 @@
+import numpy as np
+
+from shared.map import *
+from shared.pathfinding import PathFinder
+from constants.map import *
+from constants.server import TURNS_TO_RESET
+
+class Engine:
+    """
+    the game rules without sockets or pygame: step(actions) applies the moves of one tick and the
+    army growth that follows them, the same way the server does every tick
+    """
+    def __init__(self, map, num_players):
+        self.map = map
+        self.num_players = num_players
+        self.paths = PathFinder(map)
+        self.tick = 0
+        self.gen_counter = 0
+
+    @staticmethod
+    def new_game(num_players, king_multiplier=KING_MULTIPLIER, mountain_chance=MOUNTAIN_CHANCE,
+                 city_chance=CITY_CHANCE, rows=ROWS, cols=COLS, seed=None):
+        map = Map(rows, cols)
+        map.generate_new(num_players, king_multiplier, mountain_chance, city_chance, seed)
+        return Engine(map, num_players)
+
+    def check_action(self, id, from_x, from_y, to_x, to_y):
+        """
+        a move is valid between two edge adjacent tiles of the map, from a tile player (id) owns
+        """
+        if not (self.map.tile_exists(from_x, from_y) and self.map.tile_exists(to_x, to_y)):
+            return False
+        if abs(from_x - to_x) + abs(from_y - to_y) != 1:
+            return False
+        return int(self.map.owners[from_y, from_x]) == id
+
+    def apply_action(self, id, from_x, from_y, to_x, to_y):
+        if self.check_action(id, from_x, from_y, to_x, to_y):
+            self.map.interaction(from_x, from_y, to_x, to_y, id)
+
+    def step(self, actions=()):
+        """
+        applies (actions), (id, from_x, from_y, to_x, to_y) tuples, in order, then grows the armies.
+        returns the state after the tick
+        """
+        self.apply_actions(actions)
+        self.grow()
+        return self.state()
+
+    def apply_actions(self, actions):
+        for action in actions:
+            self.apply_action(*action)
+
+    def grow(self):
+        """
+        the army growth at the end of a tick
+        """
+        self.map.grow_armies(self.gen_counter >= TURNS_TO_RESET)
+
+        if self.gen_counter >= TURNS_TO_RESET:
+            self.gen_counter = 0
+        else:
+            self.gen_counter += 1
+        self.tick += 1
+
+    def alive_players(self):
+        """
+        ids of the players that still have their king
+        """
+        kings = self.map.owners[self.map.types == KING_CODE]
+        return sorted(int(id) for id in np.unique(kings) if id > 0)
+
+    def winner(self):
+        alive = self.alive_players()
+        if len(alive) == 1:
+            return alive[0]
+        return None
+
+    def view(self, id):
+        return self.map.player_view(id)
+
+    def state(self):
+        alive = self.alive_players()
+        return {
+            'tick': self.tick,
+            'alive': alive,
+            'winner': alive[0] if len(alive) == 1 else None,
+        }
@@ -0,0 +1,175 @@
+import struct
+import zlib
+
+from shared.protocol import Protocol
+from shared.binary_protocol import *
+from constants.protocol import *
+
+class FrameDecoder:
+    """
+    incremental decoder for the frames of a single connection. received bytes go into one reusable
+    buffer, and every read returns all the messages completed by it - zero, one or many - while a
+    partial frame stays in the buffer until the rest of it arrives.
+    messages never point into the buffer, so they stay valid after the next read.
+    compressed frames are inflated on the zlib stream of the connection and decoded by a decoder of their own.
+    only the server compresses, so they are accepted only by decoders made with (compressed) - those of clients
+    """
+    def __init__(self, size=RECV_BUFFER_SIZE, compressed=False):
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0 # first byte not parsed yet
+        self.end = 0 # end of the received bytes
+        self.compressed = compressed # compressed frames are accepted
+        self.decompressor = None # the zlib stream of the compressed frames, from the first of them
+        self.inflated = None # decoder of the frames inside the compressed ones
+
+    def recv(self, s):
+        """
+        reads once from socket s and returns the list of completed (msg_type, content) messages.
+        raises ConnectionError if the connection was closed or reset, and ValueError on a malformed frame -
+        callers drop that connection only
+        """
+        self._make_room()
+        try:
+            count = s.recv_into(self.view[self.end:])
+        except BlockingIOError:
+            return []
+        if count == 0:
+            raise ConnectionError("connection closed")
+
+        self.end += count
+        return self.messages()
+
+    def feed(self, data):
+        """
+        adds bytes read by someone else (e.g. an asyncio stream) and returns the completed messages
+        """
+        self._make_room(len(data))
+        self.view[self.end:self.end + len(data)] = data
+        self.end += len(data)
+        return self.messages()
+
+    def messages(self):
+        messages = []
+        while True:
+            frame_messages = self._next_frame()
+            if frame_messages is None:
+                break
+            messages.extend(frame_messages)
+
+        if self.start == self.end:
+            self.start = self.end = 0
+        return messages
+
+    def pending(self):
+        """
+        returns the bytes received but not parsed into messages yet
+        """
+        return bytes(self.view[self.start:self.end])
+
+    def _next_frame(self):
+        """
+        returns the messages of the next complete frame, None if there is none yet
+        """
+        available = self.end - self.start
+        if available == 0:
+            return None
+
+        if self.buffer[self.start] in (BINARY_MAGIC, COMPRESSED_MAGIC):
+            if available < FRAME_HEADER.size:
+                return None
+            _, length = FRAME_HEADER.unpack_from(self.buffer, self.start)
+            self._check_length(length)
+            payload_start = self.start + FRAME_HEADER.size
+            if self.end - payload_start < length:
+                self._reserve(FRAME_HEADER.size + length)
+                return None
+
+            payload = bytes(self.view[payload_start:payload_start + length])
+            compressed = self.buffer[self.start] == COMPRESSED_MAGIC
+            self.start = payload_start + length
+            if compressed:
+                return self._inflate(payload)
+            try:
+                return [BinaryProtocol.parse_payload(payload)]
+            except (struct.error, IndexError) as e:
+                raise ValueError(f"malformed binary frame: {e}")
+
+        if available < LENOFLEN:
+            return None
+        lenoflen = self._read_number(self.start, LENOFLEN)
+        length_start = self.start + LENOFLEN
+        if self.end - length_start < lenoflen:
+            return None
+        length = self._read_number(length_start, lenoflen)
+        self._check_length(length)
+        msg_start = length_start + lenoflen
+        if self.end - msg_start < length:
+            self._reserve(LENOFLEN + lenoflen + length)
+            return None
+
+        msg = str(self.view[msg_start:msg_start + length], 'utf-8')
+        self.start = msg_start + length
+        return [Protocol.parse_text_msg(msg)]
+
+    def _inflate(self, payload):
+        if not self.compressed:
+            raise ValueError("compressed frame from a peer that may not send them")
+        if self.decompressor is None:
+            self.decompressor = zlib.decompressobj()
+            self.inflated = FrameDecoder()
+        try:
+            # a compressed frame holds a single frame, anything that inflates bigger is rejected
+            data = self.decompressor.decompress(payload, MAX_FRAME_SIZE + FRAME_HEADER_MAX_SIZE)
+        except zlib.error as e:
+            raise ValueError(f"malformed compressed frame: {e}")
+        if self.decompressor.unconsumed_tail:
+            raise ValueError("compressed frame inflates beyond the largest frame")
+        return self.inflated.feed(data)
+
+    @staticmethod
+    def _check_length(length):
+        # the length comes from the peer, it must not make us reserve any amount of memory
+        if length > MAX_FRAME_SIZE:
+            raise ValueError(f"frame of {length} bytes, at most {MAX_FRAME_SIZE} allowed")
+
+    def _read_number(self, start, size):
+        digits = self.view[start:start + size]
+        if not bytes(digits).isdigit():
+            raise ValueError("malformed frame header")
+        return int(bytes(digits))
+
+    def _make_room(self, size=1):
+        """
+        makes sure at least (size) free bytes follow the received data
+        """
+        if len(self.buffer) - self.end >= size:
+            return
+
+        # move the unparsed bytes to the front of the buffer
+        pending = self.end - self.start
+        if self.start > 0:
+            self.buffer[:pending] = bytes(self.view[self.start:self.end])
+            self.start = 0
+            self.end = pending
+
+        if len(self.buffer) - self.end < size:
+            self._grow(self.end + size)
+
+    def _reserve(self, frame_size):
+        """
+        makes sure a frame of (frame_size) bytes starting at self.start fits in the buffer
+        """
+        if len(self.buffer) - self.start < frame_size:
+            self._make_room(frame_size - (self.end - self.start))
+
+    def _grow(self, size):
+        new_size = len(self.buffer)
+        while new_size < size:
+            new_size *= 2
+
+        buffer = bytearray(new_size)
+        buffer[:self.end] = self.view[:self.end]
+        self.view.release()
+        self.buffer = buffer
+        self.view = memoryview(buffer)
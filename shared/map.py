@@ -1,103 +1,250 @@
 from enum import Enum
 import numpy as np
-import random
 
 from constants.colors import *
 from constants.map import *
+from shared.visibility import Visibility
+from shared.mapgen import MapGenerator
 
 class Tile:
-    def __init__(self, type, owner, army):
-        self.type = type
-        self.owner = owner
-        self.army = army
+    """
+    a view of a single tile of a Map, reading or writing its attributes reads or writes the map arrays
+    """
+    __slots__ = ('map', 'x', 'y')
+
+    def __init__(self, map, x, y):
+        self.map = map
+        self.x = x
+        self.y = y
+
+    @property
+    def type(self):
+        return TILE_TYPES[self.map.types[self.y, self.x]]
+
+    @type.setter
+    def type(self, value):
+        self.map.set_type(self.x, self.y, TYPE_CODES[value])
+
+    @property
+    def owner(self):
+        return int(self.map.owners[self.y, self.x])
+
+    @owner.setter
+    def owner(self, value):
+        self.map.set_owner(self.x, self.y, value)
+
+    @property
+    def army(self):
+        return int(self.map.armies[self.y, self.x])
+
+    @army.setter
+    def army(self, value):
+        self.map.armies[self.y, self.x] = value
+
+class TileRow:
+    def __init__(self, map, y):
+        self.map = map
+        self.y = y
+
+    def __getitem__(self, x):
+        if self.map.types[self.y, x] == NONE_CODE:
+            return None
+        return Tile(self.map, x, self.y)
+
+    def __len__(self):
+        return self.map.cols
+
+class TileGrid:
+    """
+    keeps the old map.tiles[y][x] access working on top of the map arrays
+    """
+    def __init__(self, map):
+        self.map = map
+
+    def __getitem__(self, y):
+        return TileRow(self.map, y)
+
+    def __len__(self):
+        return self.map.rows
 
 class Map:
-    def __init__(self):
-        self.tiles = [[None for _ in range(COLS)] for _ in range(ROWS)]
-
-    def generate_new(self, num_players):
-        self._place_kings(num_players)
-        self._finish_tiles()
-
-    def _place_kings(self, num_players):
-        min_distance = self._calculate_min_distance(num_players)
-        king_positions = []
-        current_owner = 1  # Start with owner 1
-
-        while len(king_positions) < num_players:
-            x, y = random.randint(0, COLS - 1), random.randint(0, ROWS - 1)
-            pos = (x, y)
-            
-            # Check if the new position meets the minimum distance requirement from all existing kings
-            if all(self._distance(pos, king_pos) > min_distance for king_pos in king_positions):
-                king_positions.append(pos)
-                self.tiles[y][x] = Tile(KING, owner=current_owner, army=1)
-                current_owner += 1  # Increment owner for the next king
-
-    def _finish_tiles(self):
-        for y in range(ROWS):
-            for x in range(COLS):
-                num = random.random()
-                
-                if self.tiles[y][x] is not None:
-                    continue
-                    
-                # currently ignoring cities
-                if num < CITY_CHANCE:
-                    self.tiles[y][x] = Tile(CITY, owner=0, army=random.randint(38, 45))
-                elif num < MOUNTAIN_CHANCE:
-                    self.tiles[y][x] = Tile(MOUNTAIN, owner=0, army=0)
-                else:
-                    self.tiles[y][x] = Tile(ARMY, owner=0, army=1)
+    def __init__(self, rows=ROWS, cols=COLS):
+        self.rows = rows
+        self.cols = cols
+        self.types = np.full((rows, cols), NONE_CODE, dtype=np.int8)
+        self.owners = np.zeros((rows, cols), dtype=np.int8)
+        self.armies = np.zeros((rows, cols), dtype=np.int32)
+        self.tiles = TileGrid(self)
+        self.visibility = Visibility(self)
+        self.terrain_version = 0 # changes whenever a tile becomes or stops being a mountain
+        self.seq = None # sequence number of the last map message applied to this map (client side)
+        self.ack = None # sequence number of our last action the server had processed for that message (client side)
+
+    def generate_new(self, num_players, king_multiplier=KING_MULTIPLIER, mountain_chance=MOUNTAIN_CHANCE,
+                     city_chance=CITY_CHANCE, seed=None):
+        """
+        replaces the map with a new game, see shared.mapgen. the same seed always gives the same map
+        """
+        MapGenerator(seed).generate(self, num_players, king_multiplier, mountain_chance, city_chance)
+        self.visibility.rebuild()
+        self.terrain_version += 1
+
+    def set_tile(self, x, y, type_code, owner, army):
+        self.set_type(x, y, type_code)
+        self.set_owner(x, y, owner)
+        self.armies[y, x] = army
+
+    def set_tiles(self, xs, ys, type_codes, owners, armies):
+        """
+        sets many tiles at once, the arguments are equal length sequences
+        """
+        xs = np.asarray(xs, dtype=np.intp)
+        ys = np.asarray(ys, dtype=np.intp)
+        owners = np.asarray(owners)
+        old_owners = self.owners[ys, xs]
+        old_mountains = self.types[ys, xs] == MOUNTAIN_CODE
+
+        self.types[ys, xs] = type_codes
+        if np.any(old_mountains != (self.types[ys, xs] == MOUNTAIN_CODE)):
+            self.terrain_version += 1
+        self.owners[ys, xs] = owners
+        self.armies[ys, xs] = armies
+
+        changed = np.flatnonzero(old_owners != owners)
+        if len(changed) > self.rows * self.cols // 16:
+            self.visibility.rebuild()
+        else:
+            for i in changed.tolist():
+                self.visibility.owner_changed(int(xs[i]), int(ys[i]), int(old_owners[i]), int(owners[i]))
+
+    def set_type(self, x, y, type_code):
+        if (self.types[y, x] == MOUNTAIN_CODE) != (type_code == MOUNTAIN_CODE):
+            self.terrain_version += 1
+        self.types[y, x] = type_code
+
+    def set_owner(self, x, y, owner):
+        old_owner = int(self.owners[y, x])
+        if old_owner != owner:
+            self.owners[y, x] = owner
+            self.visibility.owner_changed(x, y, old_owner, owner)
+
+    def resize(self, rows, cols):
+        """
+        replaces the map with an empty one of another size
+        """
+        self.rows = rows
+        self.cols = cols
+        self.types = np.full((rows, cols), NONE_CODE, dtype=np.int8)
+        self.owners = np.zeros((rows, cols), dtype=np.int8)
+        self.armies = np.zeros((rows, cols), dtype=np.int32)
+        self.visibility = Visibility(self)
+        self.terrain_version += 1
+        self.seq = None
+
+    def copy(self):
+        """
+        returns an independent copy of the map, visibility included
+        """
+        map = Map(self.rows, self.cols)
+        map.types[:] = self.types
+        map.owners[:] = self.owners
+        map.armies[:] = self.armies
+        map.visibility.counts[:] = self.visibility.counts
+        map.visibility.masks[:] = self.visibility.masks
+        map.terrain_version = self.terrain_version
+        map.seq = self.seq
+        map.ack = self.ack
+        return map
+
+    def is_loaded(self):
+        return not np.any(self.types == NONE_CODE)
 
     def print_tiles(self):
-        for y in range(ROWS):
+        for y in range(self.rows):
             print(f"{y}: ".ljust(4), end='')
-            for x in range(COLS):
-                print(str(self.tiles[y][x].army).ljust(3), end=' ')
-            print()        
+            for x in range(self.cols):
+                print(str(self.armies[y, x]).ljust(3), end=' ')
+            print()
 
     def interaction(self, from_x, from_y, to_x, to_y, id):
-        from_tile = self.tiles[from_y][from_x]
-        to_tile = self.tiles[to_y][to_x]
+        owners = self.owners
+        armies = self.armies
 
         #if to_tile.army < 1 or from_tile.owner != id:
-        if from_tile.owner != id: # the army thing will be added later
+        if owners[from_y, from_x] != id: # the army thing will be added later
             return
-        
+
+        from_army = int(armies[from_y, from_x])
+        to_army = int(armies[to_y, to_x])
+        to_owner = int(owners[to_y, to_x])
+
         # if interaction is between 2 tiles of the same player
-        if from_tile.owner == to_tile.owner:
-            to_tile.army += from_tile.army - 1
-            from_tile.army = 1
+        if to_owner == id:
+            armies[to_y, to_x] = to_army + from_army - 1
+            armies[from_y, from_x] = 1
             return
-        
-        
+
         # if interaction is between 2 tiles of different players
-        if to_tile.army >= from_tile.army: # if from_tile army smaller (cant transfer ownership)
-            to_tile.army = to_tile.army - from_tile.army + 1
-            from_tile.army = 1
+        if to_army >= from_army: # if from_tile army smaller (cant transfer ownership)
+            armies[to_y, to_x] = max(to_army - from_army + 1, 1)
         else: # if from_tile army bigger (can transfer ownership)
-            to_tile.army = from_tile.army - to_tile.army
-            from_tile.army = 1
+            armies[to_y, to_x] = from_army - to_army
             # if captured a king
-            if to_tile.type == KING:
-                self._convert_all_tiles(to_tile.owner, from_tile.owner)
+            if self.types[to_y, to_x] == KING_CODE:
+                self._convert_all_tiles(to_owner, id)
             else:
-                to_tile.owner = from_tile.owner
+                self.set_owner(to_x, to_y, id)
+
+        armies[from_y, from_x] = 1
 
-        if to_tile.army < 1:
-            to_tile.army = 1
-        if from_tile.army < 1:
-            from_tile.army = 1
-    
     def _convert_all_tiles(self, from_id, to_id):
-        for y in range(ROWS):
-            for x in range(COLS):
-                tile = self.tiles[y][x]
-                if tile.owner == from_id:
-                    tile.owner = to_id
-                    if tile.type == KING:
-                        tile.type = CITY
+        converted = self.owners == from_id
+        self.types[converted & (self.types == KING_CODE)] = CITY_CODE
+        self.owners[converted] = to_id
+        self.visibility.rebuild((from_id, to_id))
+
+    def grow_armies(self, grow_land):
+        """
+        adds 1 army to every king and owned city, and to every owned army tile if grow_land is set
+        """
+        owned = self.owners > 0
+        growing = (self.types == KING_CODE) | ((self.types == CITY_CODE) & owned)
+        if grow_land:
+            growing |= (self.types == ARMY_CODE) & owned
+        self.armies += growing
+
+    def kings(self):
+        return [(int(x), int(y)) for y, x in np.argwhere(self.types == KING_CODE)]
+
+    def visible_mask(self, id):
+        """
+        returns a boolean array of the tiles player (id) can see - its own tiles and every tile adjacent
+        to them, diagonals included. id 0 sees every tile. the array is kept up to date by the map, do not
+        modify it
+        """
+        return self.visibility.mask(id)
+
+    def player_view(self, id):
+        """
+        returns copies of the (types, owners, armies) arrays as player (id) sees them: hidden mountains
+        and cities look like obstacles, hidden armies and kings look like empty land
+        """
+        visible = self.visible_mask(id)
+        types = self.types.copy()
+        owners = self.owners.copy()
+        armies = self.armies.copy()
+
+        hidden = ~visible
+        obstacles = hidden & ((types == MOUNTAIN_CODE) | (types == CITY_CODE))
+        land = hidden & ~obstacles
+
+        types[obstacles] = MOUNTAIN_CODE
+        armies[obstacles] = 0
+        types[land] = ARMY_CODE
+        armies[land] = 1
+        owners[hidden] = 0
+
+        return types, owners, armies
 
     def check_near_tile(self, x, y, id):
         """
@@ -105,33 +252,12 @@ class Map:
         this function will check for this tile if it has any adjacent tiles that their id
         is equal to the current player id (id)
         """
-        # Check horizontal and vertical adjacents
-        if (0 <= x+1 < COLS and self.tiles[y][x+1].owner == id) or \
-        (0 <= x-1 < COLS and self.tiles[y][x-1].owner == id) or \
-        (0 <= y+1 < ROWS and self.tiles[y+1][x].owner == id) or \
-        (0 <= y-1 < ROWS and self.tiles[y-1][x].owner == id):
-            return True
-
-        # Check diagonal adjacents
-        if (0 <= x+1 < COLS and 0 <= y+1 < ROWS and self.tiles[y+1][x+1].owner == id) or \
-        (0 <= x-1 < COLS and 0 <= y+1 < ROWS and self.tiles[y+1][x-1].owner == id) or \
-        (0 <= x+1 < COLS and 0 <= y-1 < ROWS and self.tiles[y-1][x+1].owner == id) or \
-        (0 <= x-1 < COLS and 0 <= y-1 < ROWS and self.tiles[y-1][x-1].owner == id):
-            return True
-
-        return False
+        # the visibility counts hold the owned tiles in the 3x3 square around (x, y), without the tile itself
+        if not 0 < id <= self.visibility.max_players:
+            return False
+        return int(self.visibility.counts[id, y + 1, x + 1]) - int(self.owners[y, x] == id) > 0
 
-    def tile_exists(x, y):
-        if y < 0 or y >= ROWS or x < 0 or x >= COLS:
+    def tile_exists(self, x, y):
+        if y < 0 or y >= self.rows or x < 0 or x >= self.cols:
             return False
         return True
-
-
-    def _calculate_min_distance(self, num_players):
-        base_distance = KING_MULTIPLIER * np.floor(np.sqrt(ROWS**2 + COLS**2))
-        scaling_factor = (10 - num_players) / 8  # Scaling factor decreases as num_players increases
-        return base_distance * scaling_factor / 2 # division by 2 for radius and not diameter
-
-    def _distance(self, pos1, pos2):
-        return np.sqrt((pos1[0] - pos2[0]) ** 2 + (pos1[1] - pos2[1]) ** 2)
-    
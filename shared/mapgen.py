@@ -0,0 +1,107 @@
+import numpy as np
+
+from shared.pathfinding import PathFinder
+from constants.map import *
+
+class MapGenerator:
+    """
+    fills a Map with a new game. the kings are spread with a grid of the distance of every tile to the
+    nearest king placed so far, so each king is drawn among the tiles far enough from the others in one
+    step instead of by rejection sampling. the terrain is rolled for all tiles at once, then a flood fill
+    from the first king checks that every king can reach the others: the terrain is rerolled a few times
+    if not, and mountains are dug through after that, so generation always ends.
+    tiles no king can reach become mountains. all the randomness comes from one seeded numpy Generator,
+    so the same seed always gives the same map
+    """
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+
+    def generate(self, map, num_players, king_multiplier=KING_MULTIPLIER, mountain_chance=MOUNTAIN_CHANCE,
+                 city_chance=CITY_CHANCE):
+        kings = self.place_kings(map.rows, map.cols, num_players,
+                                 self.min_distance(map.rows, map.cols, num_players, king_multiplier))
+
+        for _ in range(TERRAIN_ATTEMPTS):
+            self.roll_terrain(map, kings, mountain_chance, city_chance)
+            reachable = self.reachable(map, kings[0])
+            if all(reachable[y, x] for x, y in kings):
+                break
+        else:
+            for x, y in kings[1:]:
+                if not reachable[y, x]:
+                    self.dig(map, (x, y), kings[0])
+            reachable = self.reachable(map, kings[0])
+
+        pockets = ~reachable & (map.types != MOUNTAIN_CODE)
+        map.types[pockets] = MOUNTAIN_CODE
+        map.armies[pockets] = 0
+        return kings
+
+    @staticmethod
+    def min_distance(rows, cols, num_players, king_multiplier=KING_MULTIPLIER):
+        base_distance = king_multiplier * np.floor(np.sqrt(rows**2 + cols**2))
+        scaling_factor = (10 - num_players) / 8  # Scaling factor decreases as num_players increases
+        return base_distance * scaling_factor / 2 # division by 2 for radius and not diameter
+
+    def place_kings(self, rows, cols, num_players, min_distance):
+        """
+        returns the (x, y) of every king, more than min_distance apart. if the map is too small for that,
+        the remaining kings go to the tiles farthest from the others
+        """
+        ys, xs = np.indices((rows, cols))
+        nearest = np.full((rows, cols), np.inf) # distance of every tile to the nearest king
+        kings = []
+
+        for _ in range(num_players):
+            far = np.flatnonzero(nearest.ravel() > min_distance)
+            if len(far) > 0:
+                index = int(self.rng.choice(far))
+            else:
+                index = int(np.argmax(nearest))
+            y, x = divmod(index, cols)
+            kings.append((x, y))
+            nearest = np.minimum(nearest, np.hypot(xs - x, ys - y))
+
+        return kings
+
+    def roll_terrain(self, map, kings, mountain_chance=MOUNTAIN_CHANCE, city_chance=CITY_CHANCE):
+        nums = self.rng.random((map.rows, map.cols))
+        cities = nums < city_chance
+        mountains = ~cities & (nums < mountain_chance)
+
+        map.types.fill(ARMY_CODE)
+        map.owners.fill(0)
+        map.armies.fill(1)
+        map.types[cities] = CITY_CODE
+        map.armies[cities] = self.rng.integers(38, 46, size=np.count_nonzero(cities))
+        map.types[mountains] = MOUNTAIN_CODE
+        map.armies[mountains] = 0
+
+        for id, (x, y) in enumerate(kings, 1):
+            map.types[y, x] = KING_CODE
+            map.owners[y, x] = id
+            map.armies[y, x] = 1
+
+    def reachable(self, map, start):
+        """
+        boolean mask of the tiles connected to (start) without crossing mountains
+        """
+        return PathFinder(map, cache_size=1).distance_field(*start) >= 0
+
+    def dig(self, map, start, end):
+        """
+        turns the mountains on an L shaped path between two tiles into empty land
+        """
+        (x, y), (end_x, end_y) = start, end
+        path = [(x, y)]
+        while x != end_x:
+            x += 1 if end_x > x else -1
+            path.append((x, y))
+        while y != end_y:
+            y += 1 if end_y > y else -1
+            path.append((x, y))
+
+        for x, y in path:
+            if map.types[y, x] == MOUNTAIN_CODE:
+                map.types[y, x] = ARMY_CODE
+                map.armies[y, x] = 1
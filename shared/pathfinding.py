@@ -0,0 +1,142 @@
+from collections import OrderedDict, deque
+import numpy as np
+
+from constants.map import *
+
+class PathFinder:
+    """
+    shortest paths over the tiles of a map, mountains are the only obstacles. a breadth first search
+    from a target tile gives the distance of every tile to it (a distance field), after which the path
+    from any tile to that target is found by walking downhill, in O(path length).
+    fields are cached per target - those of the kings, then the cities, are computed ahead a few per
+    tick by warm_up() and are never evicted - and are all dropped only when map.terrain_version says a
+    tile became or stopped being a mountain, after which those of the kings and cities are queued again
+    """
+    def __init__(self, map, cache_size=PATH_CACHE_SIZE, pinned_size=PATH_PINNED_FIELDS):
+        self.map = map
+        self.cache_size = cache_size
+        self.pinned_size = min(pinned_size, cache_size - 1) # at least one field is left for other targets
+        self.pinned = [] # (x, y) of the kings and cities, whose fields are not evicted
+        self.fields = OrderedDict() # (x, y) of the target -> distance field, least recently used first
+        self.terrain_version = None
+        self.passable = None
+        self.searches = 0 # distance fields computed so far
+        self.pending = deque() # (x, y) of the targets warm_up() computes the fields of next
+
+    def precompute(self):
+        """
+        queues the distance fields of the kings, then of the cities, up to pinned_size of them, for
+        warm_up(). a field takes tens of milliseconds on big maps, so they are not all computed at once
+        """
+        targets = np.argwhere(self.map.types == KING_CODE).tolist() + np.argwhere(self.map.types == CITY_CODE).tolist()
+        self.pinned = [(x, y) for y, x in targets[:self.pinned_size]]
+        self.pending = deque(self.pinned)
+
+    def warm_up(self, count=PATH_WARM_UP_PER_TICK):
+        """
+        computes up to (count) of the queued fields that are not cached yet
+        """
+        self._check_terrain()
+        while count > 0 and self.pending:
+            target = self.pending.popleft()
+            if target not in self.fields:
+                self.distance_field(*target)
+                count -= 1
+
+    def find_path(self, from_x, from_y, to_x, to_y):
+        """
+        returns a shortest path from one tile to another as a list of (x, y) tiles, both ends included,
+        or None if there is none
+        """
+        if not (self.map.tile_exists(from_x, from_y) and self.map.tile_exists(to_x, to_y)):
+            return None
+        field = self.distance_field(to_x, to_y)
+        distance = int(field[from_y, from_x])
+        if distance < 0:
+            return None
+
+        rows, cols = self.map.rows, self.map.cols
+        path = [(from_x, from_y)]
+        x, y = from_x, from_y
+        while distance > 0:
+            for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+                next_x, next_y = x + dx, y + dy
+                if 0 <= next_x < cols and 0 <= next_y < rows and field[next_y, next_x] == distance - 1:
+                    break
+            x, y = next_x, next_y
+            distance -= 1
+            path.append((x, y))
+        return path
+
+    def is_cached(self, x, y):
+        """
+        True if the distance field of (x, y) is ready, so paths to it cost no search
+        """
+        self._check_terrain()
+        return (x, y) in self.fields
+
+    def distance(self, from_x, from_y, to_x, to_y):
+        """
+        length of the shortest path, -1 if there is none
+        """
+        return int(self.distance_field(to_x, to_y)[from_y, from_x])
+
+    def distance_field(self, x, y):
+        """
+        (rows, cols) int32 array of the number of moves from every tile to (x, y), -1 where unreachable
+        """
+        self._check_terrain()
+        field = self.fields.get((x, y))
+        if field is not None:
+            self.fields.move_to_end((x, y))
+            return field
+
+        field = self._search(x, y)
+        self.fields[(x, y)] = field
+        if len(self.fields) > self.cache_size:
+            # the least recently used field that is not of a king or city
+            pinned = set(self.pinned)
+            for target in self.fields:
+                if target not in pinned:
+                    del self.fields[target]
+                    break
+        return field
+
+    def _check_terrain(self):
+        if self.terrain_version != self.map.terrain_version:
+            self.fields.clear()
+            self.pending = deque(self.pinned)
+            self.passable = (self.map.types != MOUNTAIN_CODE).ravel().tolist()
+            self.terrain_version = self.map.terrain_version
+
+    def _search(self, x, y):
+        self.searches += 1
+        rows, cols = self.map.rows, self.map.cols
+        passable = self.passable
+        distances = [-1] * (rows * cols)
+
+        start = y * cols + x
+        if passable[start]:
+            distances[start] = 0
+            queue = deque([start])
+            while queue:
+                index = queue.popleft()
+                distance = distances[index] + 1
+                tile_x = index % cols
+
+                neighbors = []
+                if tile_x > 0:
+                    neighbors.append(index - 1)
+                if tile_x < cols - 1:
+                    neighbors.append(index + 1)
+                if index >= cols:
+                    neighbors.append(index - cols)
+                if index < (rows - 1) * cols:
+                    neighbors.append(index + cols)
+
+                for neighbor in neighbors:
+                    if distances[neighbor] < 0 and passable[neighbor]:
+                        distances[neighbor] = distance
+                        queue.append(neighbor)
+
+        return np.array(distances, dtype=np.int32).reshape(rows, cols)
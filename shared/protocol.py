@@ -1,70 +1,189 @@
 from enum import Enum
+import numpy as np
 
 from constants.protocol import *
-from constants.map import ROWS, COLS, TILE_TYPES
+from constants.map import ROWS, COLS, MAX_MAP_SIZE, TILE_TYPES, TYPE_CODES
 from shared.map import *
+from shared.binary_protocol import *
 
 class Protocol:
     @staticmethod
     def get_message(s):
+        """
+        blocking read of a single message from socket s. connections that exchange many messages
+        should keep a shared.framing.FrameDecoder instead, which buffers and drains bursts
+        """
         try:
-            lenoflen = s.recv(LENOFLEN)
-            length = s.recv(int(lenoflen))
-            msg = s.recv(int(length))
-            msg = msg.decode('utf-8')
+            first = Protocol._recv_exactly(s, 1)
+            if first[0] == BINARY_MAGIC:
+                header = first + Protocol._recv_exactly(s, FRAME_HEADER.size - 1)
+                _, length = FRAME_HEADER.unpack(header)
+                payload = Protocol._recv_exactly(s, length)
+                return BinaryProtocol.parse_payload(memoryview(payload))
 
-            lines = msg.split(SEP)
-            msg_type = lines[0]
-            lines = lines[1:]
-            content = {}
-
-            for line in lines:
-                key, value = line.split(":")
-                content[key] = value
-
-            return msg_type, content
+            lenoflen = first + Protocol._recv_exactly(s, LENOFLEN - 1)
+            length = Protocol._recv_exactly(s, int(lenoflen))
+            msg = Protocol._recv_exactly(s, int(length))
+            return Protocol.parse_text_msg(msg.decode('utf-8'))
 
         except Exception as e:
             print(f"Error in get_message: {e}")
-            return ""
-    
+            return None, None
+
+    @staticmethod
+    def _recv_exactly(s, size):
+        data = bytearray(size)
+        view = memoryview(data)
+        received = 0
+        while received < size:
+            count = s.recv_into(view[received:])
+            if count == 0:
+                raise ConnectionError("connection closed")
+            received += count
+        return data
+
+    @staticmethod
+    def parse_text_msg(msg):
+        lines = msg.split(SEP)
+        msg_type = lines[0]
+        lines = lines[1:]
+        content = {}
+
+        for line in lines:
+            key, value = line.split(":")
+            content[key] = value
+
+        return msg_type, content
+
     @staticmethod
     def handle_msg(msg_type: str, content: dict, map, idlist=None, client_sockets: list=None, s=None):
         msg_type = msg_type.upper()
-        if msg_type == 'M':
+        if msg_type == 'M' or msg_type == 'D':
             idlist.append(int(content['id'])) # use later, probably for colors in game.py
-            tiles = content['tiles']
+            seq = int(content['seq']) if 'seq' in content else None
 
-            tiles = tiles.split('&')
+            # a delta only applies on top of the message right before it, otherwise wait for a keyframe
+            if msg_type == 'D' and (seq is None or map.seq is None or seq != map.seq + 1):
+                map.seq = None
+                return
 
-            for tile in tiles:
-                x = int(tile[0:2])
-                y = int(tile[2:4])
-                army = int(tile[4:9])
-                owner = int(tile[9:10])
-                tile_type = tile[10:11]
+            # keyframes carry the size of the map, the game may use another size than the last one
+            if msg_type == 'M' and 'dims' in content:
+                rows, cols = Protocol.parse_dims(content['dims'])
+                if (rows, cols) != (map.rows, map.cols):
+                    map.resize(rows, cols)
 
-                if tile_type not in TILE_TYPES:
-                    raise Exception("type not in tiletypes.")
-
-                if map.tiles[y][x] is None:
-                    map.tiles[y][x] = Tile(None, None, None)
-
-                map.tiles[y][x].army = army
-                map.tiles[y][x].owner = owner
-                map.tiles[y][x].type = tile_type
+            Protocol._apply_tiles(content['tiles'], map)
+            map.seq = seq
+            map.ack = int(content['ack']) if 'ack' in content else None
 
         elif msg_type == 'P':
-            coordinates = content['coordinates']
-            coordinates = coordinates.split('&')
-            from_x = int(coordinates[0])
-            from_y = int(coordinates[1])
-            to_x = int(coordinates[2])
-            to_y = int(coordinates[3])
+            from_x, from_y, to_x, to_y = Protocol.parse_action(content)
 
-            if int(map.tiles[from_y][from_x].owner) == int(client_sockets.index(s)+1):
+            if int(map.owners[from_y, from_x]) == int(client_sockets.index(s)+1):
                 map.interaction(from_x, from_y, to_x, to_y, int(client_sockets.index(s)+1))
     
+    @staticmethod
+    def parse_action(content):
+        """
+        returns the (from_x, from_y, to_x, to_y) of an action message, raises ValueError if it has none
+        """
+        coordinates = content.get('coordinates')
+        if coordinates is None:
+            raise ValueError("action message without coordinates")
+        if isinstance(coordinates, str):
+            coordinates = coordinates.split('&')
+        if len(coordinates) < 4:
+            raise ValueError("action message with less than 4 coordinates")
+        from_x = int(coordinates[0])
+        from_y = int(coordinates[1])
+        to_x = int(coordinates[2])
+        to_y = int(coordinates[3])
+        return from_x, from_y, to_x, to_y
+
+    @staticmethod
+    def parse_path(content):
+        """
+        returns the moves, (from_x, from_y, to_x, to_y) tuples, along the tiles of a path message.
+        raises ValueError if it has no path
+        """
+        path = content.get('path')
+        if path is None:
+            raise ValueError("path message without a path")
+        if isinstance(path, str):
+            numbers = [int(number) for number in path.split('&')]
+            tiles = list(zip(numbers[0::2], numbers[1::2]))
+        else:
+            tiles = list(zip(path['x'].tolist(), path['y'].tolist()))
+
+        return Protocol.path_moves(tiles)
+
+    @staticmethod
+    def path_moves(path):
+        """
+        the moves along a list of (x, y) tiles, one between every two consecutive tiles
+        """
+        return [(*path[i], *path[i + 1]) for i in range(len(path) - 1)]
+
+    @staticmethod
+    def parse_dims(dims):
+        """
+        returns the (rows, cols) of a dims field, "rows&cols" in text messages
+        """
+        if isinstance(dims, str):
+            dims = dims.split('&')
+        if len(dims) < 2:
+            raise ValueError("dims without rows and columns")
+        return int(dims[0]), int(dims[1])
+
+    @staticmethod
+    def tile_fields(rows, cols):
+        """
+        the digits of the x/y, army and owner of the text tiles of a map of this size
+        """
+        if (rows, cols) == (ROWS, COLS):
+            return NARROW_TILE_FIELDS
+        return WIDE_TILE_FIELDS
+
+    @staticmethod
+    def parse_action_seq(content):
+        """
+        returns the sequence number the client gave an action message, None if it gave none
+        """
+        if 'seq' in content:
+            return int(content['seq'])
+        return None
+
+    @staticmethod
+    def _apply_tiles(tiles, map):
+        # binary messages already hold the tiles as a TILE_DTYPE array
+        if not isinstance(tiles, str):
+            BinaryProtocol.check_tile_types(tiles)
+            map.set_tiles(tiles['x'], tiles['y'], tiles['type'], tiles['owner'], tiles['army'])
+            return
+
+        if tiles == "":
+            return
+
+        coordinate, army, owner = Protocol.tile_fields(map.rows, map.cols)
+        army_start = 2 * coordinate
+        owner_start = army_start + army
+        type_start = owner_start + owner
+
+        xs, ys, type_codes, owners, armies = [], [], [], [], []
+        for tile in tiles.split('&'):
+            tile_type = tile[type_start:type_start + 1]
+            if tile_type not in TILE_TYPES:
+                raise Exception("type not in tiletypes.")
+
+            xs.append(int(tile[0:coordinate]))
+            ys.append(int(tile[coordinate:army_start]))
+            armies.append(int(tile[army_start:owner_start]))
+            owners.append(int(tile[owner_start:type_start]))
+            type_codes.append(TYPE_CODES[tile_type])
+
+        map.set_tiles(xs, ys, type_codes, owners, armies)
+
     @staticmethod
     def complete_msg(msg):
         length = str(len(msg))
@@ -75,41 +194,71 @@ class Protocol:
         ...
 
     @staticmethod
-    def create_map_msg(map, id):
+    def create_map_msg(map, id, seq=None, view=None, ack=None):
+        """
+        full map message (keyframe) of the map as player (id) sees it. (view) is the
+        (types, owners, armies) tuple of map.player_view(id), if the caller already has it.
+        (ack) is the sequence number of the last action of the player the server has processed
+        """
+        if view is None:
+            view = map.player_view(id)
+
         msg = "M" + SEP
         msg += "id:" + str(id) + SEP
-        msg += "tiles:"
-        for y in range(ROWS):
-            for x in range(COLS):
-                tile = map.tiles[y][x]
-
-                if tile.owner == id or map.check_near_tile(x, y, id):
-                    msg += Protocol._create_tile_msg(x, y, tile.army, tile.owner, tile.type)
-                else:
-                    if tile.type == MOUNTAIN or tile.type == CITY:
-                        msg += Protocol._create_tile_msg(x, y, 0, 0, 'M')
-                    elif tile.type == ARMY or tile.type == KING:
-                        msg += Protocol._create_tile_msg(x, y, 1, 0, 'A')
-
-                msg += "&"
-        msg = msg[:-1] # remove last & from msg
+        msg += "dims:" + str(view[0].shape[0]) + '&' + str(view[0].shape[1]) + SEP
+        if seq is not None:
+            msg += "seq:" + str(seq) + SEP
+        if ack is not None:
+            msg += "ack:" + str(ack) + SEP
+        msg += "tiles:" + Protocol._create_tiles_field(view, *np.indices(view[0].shape))
         msg = Protocol.complete_msg(msg)
-        
+
         return msg
-    
+
+    @staticmethod
+    def create_delta_msg(id, seq, view, changed, ack=None):
+        """
+        map message with only the tiles of the (changed) boolean mask, applied by the client
+        on top of the message with sequence number seq - 1
+        """
+        ys, xs = np.nonzero(changed)
+
+        msg = "D" + SEP
+        msg += "id:" + str(id) + SEP
+        msg += "seq:" + str(seq) + SEP
+        if ack is not None:
+            msg += "ack:" + str(ack) + SEP
+        msg += "tiles:" + Protocol._create_tiles_field(view, ys, xs)
+        msg = Protocol.complete_msg(msg)
+
+        return msg
+
     @staticmethod
-    def _create_tile_msg(x, y, army, owner, type):
-        x = str(x).zfill(2)
-        y = str(y).zfill(2)
-        army = str(army).zfill(5)
-        owner = str(owner)
+    def _create_tiles_field(view, ys, xs):
+        fields = Protocol.tile_fields(*view[0].shape)
+        types, owners, armies = (array[ys, xs].ravel().tolist() for array in view)
+        xs = xs.ravel().tolist()
+        ys = ys.ravel().tolist()
+
+        tile_msgs = []
+        for i in range(len(xs)):
+            tile_msgs.append(Protocol._create_tile_msg(xs[i], ys[i], armies[i], owners[i], TILE_TYPES[types[i]], fields))
+        return "&".join(tile_msgs)
+
+    @staticmethod
+    def _create_tile_msg(x, y, army, owner, type, fields=NARROW_TILE_FIELDS):
+        coordinate, army_digits, owner_digits = fields
+        x = str(x).zfill(coordinate)
+        y = str(y).zfill(coordinate)
+        army = str(army).zfill(army_digits)
+        owner = str(owner).zfill(owner_digits)
 
         msg = x + y + army + owner + type
 
         return msg
 
     @staticmethod
-    def create_action_msg(from_x, from_y, to_x, to_y):
+    def create_action_msg(from_x, from_y, to_x, to_y, seq=None):
         if not Protocol._check_can_move(from_x, from_y, to_x, to_y):
             return False
         
@@ -119,17 +268,84 @@ class Protocol:
         to_y = str(to_y).zfill(2)
         msg = "P" + SEP
         msg += "coordinates:" + from_x + '&' + from_y + '&' + to_x + '&' + to_y
+        if seq is not None:
+            msg += SEP + "seq:" + str(seq)
+
+        msg = Protocol.complete_msg(msg)
+
+        return msg
+
+    @staticmethod
+    def create_go_msg(from_x, from_y, to_x, to_y, seq=None):
+        """
+        asks the server to move the army of a tile to any other tile along a shortest path
+        """
+        msg = "G" + SEP
+        msg += "coordinates:" + '&'.join(str(number).zfill(2) for number in (from_x, from_y, to_x, to_y))
+        if seq is not None:
+            msg += SEP + "seq:" + str(seq)
+
+        msg = Protocol.complete_msg(msg)
+
+        return msg
+
+    @staticmethod
+    def create_path_msg(path, seq=None):
+        """
+        queues a move along every step of (path), a list of (x, y) tiles starting at the tile to move from
+        """
+        msg = "Q" + SEP
+        msg += "path:" + '&'.join(str(x).zfill(2) + '&' + str(y).zfill(2) for x, y in path)
+        if seq is not None:
+            msg += SEP + "seq:" + str(seq)
+
+        msg = Protocol.complete_msg(msg)
+
+        return msg
+
+    @staticmethod
+    def create_hello_msg(deltas=True, version=PROTOCOL_VERSION, room=None, players=None, dims=None, spectate=None,
+                         compress=False):
+        """
+        always sent as text, the client sends the newest version it speaks and the
+        server answers with the version both sides will use from then on.
+        (room) is the room to join or create, (players) and (dims), (rows, cols), the size of a new room.
+        the map messages tell the size the game really has.
+        (spectate) makes the client a spectator of that player, or of the whole map for 0.
+        (compress) asks for compressed map messages, and the server's answer says if they will be
+        """
+        msg = "H" + SEP
+        msg += "deltas:" + str(int(deltas)) + SEP
+        msg += "version:" + str(version)
+        if room:
+            msg += SEP + "room:" + room
+        if players is not None:
+            msg += SEP + "players:" + str(players)
+        if dims is not None:
+            msg += SEP + "dims:" + str(dims[0]) + '&' + str(dims[1])
+        if spectate is not None:
+            msg += SEP + "spectate:" + str(spectate)
+        if compress:
+            msg += SEP + "compress:1"
+
+        msg = Protocol.complete_msg(msg)
+
+        return msg
+
+    @staticmethod
+    def create_resync_msg():
+        msg = "R"
 
         msg = Protocol.complete_msg(msg)
 
         return msg
 
     @staticmethod
-    def _check_can_move(from_x, from_y, to_x, to_y):
-        if (from_x < 0 or from_x >= COLS or
-            from_y < 0 or from_y >= ROWS or
-            to_x < 0 or to_x >= COLS or
-            to_y < 0 or to_y >= ROWS):
+    def _check_can_move(from_x, from_y, to_x, to_y, rows=MAX_MAP_SIZE, cols=MAX_MAP_SIZE):
+        if (from_x < 0 or from_x >= cols or
+            from_y < 0 or from_y >= rows or
+            to_x < 0 or to_x >= cols or
+            to_y < 0 or to_y >= rows):
             return False
         
         # Check edge adjacency (not diagonal)
@@ -0,0 +1,221 @@
+import bisect
+import mmap
+import os
+import re
+import struct
+import time
+import zlib
+import numpy as np
+
+from shared.map import Map
+from shared.engine import Engine
+from constants.replay import *
+
+HEADER = struct.Struct('<4sBHHBH') # magic, version, rows, cols, number of players, keyframe interval
+RECORD_HEADER = struct.Struct('<cII') # record type, tick, payload length
+KEYFRAME_HEADER = struct.Struct('<H') # army growth counter of the engine, the compressed arrays follow
+TRAILER = struct.Struct('<Q4s') # offset of the index record, INDEX_MAGIC
+
+ACTION_DTYPE = np.dtype([('id', 'u1'), ('from_x', '<u2'), ('from_y', '<u2'), ('to_x', '<u2'), ('to_y', '<u2')])
+INDEX_DTYPE = np.dtype([('tick', '<u4'), ('offset', '<u8')])
+
+# record types
+ACTIONS = b'A' # the actions applied in a tick, only written for ticks that had any
+KEYFRAME = b'K' # the full state at the start of a tick
+INDEX = b'I' # the tick and offset of every keyframe, written when the replay is closed
+
+class ReplayWriter:
+    """
+    records a game to an append-only file: a header, then the actions of every tick and, every
+    keyframe_interval ticks, the whole state of the game (zlib compressed). the engine replays the
+    actions exactly, so a reader can start from any keyframe. closing the file appends an index of the
+    keyframes, and a file that was never closed can still be read by scanning its records.
+    writes go through a large buffer, so a tick usually costs one small append in memory. the buffer is
+    flushed after every keyframe, so the file of a running game can be watched up to its last keyframe
+    """
+    def __init__(self, path, engine, keyframe_interval=REPLAY_KEYFRAME_INTERVAL):
+        self.path = path
+        self.engine = engine
+        self.keyframe_interval = keyframe_interval
+        self.file = open(path, 'wb', buffering=REPLAY_BUFFER_SIZE)
+        self.offset = 0
+        self.index = [] # (tick, offset) of every keyframe
+
+        map = engine.map
+        self._write(HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, map.rows, map.cols, engine.num_players, keyframe_interval))
+        self._write_keyframe()
+
+    def record(self, actions):
+        """
+        records the tick the engine just ran, with the (id, from_x, from_y, to_x, to_y) actions it was given
+        """
+        tick = self.engine.tick - 1
+        if actions:
+            payload = np.array([tuple(action) for action in actions], dtype=ACTION_DTYPE).tobytes()
+            self._write(RECORD_HEADER.pack(ACTIONS, tick, len(payload)), payload)
+        if self.engine.tick % self.keyframe_interval == 0:
+            self._write_keyframe()
+
+    def close(self):
+        if self.file.closed:
+            return
+        index_offset = self.offset
+        payload = np.array(self.index, dtype=INDEX_DTYPE).tobytes()
+        self._write(RECORD_HEADER.pack(INDEX, self.engine.tick, len(payload)), payload,
+                    TRAILER.pack(index_offset, INDEX_MAGIC))
+        self.file.close()
+
+    def _write_keyframe(self):
+        map = self.engine.map
+        arrays = zlib.compress(map.types.tobytes() + map.owners.tobytes() + map.armies.tobytes(),
+                               REPLAY_COMPRESSION_LEVEL)
+        self.index.append((self.engine.tick, self.offset))
+        self._write(RECORD_HEADER.pack(KEYFRAME, self.engine.tick, KEYFRAME_HEADER.size + len(arrays)),
+                    KEYFRAME_HEADER.pack(self.engine.gen_counter), arrays)
+        self.file.flush()
+
+    def _write(self, *parts):
+        for part in parts:
+            self.file.write(part)
+            self.offset += len(part)
+
+class ReplayReader:
+    """
+    plays a replay file back. the file is memory mapped, so opening it reads nothing but the index,
+    and seek(tick) decodes the nearest keyframe before (tick) and replays the actions from there -
+    never more than keyframe_interval ticks - instead of the whole game. step() then moves forward
+    one tick at a time. the game state is in self.engine, and its map in self.map
+    """
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        if os.fstat(self.file.fileno()).st_size < HEADER.size:
+            self.file.close()
+            raise ValueError(f"{path} is not a replay")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.rows, self.cols, self.num_players, self.keyframe_interval = HEADER.unpack_from(self.data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f"{path} is not a replay of version {REPLAY_VERSION}")
+
+        if not self._read_index():
+            self._scan()
+        if not self.keyframe_ticks:
+            raise ValueError(f"{path} has no keyframe")
+
+        self.engine = None
+        self.offset = None # offset of the next record to read
+        self.seek(0)
+
+    @property
+    def map(self):
+        return self.engine.map
+
+    @property
+    def tick(self):
+        return self.engine.tick
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def seek(self, tick):
+        """
+        moves to the start of (tick), clamped to the length of the game
+        """
+        tick = max(0, min(tick, self.last_tick))
+        index = bisect.bisect_right(self.keyframe_ticks, tick) - 1
+        if self.engine is None or not self.keyframe_ticks[index] <= self.engine.tick <= tick:
+            # going back, or further than the next keyframe
+            self._load_keyframe(self.keyframe_offsets[index])
+        while self.engine.tick < tick:
+            self.step()
+
+    def step(self):
+        """
+        plays the next tick. returns False at the end of the game
+        """
+        if self.engine.tick >= self.last_tick:
+            return False
+
+        actions = []
+        while self.offset < self.end:
+            record_type, tick, length = RECORD_HEADER.unpack_from(self.data, self.offset)
+            if tick > self.engine.tick:
+                break
+            if record_type == ACTIONS and tick == self.engine.tick:
+                actions = np.frombuffer(self.data, dtype=ACTION_DTYPE, count=length // ACTION_DTYPE.itemsize,
+                                        offset=self.offset + RECORD_HEADER.size).tolist()
+            # keyframes of the current tick were applied already
+            self.offset += RECORD_HEADER.size + length
+
+        self.engine.step(actions)
+        return True
+
+    def _load_keyframe(self, offset):
+        _, tick, length = RECORD_HEADER.unpack_from(self.data, offset)
+        start = offset + RECORD_HEADER.size
+        gen_counter, = KEYFRAME_HEADER.unpack_from(self.data, start)
+        arrays = zlib.decompress(self.data[start + KEYFRAME_HEADER.size:start + length])
+
+        map = Map(self.rows, self.cols)
+        size = self.rows * self.cols
+        map.types[:] = np.frombuffer(arrays, dtype=np.int8, count=size).reshape(self.rows, self.cols)
+        map.owners[:] = np.frombuffer(arrays, dtype=np.int8, count=size, offset=size).reshape(self.rows, self.cols)
+        map.armies[:] = np.frombuffer(arrays, dtype=np.int32, count=size, offset=2 * size).reshape(self.rows, self.cols)
+        map.visibility.rebuild()
+        map.terrain_version += 1
+
+        self.engine = Engine(map, self.num_players)
+        self.engine.tick = tick
+        self.engine.gen_counter = gen_counter
+        self.offset = start + length
+
+    def _read_index(self):
+        if len(self.data) < HEADER.size + RECORD_HEADER.size + TRAILER.size:
+            return False
+        index_offset, magic = TRAILER.unpack_from(self.data, len(self.data) - TRAILER.size)
+        if magic != INDEX_MAGIC:
+            return False
+
+        _, self.last_tick, length = RECORD_HEADER.unpack_from(self.data, index_offset)
+        index = np.frombuffer(self.data, dtype=INDEX_DTYPE, count=length // INDEX_DTYPE.itemsize,
+                              offset=index_offset + RECORD_HEADER.size)
+        self.keyframe_ticks = index['tick'].tolist()
+        self.keyframe_offsets = index['offset'].tolist()
+        self.end = index_offset
+        return True
+
+    def _scan(self):
+        """
+        rebuilds the index of a file that was not closed, e.g. of a game still running or of a server that
+        crashed. a record cut in the middle ends the replay
+        """
+        self.keyframe_ticks = []
+        self.keyframe_offsets = []
+        self.last_tick = 0
+        offset = HEADER.size
+        while offset + RECORD_HEADER.size <= len(self.data):
+            record_type, tick, length = RECORD_HEADER.unpack_from(self.data, offset)
+            if record_type not in (ACTIONS, KEYFRAME) or offset + RECORD_HEADER.size + length > len(self.data):
+                break
+            if record_type == KEYFRAME:
+                self.keyframe_ticks.append(tick)
+                self.keyframe_offsets.append(offset)
+                self.last_tick = max(self.last_tick, tick)
+            else:
+                self.last_tick = max(self.last_tick, tick + 1)
+            offset += RECORD_HEADER.size + length
+        self.end = offset
+
+def replay_path(directory, name):
+    """
+    a new file name in (directory) for a replay of the game (name), which may come from a client
+    """
+    name = re.sub(r'[^\w-]', '_', name) or 'game'
+    base = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}")
+    path = base + '.replay'
+    number = 1
+    while os.path.exists(path):
+        number += 1
+        path = f"{base}-{number}.replay"
+    return path
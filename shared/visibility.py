@@ -0,0 +1,55 @@
+import numpy as np
+
+from constants.map import *
+
+class Visibility:
+    """
+    keeps a boolean fog-of-war mask for every player. a tile is visible to a player if the player owns
+    a tile in the 3x3 square around it, so next to each mask we keep the count of owned tiles in that
+    square, and an owner change only touches the 3x3 square around the changed tile.
+    the arrays are padded by 1 on every side so updates near the borders need no clipping.
+    id 0 is a spectator of the whole map, its mask is always all visible
+    """
+    def __init__(self, map, max_players=MAX_PLAYERS):
+        self.map = map
+        self.max_players = max_players
+        shape = (max_players + 1, map.rows + 2, map.cols + 2)
+        self.counts = np.zeros(shape, dtype=np.int8)
+        self.masks = np.zeros(shape, dtype=bool)
+        self.masks[0] = True
+
+    def mask(self, id):
+        """
+        returns the (read only) visibility mask of player (id), in map coordinates
+        """
+        return self.masks[id, 1:-1, 1:-1]
+
+    def rebuild(self, ids=None):
+        """
+        recomputes the masks of the given players (all of them by default) from the map owners
+        """
+        if ids is None:
+            ids = range(1, self.max_players + 1)
+
+        rows, cols = self.map.rows, self.map.cols
+        for id in ids:
+            if not 0 < id <= self.max_players:
+                continue
+            owned = np.pad(self.map.owners == id, 2).astype(np.int8)
+            counts = self.counts[id]
+            counts.fill(0)
+            for dy in range(3):
+                for dx in range(3):
+                    counts += owned[dy:dy + rows + 2, dx:dx + cols + 2]
+            np.greater(counts, 0, out=self.masks[id])
+
+    def owner_changed(self, x, y, old_id, new_id):
+        if old_id == new_id:
+            return
+
+        for id, delta in ((old_id, -1), (new_id, 1)):
+            if 0 < id <= self.max_players:
+                # the 3x3 square around (x, y) starts at (x, y) in padded coordinates
+                counts = self.counts[id, y:y + 3, x:x + 3]
+                counts += delta
+                np.greater(counts, 0, out=self.masks[id, y:y + 3, x:x + 3])
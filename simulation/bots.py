@@ -0,0 +1,85 @@
+import random
+import numpy as np
+
+from constants.map import *
+
+DIRECTIONS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+class Bot:
+    """
+    base class of the bots. act is called once per tick with the (types, owners, armies) arrays of the
+    map as the bot's player sees it, and returns the moves (from_x, from_y, to_x, to_y) for this tick
+    """
+    def __init__(self, id, rng=None):
+        self.id = id
+        self.rng = rng if rng is not None else random.Random()
+
+    def act(self, view):
+        raise NotImplementedError
+
+    def _neighbors(self, types, x, y):
+        rows, cols = types.shape
+        for dx, dy in DIRECTIONS:
+            to_x, to_y = x + dx, y + dy
+            # hidden cities look like mountains too, so the bots never walk into them blindly
+            if 0 <= to_x < cols and 0 <= to_y < rows and types[to_y, to_x] != MOUNTAIN_CODE:
+                yield to_x, to_y
+
+class RandomBot(Bot):
+    """
+    moves a random army of its own to a random neighbor
+    """
+    def act(self, view):
+        types, owners, armies = view
+        movable = np.argwhere((owners == self.id) & (armies > 1))
+        if len(movable) == 0:
+            return []
+
+        y, x = (int(value) for value in movable[self.rng.randrange(len(movable))])
+        neighbors = list(self._neighbors(types, x, y))
+        if not neighbors:
+            return []
+        return [(x, y, *self.rng.choice(neighbors))]
+
+class GreedyBot(Bot):
+    """
+    makes the most valuable capture it can this tick - a king, then a city, then enemy land, then
+    neutral land. with nothing to capture it moves its biggest army to a random passable neighbor
+    """
+    CAPTURE_VALUES = {KING_CODE: 1000, CITY_CODE: 50, ARMY_CODE: 10}
+
+    def act(self, view):
+        types, owners, armies = view
+        movable = np.argwhere((owners == self.id) & (armies > 1))
+        if len(movable) == 0:
+            return []
+
+        best_move = None
+        best_score = 0
+        for y, x in movable.tolist():
+            army = int(armies[y, x])
+            for to_x, to_y in self._neighbors(types, x, y):
+                owner = int(owners[to_y, to_x])
+                if owner == self.id or army <= armies[to_y, to_x]:
+                    continue
+                score = self.CAPTURE_VALUES.get(int(types[to_y, to_x]), 0)
+                if owner == 0:
+                    score //= 2
+                score -= int(armies[to_y, to_x]) / army
+                if score > best_score:
+                    best_move = (x, y, to_x, to_y)
+                    best_score = score
+
+        if best_move is not None:
+            return [best_move]
+
+        y, x = (int(value) for value in movable[np.argmax(armies[movable[:, 0], movable[:, 1]])])
+        neighbors = list(self._neighbors(types, x, y))
+        if not neighbors:
+            return []
+        return [(x, y, *self.rng.choice(neighbors))]
+
+BOTS = {
+    'random': RandomBot,
+    'greedy': GreedyBot,
+}
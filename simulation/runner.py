@@ -0,0 +1,98 @@
+import argparse
+import json
+import random
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+
+from shared.engine import Engine
+from simulation.bots import BOTS
+from constants.map import *
+
+def play_game(game):
+    """
+    plays one game to the end, or to game['max_ticks']. (game) holds the seed, the bot name of every
+    seat and the map parameters. returns the seats, the winner's id (None if nobody won) and the length
+    """
+    engine = Engine.new_game(len(game['bots']), seed=game['seed'], **game['params'])
+    bots = [BOTS[name](id, random.Random(game['seed'] * 10 + id)) for id, name in enumerate(game['bots'], 1)]
+
+    state = engine.state()
+    while engine.tick < game['max_ticks'] and state['winner'] is None:
+        actions = []
+        for bot in bots:
+            if bot.id in state['alive']:
+                actions.extend((bot.id, *move) for move in bot.act(engine.view(bot.id)))
+        state = engine.step(actions)
+
+    return {'bots': game['bots'], 'winner': state['winner'], 'ticks': engine.tick}
+
+def run_batch(num_games, bot_names, params, max_ticks=2000, workers=None, seed=0):
+    """
+    plays (num_games) games across a process pool. the seats rotate from game to game, so no bot
+    always moves first
+    """
+    games = []
+    for index in range(num_games):
+        shift = index % len(bot_names)
+        games.append({
+            'seed': seed + index,
+            'bots': bot_names[shift:] + bot_names[:shift],
+            'params': params,
+            'max_ticks': max_ticks,
+        })
+
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(play_game, games, chunksize=max(1, num_games // 64)))
+
+def summarize(results):
+    wins = {}
+    seat_wins = {}
+    for result in results:
+        winner = result['winner']
+        if winner is None:
+            continue
+        name = result['bots'][winner - 1]
+        wins[name] = wins.get(name, 0) + 1
+        seat_wins[winner] = seat_wins.get(winner, 0) + 1
+
+    lengths = [result['ticks'] for result in results]
+    games = len(results)
+    return {
+        'games': games,
+        'win_rate': {name: count / games for name, count in sorted(wins.items())},
+        'seat_win_rate': {seat: count / games for seat, count in sorted(seat_wins.items())},
+        'unfinished': sum(result['winner'] is None for result in results) / games,
+        'ticks_mean': statistics.mean(lengths),
+        'ticks_median': statistics.median(lengths),
+        'ticks_min': min(lengths),
+        'ticks_max': max(lengths),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='play many headless games between bots')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--bots', default='greedy,random', help=f'comma separated, one per player, of {", ".join(BOTS)}')
+    parser.add_argument('--workers', type=int, default=None, help='processes, all cores by default')
+    parser.add_argument('--max-ticks', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--king-multiplier', type=float, default=KING_MULTIPLIER)
+    parser.add_argument('--mountain-chance', type=float, default=MOUNTAIN_CHANCE)
+    parser.add_argument('--city-chance', type=float, default=CITY_CHANCE)
+    parser.add_argument('--json', help='also write the summary to this file')
+    args = parser.parse_args()
+
+    params = {
+        'king_multiplier': args.king_multiplier,
+        'mountain_chance': args.mountain_chance,
+        'city_chance': args.city_chance,
+    }
+    results = run_batch(args.games, args.bots.split(','), params, args.max_ticks, args.workers, args.seed)
+    summary = summarize(results)
+
+    print(json.dumps(summary, indent=4))
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump({'params': params, 'bots': args.bots, 'summary': summary}, file, indent=4)
+
+if __name__ == '__main__':
+    main()
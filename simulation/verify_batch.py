@@ -0,0 +1,76 @@
+import argparse
+import random
+import time
+import numpy as np
+
+from shared.engine import Engine
+from shared.batch_engine import BatchEngine
+from simulation.bots import DIRECTIONS
+
+def random_actions(engines, rng):
+    """
+    one random move per player of every game. most start from a tile the player owns, the rest are
+    arbitrary, so invalid moves are exercised as well
+    """
+    actions = np.full((len(engines), engines[0].num_players, 4), -1, dtype=np.int32)
+    for b, engine in enumerate(engines):
+        map = engine.map
+        for index in range(engine.num_players):
+            if rng.random() < 0.1:
+                continue
+            owned = np.argwhere(map.owners == index + 1)
+            if len(owned) and rng.random() < 0.9:
+                from_y, from_x = owned[rng.randrange(len(owned))]
+            else:
+                from_x, from_y = rng.randrange(map.cols), rng.randrange(map.rows)
+            dx, dy = rng.choice(DIRECTIONS)
+            actions[b, index] = (from_x, from_y, from_x + dx, from_y + dy)
+    return actions
+
+def verify(batch_size, num_players, ticks, seed):
+    """
+    steps the same games with BatchEngine and with one Engine per game and compares every tile after
+    every tick. returns the seconds spent in each
+    """
+    rng = random.Random(seed)
+
+    engines = [Engine.new_game(num_players, seed=seed * batch_size + b) for b in range(batch_size)]
+    batch = BatchEngine.from_maps([engine.map for engine in engines], num_players)
+    scalar_time = batch_time = 0
+
+    for _ in range(ticks):
+        actions = random_actions(engines, rng)
+
+        start = time.perf_counter()
+        for b, engine in enumerate(engines):
+            engine.step([(index + 1, *map(int, actions[b, index])) for index in range(num_players)])
+        scalar_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch.step(actions)
+        batch_time += time.perf_counter() - start
+
+        for b, engine in enumerate(engines):
+            if not (np.array_equal(batch.types[b], engine.map.types)
+                    and np.array_equal(batch.owners[b], engine.map.owners)
+                    and np.array_equal(batch.armies[b], engine.map.armies)):
+                raise AssertionError(f"game {b} differs at tick {engine.tick}")
+            if (batch.winners()[b] or None) != engine.winner():
+                raise AssertionError(f"winner of game {b} differs at tick {engine.tick}")
+
+    return scalar_time, batch_time
+
+def main():
+    parser = argparse.ArgumentParser(description='check BatchEngine against Engine')
+    parser.add_argument('--games', type=int, default=64)
+    parser.add_argument('--players', type=int, default=4)
+    parser.add_argument('--ticks', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    scalar_time, batch_time = verify(args.games, args.players, args.ticks, args.seed)
+    print(f"{args.games} games x {args.ticks} ticks match")
+    print(f"scalar {scalar_time:.2f}s, batched {batch_time:.2f}s")
+
+if __name__ == '__main__':
+    main()